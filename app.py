@@ -1,34 +1,153 @@
 import streamlit as st
-import pandas as pd
 from datetime import datetime
 import database as db
 import llm_handler
+import intent_parser
+import summarizer
+import query_planner
+import sql_guard
+import bulk_ops
+import telemetry
+import reminders
 import sqlite3 # For specific error handling
 
 # --- Page Configuration ---
 st.set_page_config(page_title="AI Task Manager", layout="centered", initial_sidebar_state="collapsed")
 
+# --- Shared Resources ---
+# Created once per server process and shared by every session and rerun.
+@st.cache_resource(show_spinner=False)
+def get_shared_llm():
+    return llm_handler.get_llm_gateway()
+
+def require_llm():
+    """The shared LLM, created on first use; stops the run with an error if it cannot be."""
+    try:
+        return get_shared_llm()
+    except ValueError as e:
+        st.error(f"LLM Initialization Error: {e}. Please ensure GOOGLE_API_KEY is set in .env")
+        st.stop()
+
+@st.cache_resource(show_spinner=False)
+def init_database():
+    db.create_db_and_table()
+    return True
+
+@st.cache_resource(show_spinner=False)
+def init_telemetry():
+    telemetry.start_exporters()
+    return True
+
+@st.cache_resource(show_spinner=False)
+def init_reminders():
+    return reminders.start_scheduler() if reminders.REMINDERS_ENABLED else None
+
 # --- Helper Functions ---
 def initialize_session_state():
     """Initializes session state variables."""
     if "user_name" not in st.session_state: st.session_state.user_name = ""
     if "user_email" not in st.session_state: st.session_state.user_email = ""
     if "logged_in" not in st.session_state: st.session_state.logged_in = False
-    if "llm" not in st.session_state:
-        try:
-            st.session_state.llm = llm_handler.get_llm()
-        except ValueError as e:
-            st.error(f"LLM Initialization Error: {e}. Please ensure GOOGLE_API_KEY is set in .env")
-            st.stop()
     
     if "last_interacted_task_details" not in st.session_state:
         st.session_state.last_interacted_task_details = None
     if "chat_history_for_context" not in st.session_state: 
         st.session_state.chat_history_for_context = []
+    if "task_listing" not in st.session_state:
+        st.session_state.task_listing = None
+
+def render_task_rows(data, columns):
+    with telemetry.span("ui.dataframe", rows=len(data)):
+        import pandas as pd
+        df = pd.DataFrame(data, columns=columns)
+        major_display_columns = ['id', 'task_name', 'status', 'category', 'due_date', 'due_time', 'created_at']
+        display_cols_in_df = [col for col in major_display_columns if col in df.columns]
+        
+        if not display_cols_in_df and df.columns.any():
+            display_cols_in_df = df.columns.tolist()
+
+        if display_cols_in_df:
+            st.dataframe(df[display_cols_in_df], use_container_width=True)
+        else:
+            st.info("The query ran but returned no columns to display.")
+
+# Listings are paged (db.fetch_listing_page); only the current page is ever loaded.
+# task_listing holds the query and the cursor stack, so "Next"/"Previous" reruns can
+# re-fetch just the page on screen. Fast-path listings also carry their filters, so
+# the page can come from the in-memory task store instead of SQLite.
+def start_task_listing(sql: str, params, filters: dict = None):
+    st.session_state.task_listing = {"sql": sql, "params": params, "filters": filters,
+                                     "cursors": [None], "next_cursor": None}
+
+def next_listing_page():
+    listing = st.session_state.task_listing
+    if listing and listing["next_cursor"]:
+        listing["cursors"].append(listing["next_cursor"])
+
+def previous_listing_page():
+    listing = st.session_state.task_listing
+    if listing and len(listing["cursors"]) > 1:
+        listing["cursors"].pop()
+
+def show_task_listing_page():
+    """Fetches and renders the current page of task_listing; returns (rows, columns, has_more)."""
+    listing = st.session_state.task_listing
+    data, columns, next_cursor = db.fetch_listing_page(
+        listing["sql"], listing["params"], db.DEFAULT_PAGE_SIZE, listing["cursors"][-1],
+        st.session_state.user_email, listing.get("filters")
+    )
+    listing["next_cursor"] = next_cursor
+    page_number = len(listing["cursors"])
+    if data:
+        render_task_rows(data, columns)
+    if page_number > 1 or next_cursor:
+        first_row = (page_number - 1) * db.DEFAULT_PAGE_SIZE + 1
+        prev_col, info_col, next_col = st.columns([1, 2, 1])
+        prev_col.button("◀ Previous", key="listing_prev", on_click=previous_listing_page, disabled=page_number == 1)
+        info_col.caption(f"Page {page_number} · tasks {first_row}–{first_row + len(data) - 1}")
+        next_col.button("Next ▶", key="listing_next", on_click=next_listing_page, disabled=not next_cursor)
+    return data, columns, next_cursor is not None
+
+def run_bulk_command(llm, user_query: str, context_str: str):
+    """Multi-task messages: one LLM call for the operation list, one transaction to apply it."""
+    try:
+        with st.spinner("🤖 Planning the changes..."):
+            raw_operations = llm_handler.generate_bulk_operations(llm, user_query, context_str)
+        valid, rejected = bulk_ops.validate_operations(raw_operations)
+        with st.spinner("💾 Applying changes..."):
+            applied = db.apply_task_operations(st.session_state.user_name, st.session_state.user_email, valid) if valid else []
+    except ValueError as ve:
+        st.error(f"⚠️ Action failed: {ve}")
+        return
+    except sqlite3.Error as e:
+        st.error(f"❌ Database Error: {e}. No changes were applied.")
+        return
+    except Exception as e:
+        st.error(f"❌ An unexpected error occurred: {e}")
+        return
+
+    results = sorted(applied + rejected, key=lambda item: item["index"])
+    st.session_state.task_listing = None
+    st.session_state.last_interacted_task_details = None
+    if len(results) == 1 and results[0]["result"] == "added":
+        st.session_state.last_interacted_task_details = db.get_task_by_id(results[0]["id"], st.session_state.user_email)
+    if results:
+        import pandas as pd
+        st.dataframe(
+            pd.DataFrame(results, columns=["op", "task_name", "id", "result", "message"]),
+            use_container_width=True,
+        )
+    summary_context = bulk_ops.summarize_results(results)
+    if any(item["result"] in ("added", "updated", "deleted") for item in results):
+        st.success("Bulk command processed in a single transaction.")
+    # The summary is built locally so the whole command costs one model call.
+    st.markdown(f"**🤖 Summary:**\n {summarizer.template_summary('processed', summary_context)}")
 
 # --- Initialize ---
 initialize_session_state()
-db.create_db_and_table() 
+init_database()
+init_telemetry()
+init_reminders()
 if "table_info" not in st.session_state or st.session_state.get("reload_table_info", False):
     st.session_state.table_info = db.get_db_info()
     st.session_state.reload_table_info = False
@@ -68,11 +187,19 @@ else:
     st.sidebar.header("User Info")
     st.sidebar.write(f"👤 **Name:** {st.session_state.user_name}")
     st.sidebar.write(f"📧 **Email:** {st.session_state.user_email}")
+    fast_path = intent_parser.fast_path_stats.snapshot()
+    if fast_path["hits"] + fast_path["misses"]:
+        st.sidebar.caption(f"⚡ Fast-path hit rate: {fast_path['hit_rate']:.0%} ({fast_path['hits']}/{fast_path['hits'] + fast_path['misses']})")
+    if db.task_store is not None:
+        store = db.task_store.stats()
+        if store["hits"] + store["misses"] + store["uncacheable"]:
+            st.sidebar.caption(f"🗃️ Task store hit rate: {store['hit_rate']:.0%} ({store['users']} users, {store['rows']} tasks in memory)")
     if st.sidebar.button("Logout"):
         st.session_state.logged_in = False
         st.session_state.user_name = ""
         st.session_state.user_email = ""
         st.session_state.last_interacted_task_details = None
+        st.session_state.task_listing = None
         st.rerun()
 
     st.title(f"📝 AI Based Task Manager for {st.session_state.user_name}")
@@ -100,115 +227,189 @@ else:
         if not user_input_query:
             st.warning("Please enter a command.")
         else:
-            llm = st.session_state.llm
-            table_info = st.session_state.table_info
-            
-            context_str = "None"
-            if st.session_state.last_interacted_task_details:
-                details = st.session_state.last_interacted_task_details
-                context_list = []
-                if details.get('id'): context_list.append(f"id: {details['id']}")
-                if details.get('task_name'): context_list.append(f"name: '{details['task_name']}'")
-                if details.get('due_date'): context_list.append(f"due_date: {details['due_date']}")
-                if details.get('due_time'): context_list.append(f"due_time: {details['due_time']}")
-                context_str = f"Task context - {', '.join(context_list)}"
-
-
-            with st.spinner("🤖 Thinking and generating SQL..."):
-                try:
-                    generated_sql = llm_handler.generate_sql_query(
-                        llm,
+            with telemetry.span("command", fast_path=False) as command_span:
+                # The LLM client is only created once a command needs it, so fast-path
+                # commands work (and stay fast) without an API key.
+                llm = None
+                table_info = st.session_state.table_info
+                
+                context_str = "None"
+                if st.session_state.last_interacted_task_details:
+                    details = st.session_state.last_interacted_task_details
+                    context_list = []
+                    if details.get('id'): context_list.append(f"id: {details['id']}")
+                    if details.get('task_name'): context_list.append(f"name: '{details['task_name']}'")
+                    if details.get('due_date'): context_list.append(f"due_date: {details['due_date']}")
+                    if details.get('due_time'): context_list.append(f"due_time: {details['due_time']}")
+                    context_str = f"Task context - {', '.join(context_list)}"
+
+
+                # Common commands are parsed locally; only unrecognised ones go to the LLM.
+                # Messages describing several tasks take the bulk path instead.
+                sql_params = None
+                generated_sql = None
+                llm_sql = None
+                fast_path_intent = None
+                bulk_mode = bulk_ops.looks_like_bulk(user_input_query)
+                if not bulk_mode:
+                    fast_path_intent = intent_parser.parse_command(
                         user_input_query,
-                        table_info,
                         st.session_state.user_name,
                         st.session_state.user_email,
-                        context_str
+                        st.session_state.last_interacted_task_details
                     )
-                except Exception as e:
-                    st.error(f"Error generating SQL: {e}")
-                    generated_sql = None
-
-            if generated_sql:
-                st.write("⚙️ **Generated SQL Query:**")
-                st.code(generated_sql, language="sql")
-
-                is_select_query = generated_sql.strip().upper().startswith("SELECT")
-                is_insert_query = generated_sql.strip().upper().startswith("INSERT")
-
-                with st.spinner("💾 Executing query..."):
-                    try:
-                        summary_context_for_llm = ""
-                        if is_select_query:
-                            data, columns = db.execute_select_query(generated_sql)
-                            if data:
-                                df = pd.DataFrame(data, columns=columns)
-                                major_display_columns = ['id', 'task_name', 'status', 'category', 'due_date', 'due_time', 'created_at']
-                                display_cols_in_df = [col for col in major_display_columns if col in df.columns]
-                                
-                                if not display_cols_in_df and df.columns.any():
-                                    display_cols_in_df = df.columns.tolist()
+                if bulk_mode:
+                    command_span.set(bulk=True)
+                    run_bulk_command(require_llm(), user_input_query, context_str)
+                elif fast_path_intent:
+                    generated_sql = fast_path_intent.sql
+                    sql_params = fast_path_intent.params
+                    command_span.set(fast_path=True)
+                else:
+                    with st.spinner("🤖 Thinking and generating SQL..."):
+                        llm = require_llm()
+                        try:
+                            generated_sql = llm_handler.generate_sql_query(
+                                llm,
+                                user_input_query,
+                                table_info,
+                                st.session_state.user_name,
+                                st.session_state.user_email,
+                                context_str
+                            )
+                        except Exception as e:
+                            st.error(f"Error generating SQL: {e}")
+                            generated_sql = None
 
-                                if display_cols_in_df:
-                                    st.dataframe(df[display_cols_in_df], use_container_width=True)
-                                else:
-                                    st.info("The query ran but returned no columns to display.")
-                                
-                                summary_context_for_llm = f"Retrieved {len(data)} task(s)."
-                                if len(data) == 1: 
-                                    st.session_state.last_interacted_task_details = dict(zip(columns, data[0]))
-                                elif len(data) == 0:
-                                    summary_context_for_llm = "No tasks found matching your criteria."
-                            else:
-                                st.info("No tasks found matching your criteria.")
-                                summary_context_for_llm = "No tasks found matching your criteria."
-                                st.session_state.last_interacted_task_details = None 
+                if generated_sql:
+                    st.write("⚙️ **Generated SQL Query:**")
+                    st.code(generated_sql, language="sql")
+                    if fast_path_intent:
+                        st.caption(f"⚡ Parsed locally ({fast_path_intent.rule}) with parameters {list(sql_params)}")
 
-                        else: 
-                            result = db.execute_dml_query(generated_sql)
-                            
+                    with st.spinner("💾 Executing query..."):
+                        try:
+                            if fast_path_intent:
+                                # Logs (or, with QUERY_PLAN_CHECK=reject, refuses) full scans and temp B-tree sorts.
+                                with db.connection_for(st.session_state.user_email) as conn:
+                                    query_planner.check_query_plan(generated_sql, sql_params, conn=conn)
+                                statement_kind = sql_guard.statement_kind(generated_sql)
+                            else:
+                                # Model output is checked, tenant-scoped, bounded and parameterized first.
+                                llm_sql = generated_sql
+                                guarded = sql_guard.guard(generated_sql, sql_params, st.session_state.user_email)
+                                generated_sql, sql_params, statement_kind = guarded.sql, guarded.params, guarded.kind
+                                if guarded.rewrites:
+                                    st.caption(f"🛡️ Guard: {', '.join(guarded.rewrites)}")
+                                    st.code(generated_sql, language="sql")
+                            is_select_query = statement_kind == "select"
+                            is_insert_query = statement_kind == "insert"
+                            summary_context_for_llm = ""
                             action = "processed"
-                            if is_insert_query: 
-                                action = "added"
-                                if result: 
-                                    inserted_task_details = db.get_task_by_id(result, st.session_state.user_email)
-                                    if inserted_task_details:
-                                        st.session_state.last_interacted_task_details = inserted_task_details
-                                        summary_context_for_llm = f"Task '{inserted_task_details.get('task_name')}' (ID: {result}) was {action}."
+                            if is_select_query:
+                                action = "retrieved"
+                                start_task_listing(generated_sql, sql_params,
+                                                   fast_path_intent.filters if fast_path_intent else None)
+                                data, columns, has_more = show_task_listing_page()
+                                if data:
+                                    if has_more:
+                                        summary_context_for_llm = f"Retrieved the first {len(data)} task(s); more are on the next pages."
                                     else:
-                                        summary_context_for_llm = f"Task was {action}, but details couldn't be retrieved post-insertion."
+                                        summary_context_for_llm = f"Retrieved {len(data)} task(s)."
+                                    if len(data) == 1 and not has_more: 
+                                        st.session_state.last_interacted_task_details = dict(zip(columns, data[0]))
                                 else:
-                                    summary_context_for_llm = f"Task addition was attempted but may not have completed as expected (no ID returned)."
-                            elif "UPDATE" in generated_sql.upper(): 
-                                action = "updated"
-                                summary_context_for_llm = f"Task(s) {action}. {result} row(s) affected."
-                            elif "DELETE" in generated_sql.upper(): 
-                                action = "deleted"
-                                summary_context_for_llm = f"Task(s) {action}. {result} row(s) affected."
-                                st.session_state.last_interacted_task_details = None 
-                            
-                            st.success(f"Task command '{action}' processed successfully.")
-
-
-                        with st.spinner("📜 Generating friendly summary..."):
-                           final_summary = llm_handler.summarize_query_result(
-                               llm,
-                               user_input_query,
-                               generated_sql,
-                               summary_context_for_llm
-                           )
-                        st.markdown(f"**🤖 Summary:**\n {final_summary}")
-
-                    except ValueError as ve:
-                         st.error(f"⚠️ Action failed: {ve}")
-                    except sqlite3.Error as e: 
-                        st.error(f"❌ Database Error: {e}")
-                        st.error(f"   Failed Query: {generated_sql}")
-                    except Exception as e:
-                        st.error(f"❌ An unexpected error occurred: {e}")
-                        st.error(f"   Query attempted: {generated_sql}")
-
-            elif not user_input_query.strip() == "":
-                st.error("Could not generate an SQL query for your request. Please try rephrasing.")
+                                    st.info("No tasks found matching your criteria.")
+                                    summary_context_for_llm = "No tasks found matching your criteria."
+                                    st.session_state.last_interacted_task_details = None 
+
+                            else: 
+                                result = db.execute_dml_query(generated_sql, sql_params, st.session_state.user_email)
+                                st.session_state.task_listing = None
+                                
+                                if is_insert_query: 
+                                    action = "added"
+                                    if result: 
+                                        inserted_task_details = db.get_task_by_id(result, st.session_state.user_email)
+                                        if inserted_task_details:
+                                            st.session_state.last_interacted_task_details = inserted_task_details
+                                            summary_context_for_llm = f"Task '{inserted_task_details.get('task_name')}' (ID: {result}) was {action}."
+                                        else:
+                                            summary_context_for_llm = f"Task was {action}, but details couldn't be retrieved post-insertion."
+                                    else:
+                                        summary_context_for_llm = f"Task addition was attempted but may not have completed as expected (no ID returned)."
+                                elif statement_kind == "update":
+                                    action = "updated"
+                                    summary_context_for_llm = f"Task(s) {action}. {result} row(s) affected."
+                                elif statement_kind == "delete":
+                                    action = "deleted"
+                                    summary_context_for_llm = f"Task(s) {action}. {result} row(s) affected."
+                                    st.session_state.last_interacted_task_details = None 
+                                
+                                st.success(f"Task command '{action}' processed successfully.")
+
+                            if llm_sql:
+                                llm_handler.cache_sql_query(
+                                    user_input_query,
+                                    st.session_state.user_name,
+                                    st.session_state.user_email,
+                                    context_str,
+                                    llm_sql
+                                )
+
+                            summary_mode = summarizer.SUMMARY_MODE
+                            if summary_mode != "template" and llm is None:
+                                try:
+                                    llm = get_shared_llm()
+                                except ValueError:
+                                    summary_mode = "template"
+                            if summary_mode == "template":
+                                with telemetry.span("summary.template"):
+                                    final_summary = summarizer.template_summary(action, summary_context_for_llm)
+                                st.markdown(f"**🤖 Summary:**\n {final_summary}")
+                            elif summary_mode == "stream":
+                                # The result above is already on screen; the summary streams in below it.
+                                st.markdown("**🤖 Summary:**")
+                                st.write_stream(summarizer.stream_with_fallback(
+                                    llm_handler.stream_query_result_summary(
+                                        llm,
+                                        user_input_query,
+                                        generated_sql,
+                                        summary_context_for_llm
+                                    ),
+                                    action,
+                                    summary_context_for_llm
+                                ))
+                            elif summary_mode == "llm":
+                                with st.spinner("📜 Generating friendly summary..."):
+                                   final_summary = llm_handler.summarize_query_result(
+                                       llm,
+                                       user_input_query,
+                                       generated_sql,
+                                       summary_context_for_llm
+                                   )
+                                st.markdown(f"**🤖 Summary:**\n {final_summary}")
+
+                        except ValueError as ve:
+                             st.error(f"⚠️ Action failed: {ve}")
+                        except sqlite3.Error as e: 
+                            st.session_state.task_listing = None
+                            st.error(f"❌ Database Error: {e}")
+                            st.error(f"   Failed Query: {generated_sql}")
+                        except Exception as e:
+                            st.error(f"❌ An unexpected error occurred: {e}")
+                            st.error(f"   Query attempted: {generated_sql}")
+
+                elif not bulk_mode and not user_input_query.strip() == "":
+                    st.error("Could not generate an SQL query for your request. Please try rephrasing.")
+
+    elif st.session_state.task_listing:
+        # Rerun from the pager (or any other widget): keep showing the current page.
+        try:
+            show_task_listing_page()
+        except sqlite3.Error as e:
+            st.session_state.task_listing = None
+            st.error(f"❌ Database Error: {e}")
 
     st.markdown("---")
     st.markdown("Example commands:")
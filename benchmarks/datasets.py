@@ -0,0 +1,123 @@
+"""Synthetic, deterministic task datasets for the benchmark scripts."""
+import random
+from datetime import date, timedelta
+
+import database as db
+
+TASK_WORDS = [
+    "Team sync meeting", "Submit report", "Dentist appointment", "Gym session", "Buy groceries",
+    "Call mom", "Project alpha review", "Pay rent", "Homework chapter", "Client presentation",
+    "Book flights", "Doctor's appointment", "Water plants", "Quarterly planning", "Study for exam",
+]
+CATEGORIES = ["Work", "Personal", "School", "Meeting", "Health", "General"]
+STATUSES = ["pending"] * 6 + ["completed"] * 3 + ["cancelled"]
+
+INSERT_SQL = (
+    "INSERT INTO tasks (user_name, user_email, task_name, status, category, created_at, due_date, due_time) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+)
+
+
+def user_email(n: int) -> str:
+    return f"user{n}@example.com"
+
+
+def iter_task_rows(users: int, tasks: int, seed: int = 42, today: date = None):
+    """Yields `tasks` rows spread over `users` users (skewed: a few large tenants, many small)."""
+    rng = random.Random(seed)
+    today = today or date.today()
+    for n in range(tasks):
+        # Pareto-ish skew so some tenants own far more tasks than others.
+        u = min(int(rng.paretovariate(1.2)) - 1, users - 1) if n % 2 else rng.randrange(users)
+        due = today + timedelta(days=rng.randint(-60, 120)) if rng.random() < 0.85 else None
+        due_time = f"{rng.randint(7, 20):02d}:{rng.choice(('00', '15', '30', '45'))}" if due and rng.random() < 0.6 else None
+        created = today - timedelta(days=rng.randint(0, 365))
+        yield (
+            f"User {u}", user_email(u), f"{rng.choice(TASK_WORDS)} #{n}", rng.choice(STATUSES),
+            rng.choice(CATEGORIES), f"{created.isoformat()} {rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:00",
+            due.isoformat() if due else None, due_time,
+        )
+
+
+def populate(conn, users: int, tasks: int, seed: int = 42, chunk_size: int = 50000):
+    """Bulk-loads a synthetic dataset into an existing tasks table, one transaction per chunk."""
+    rows = iter_task_rows(users, tasks, seed)
+    while True:
+        chunk = [row for _, row in zip(range(chunk_size), rows)]
+        if not chunk:
+            break
+        conn.executemany(INSERT_SQL, chunk)
+        conn.commit()
+
+
+def populate_shards(users: int, tasks: int, seed: int = 42, chunk_size: int = 50000):
+    """populate() for a sharded database: each row goes to its user's shard. Shards that already hold tasks are kept."""
+    rows = iter_task_rows(users, tasks, seed)
+    empty = {}
+    while True:
+        chunk = [row for _, row in zip(range(chunk_size), rows)]
+        if not chunk:
+            break
+        by_shard = {}
+        for row in chunk:
+            by_shard.setdefault(db.route(row[1]), []).append(row)
+        for path, shard_rows in by_shard.items():
+            with db.connection(path) as conn:
+                if path not in empty:
+                    empty[path] = conn.execute("SELECT 1 FROM tasks LIMIT 1").fetchone() is None
+                if empty[path]:
+                    conn.executemany(INSERT_SQL, shard_rows)
+                    conn.commit()
+    for path in empty:
+        with db.connection(path) as conn:
+            conn.execute("ANALYZE")
+
+
+# --- Command mixes ---
+# (weight, template). {name} is a fresh task name, {existing} a name likely to exist.
+COMMAND_MIXES = {
+    "default": [
+        (30, "show pending tasks"),
+        (10, "What's pending?"),
+        (10, "show my tasks for this week"),
+        (5, "what do I have today"),
+        (5, "show overdue tasks"),
+        (12, "add task '{name}' tomorrow at 3pm category Work"),
+        (6, "I have a {name} next friday at 10am"),
+        (8, "mark it as done"),
+        (4, "mark '{existing}' as completed"),
+        (5, "delete task '{existing}'"),
+        (5, "Can you find anything about the {name} from last month?"),
+    ],
+    "read_heavy": [
+        (60, "show pending tasks"),
+        (20, "show my tasks for this week"),
+        (10, "show completed tasks"),
+        (10, "add task '{name}' tomorrow"),
+    ],
+    "bulk": [
+        (40, "add {name} tomorrow at 9am, {name} review friday at 3pm and {name} prep next monday"),
+        (20, "show pending tasks"),
+        (20, "add task '{name}' tomorrow"),
+        (20, "mark it as done"),
+    ],
+    "write_heavy": [
+        (40, "add task '{name}' tomorrow at 9am"),
+        (20, "mark it as done"),
+        (20, "delete task '{existing}'"),
+        (20, "show pending tasks"),
+    ],
+}
+
+
+def iter_commands(count: int, users: int, mix: str = "default", seed: int = 7):
+    """Yields (user_index, command) pairs drawn from COMMAND_MIXES[mix]."""
+    rng = random.Random(seed)
+    weights, templates = zip(*COMMAND_MIXES[mix])
+    for n in range(count):
+        template = rng.choices(templates, weights=weights)[0]
+        command = template.format(
+            name=f"{rng.choice(TASK_WORDS)} bench {n}",
+            existing=rng.choice(TASK_WORDS),
+        )
+        yield rng.randrange(users), command
@@ -0,0 +1,124 @@
+"""
+Micro-benchmark: queries per second with a fresh sqlite3 connection per query
+(the original database.py behaviour) versus the pooled, WAL-mode connection manager.
+
+    python -m benchmarks.db_bench --queries 5000 --threads 4
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+import database as db
+
+TASK_COLUMNS = "id, task_name, status, category, due_date, due_time, created_at"
+
+
+def _seed(db_path: str, users: int, tasks_per_user: int):
+    db.create_db_and_table(db_path)
+    rows = (
+        (f"User {u}", f"user{u}@example.com", f"Task {t}", "pending" if t % 3 else "completed",
+         "General", f"2026-01-{(t % 28) + 1:02d}", None)
+        for u in range(users) for t in range(tasks_per_user)
+    )
+    with db.connection(db_path) as conn:
+        conn.executemany(
+            "INSERT INTO tasks (user_name, user_email, task_name, status, category, due_date, due_time) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+        conn.commit()
+
+
+def _legacy_select(db_path: str, user_email: str):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"SELECT {TASK_COLUMNS} FROM tasks WHERE user_email = ? AND status = 'pending'", (user_email,))
+        return cursor.fetchall()
+    finally:
+        conn.close()
+
+
+def _legacy_insert(db_path: str, user_email: str, n: int):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "INSERT INTO tasks (user_name, user_email, task_name, due_date) VALUES (?, ?, ?, ?)",
+            ("Bench", user_email, f"legacy {threading.get_ident()} {n}", "2026-02-01"),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _pooled_select(db_path: str, user_email: str):
+    return db.execute_select_query(
+        f"SELECT {TASK_COLUMNS} FROM tasks WHERE user_email = ? AND status = 'pending'", (user_email,)
+    )
+
+
+def _pooled_insert(db_path: str, user_email: str, n: int):
+    db.execute_dml_query(
+        "INSERT INTO tasks (user_name, user_email, task_name, due_date) VALUES (?, ?, ?, ?)",
+        ("Bench", user_email, f"pooled {threading.get_ident()} {n}", "2026-02-01"),
+    )
+
+
+def _run(label: str, select_fn, insert_fn, db_path: str, queries: int, threads: int, users: int, write_ratio: float):
+    per_thread = queries // threads
+    write_every = int(1 / write_ratio) if write_ratio > 0 else 0
+    errors = []
+
+    def worker(worker_id: int):
+        try:
+            for n in range(per_thread):
+                user_email = f"user{(worker_id + n) % users}@example.com"
+                if write_every and n % write_every == 0:
+                    insert_fn(db_path, user_email, n)
+                else:
+                    select_fn(db_path, user_email)
+        except sqlite3.Error as e:
+            errors.append(e)
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    start = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - start
+    total = per_thread * threads
+    print(f"{label:<8} {total:>7} queries in {elapsed:7.3f}s  ->  {total / elapsed:10.1f} q/s  ({len(errors)} errors)")
+    for e in errors[:3]:
+        print(f"    {type(e).__name__}: {e}")
+    return total / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=5000)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--tasks-per-user", type=int, default=50)
+    parser.add_argument("--write-ratio", type=float, default=0.1, help="fraction of queries that are INSERTs")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench_tasks.db")
+        _seed(db_path, args.users, args.tasks_per_user)
+        db.close_connections()
+        db.DB_FILENAME = db_path
+
+        legacy = _run("legacy", _legacy_select, _legacy_insert, db_path,
+                      args.queries, args.threads, args.users, args.write_ratio)
+        pooled = _run("pooled", _pooled_select, _pooled_insert, db_path,
+                      args.queries, args.threads, args.users, args.write_ratio)
+        print(f"speedup: {pooled / legacy:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Deterministic local stand-in for the Gemini client used by llm_handler.
+
+FakeLLM implements the two methods the app calls, `invoke(prompt)` and
+`stream(prompt)`. It reads the user query, name, email and task context back out
+of the prompt and answers like a well-behaved model: parameter-free SQL for
+SQL-generation prompts, a JSON operation list for bulk prompts, a one-line
+summary for summary prompts. A configurable
+latency (plus seeded jitter) stands in for the network round trip.
+"""
+import json
+import random
+import re
+import threading
+import time
+from datetime import date
+
+import bulk_ops
+import intent_parser
+
+_FIELD_RES = {
+    "user_query": re.compile(r"^User Query: (.*)$", re.MULTILINE),
+    "user_name": re.compile(r"^- Name: (.*)$", re.MULTILINE),
+    "user_email": re.compile(r"^- Email: (.*)$", re.MULTILINE),
+    "context": re.compile(r"^Previous relevant task context \(if any\): (.*)$", re.MULTILINE),
+    "summary_query": re.compile(r"^Original User Query: (.*)$", re.MULTILINE),
+    "summary_result": re.compile(r"^SQL Query Result/Effect: (.*)$", re.MULTILINE),
+}
+_CONTEXT_ID_RE = re.compile(r"\bid: (\d+)")
+_BULK_DATE_RE = re.compile(r"\b(?:due\s+|on\s+)?((?:next\s+)?(?:today|tomorrow|monday|tuesday|wednesday|thursday|friday|saturday|sunday)|\d{4}-\d{2}-\d{2})\b", re.IGNORECASE)
+_BULK_TIME_RE = re.compile(r"\b(?:at\s+)?(\d{1,2}(?::\d{2})?\s*(?:am|pm)|\d{1,2}:\d{2})\b", re.IGNORECASE)
+# Free-form phrasings the fast-path grammar does not cover, e.g. "I have a dentist visit tomorrow at 3pm".
+_FREEFORM_ADD_RE = re.compile(r"^(?:i have|i've got|there is|there's)\s+(?:a |an )?(?P<name>.+?)(?P<rest>(?:\s+(?:at|on|tomorrow|today|next|this)\b.*)?)$", re.IGNORECASE)
+
+
+def _sql_literal(value) -> str:
+    if value is None:
+        return "NULL"
+    if isinstance(value, (int, float)):
+        return str(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def inline_params(sql: str, params: tuple) -> str:
+    """Substitutes `?` placeholders with SQL literals (the fake model returns plain SQL like Gemini)."""
+    values = iter(params)
+    return re.sub(r"\?", lambda _m: _sql_literal(next(values)), sql)
+
+
+class FakeLLM:
+    def __init__(self, latency_ms: float = 800.0, jitter_ms: float = 200.0, summary_latency_ms: float = None,
+                 seed: int = 0, stream_chunks: int = 8):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.summary_latency_ms = latency_ms if summary_latency_ms is None else summary_latency_ms
+        self.stream_chunks = stream_chunks
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self.calls = 0
+
+    def _sleep(self, base_ms: float):
+        with self._rng_lock:
+            jitter = self._rng.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0
+            self.calls += 1
+        delay = max(0.0, base_ms + jitter) / 1000
+        if delay:
+            time.sleep(delay)
+
+    @staticmethod
+    def _field(prompt: str, name: str) -> str:
+        m = _FIELD_RES[name].search(prompt)
+        return m.group(1).strip() if m else ""
+
+    def _answer_sql(self, prompt: str) -> str:
+        user_query = self._field(prompt, "user_query")
+        user_name = self._field(prompt, "user_name")
+        user_email = self._field(prompt, "user_email")
+        context_id = _CONTEXT_ID_RE.search(self._field(prompt, "context"))
+        last_task = {"id": int(context_id.group(1))} if context_id else None
+
+        intent = intent_parser.parse_command(user_query, user_name, user_email, last_task, record_stats=False)
+        if intent is None:
+            m = _FREEFORM_ADD_RE.match(user_query.strip().rstrip(".!"))
+            if m:
+                rewritten = f"add task '{m.group('name').strip()}'{m.group('rest')}"
+                intent = intent_parser.parse_command(rewritten, user_name, user_email, last_task, record_stats=False)
+        if intent is None:
+            # Unknown request: a reasonable model would list the user's pending tasks.
+            return (
+                f"SELECT {intent_parser.TASK_COLUMNS} FROM tasks WHERE user_email = {_sql_literal(user_email)} "
+                f"AND status = 'pending' ORDER BY {intent_parser.DEFAULT_ORDER_BY}"
+            )
+        return inline_params(intent.sql, intent.params)
+
+    def _answer_bulk(self, prompt: str) -> str:
+        """Every segment of the message becomes an "add" with its date and time pulled out."""
+        today = date.today()
+        operations = []
+        for segment in bulk_ops.split_segments(self._field(prompt, "user_query")):
+            segment = re.sub(r"^(?:add|schedule|create)\s+", "", segment.strip(), flags=re.IGNORECASE)
+            date_match, time_match = _BULK_DATE_RE.search(segment), _BULK_TIME_RE.search(segment)
+            name = segment
+            for m in (date_match, time_match):
+                if m:
+                    name = name.replace(m.group(0), " ")
+            name = " ".join(name.strip(" '\"").split()).capitalize()
+            resolved = intent_parser.resolve_date(date_match.group(1), today) if date_match else None
+            operations.append({
+                "op": "add",
+                "task_name": name,
+                "due_date": resolved.isoformat() if resolved else None,
+                "due_time": intent_parser.resolve_time(time_match.group(1)) if time_match else None,
+                "category": intent_parser.infer_category(name),
+                "status": "pending",
+            })
+        return json.dumps(operations)
+
+    def _answer_summary(self, prompt: str) -> str:
+        result = self._field(prompt, "summary_result") or "Done."
+        return f"Sure! {result}"
+
+    def invoke(self, prompt: str) -> str:
+        if "Friendly Summary:" in prompt:
+            self._sleep(self.summary_latency_ms)
+            return self._answer_summary(prompt)
+        self._sleep(self.latency_ms)
+        if prompt.rstrip().endswith("JSON:"):
+            return self._answer_bulk(prompt)
+        return self._answer_sql(prompt)
+
+    def stream(self, prompt: str):
+        text = self.invoke(prompt)
+        step = max(1, len(text) // self.stream_chunks)
+        for i in range(0, len(text), step):
+            yield text[i:i + step]
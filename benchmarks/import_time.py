@@ -0,0 +1,89 @@
+"""
+Import-time report for the modules the Streamlit script loads on a cold start.
+
+Runs `python -X importtime` in a fresh interpreter, so nothing is cached from this
+process, and reports the cumulative time of each requested module plus the slowest
+individual imports. Use --budget-ms to fail (exit code 1) on regressions, e.g. in CI:
+
+    python -m benchmarks.import_time --budget-ms 1500 --json import_times.json
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+
+# What `app.py` imports before the first page is rendered.
+STARTUP_MODULES = ["streamlit", "database", "llm_handler", "prompt_builder", "intent_parser", "summarizer", "sql_cache"]
+# Imported lazily on first use; reported separately so the deferred cost stays visible.
+DEFERRED_MODULES = ["pandas", "langchain_google_genai.llms"]
+
+_LINE_RE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure(modules, runs: int = 3):
+    """Returns {'total_ms', 'modules': {name: cumulative_ms}, 'slowest': [(name, self_ms)]}, best of `runs`."""
+    best = None
+    for _ in range(runs):
+        code = "; ".join(f"import {m}" for m in modules)
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code],
+            cwd=REPO_ROOT, capture_output=True, text=True,
+        )
+        if proc.returncode != 0:
+            raise RuntimeError(f"Importing {modules} failed:\n{proc.stderr[-2000:]}")
+        self_times, cumulative = {}, {}
+        for line in proc.stderr.splitlines():
+            m = _LINE_RE.search(line)
+            if not m:
+                continue
+            self_us, cumulative_us, indent, name = int(m.group(1)), int(m.group(2)), m.group(3), m.group(4)
+            self_times[name] = self_us / 1000
+            if len(indent) <= 1:  # top-level import
+                cumulative[name] = cumulative_us / 1000
+        result = {
+            "total_ms": round(sum(cumulative.values()), 1),
+            "modules": {m: round(cumulative.get(m, 0.0), 1) for m in modules},
+            "slowest": sorted(((n, round(t, 1)) for n, t in self_times.items()), key=lambda x: -x[1])[:15],
+        }
+        if best is None or result["total_ms"] < best["total_ms"]:
+            best = result
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3, help="take the best of N fresh interpreters")
+    parser.add_argument("--budget-ms", type=float, default=None, help="fail if startup imports exceed this")
+    parser.add_argument("--json", dest="json_path", default=None, help="write the report as JSON")
+    parser.add_argument("--skip-deferred", action="store_true", help="do not measure lazily imported modules")
+    args = parser.parse_args()
+
+    report = {"python": sys.version.split()[0], "startup": measure(STARTUP_MODULES, args.runs)}
+    if not args.skip_deferred:
+        report["deferred"] = measure(DEFERRED_MODULES, args.runs)
+
+    for section in ("startup", "deferred"):
+        if section not in report:
+            continue
+        data = report[section]
+        print(f"{section} imports: {data['total_ms']:.1f} ms")
+        for name, ms in data["modules"].items():
+            print(f"    {name:<32} {ms:8.1f} ms")
+        print("  slowest individual modules (self time):")
+        for name, ms in data["slowest"][:8]:
+            print(f"    {name:<32} {ms:8.1f} ms")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.budget_ms is not None and report["startup"]["total_ms"] > args.budget_ms:
+        print(f"FAIL: startup imports took {report['startup']['total_ms']:.1f} ms (budget {args.budget_ms:.1f} ms)")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
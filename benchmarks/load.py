@@ -0,0 +1,392 @@
+"""
+Headless load generator for the app's command pipeline.
+
+Each command goes through the same stages as app.py:
+
+    fast path (intent_parser) -> generate_sql_query -> sql_guard -> execute_select_query /
+    execute_dml_query -> summary (template or summarize_query_result)
+
+against a synthetic database, using benchmarks.fake_llm.FakeLLM instead of Gemini,
+so no network or API key is needed. Commands run on a thread pool to simulate
+concurrent sessions. The run reports p50/p95/p99 per stage, throughput and SQLite
+lock contention, and --json writes a machine-readable result that --compare can diff.
+
+    python -m benchmarks.load --commands 2000 --concurrency 16 --llm-latency-ms 300 --json run.json
+    python -m benchmarks.load --no-fast-path --summary-mode llm --compare run.json
+"""
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bulk_ops
+import database as db
+import intent_parser
+import llm_handler
+import prompt_builder
+import sql_guard
+import summarizer
+from benchmarks import datasets
+from benchmarks.fake_llm import FakeLLM
+from llm_gateway import LLMGateway, LangChainBackend
+
+STAGES = ("fast_path", "generate_sql", "guard_parse", "sql_guard", "bulk_plan", "bulk_apply", "execute_select", "execute_dml", "summary", "total")
+
+
+def percentile(sorted_values, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+class Recorder:
+    """Collects per-stage latencies (ms) and error counters from worker threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {stage: [] for stage in STAGES}
+        self.errors = {}
+        self.lock_errors = 0
+        self.lock_retries = 0
+
+    def add(self, stage: str, ms: float):
+        with self._lock:
+            self.samples[stage].append(ms)
+
+    def error(self, kind: str):
+        with self._lock:
+            self.errors[kind] = self.errors.get(kind, 0) + 1
+
+    def lock_error(self, retried: bool):
+        with self._lock:
+            self.lock_errors += 1
+            if retried:
+                self.lock_retries += 1
+
+    def summary(self) -> dict:
+        out = {}
+        for stage, values in self.samples.items():
+            values = sorted(values)
+            out[stage] = {
+                "count": len(values),
+                "mean_ms": round(statistics.fmean(values), 3) if values else 0.0,
+                "p50_ms": round(percentile(values, 50), 3),
+                "p95_ms": round(percentile(values, 95), 3),
+                "p99_ms": round(percentile(values, 99), 3),
+                "max_ms": round(values[-1], 3) if values else 0.0,
+            }
+        return out
+
+
+class Session:
+    """Per-user state the Streamlit session would hold."""
+
+    def __init__(self, index: int):
+        self.user_name = f"User {index}"
+        self.user_email = datasets.user_email(index)
+        self.last_interacted_task_details = None
+        self.lock = threading.Lock()
+
+    def context_str(self) -> str:
+        details = self.last_interacted_task_details
+        if not details:
+            return "None"
+        context_list = []
+        if details.get('id'): context_list.append(f"id: {details['id']}")
+        if details.get('task_name'): context_list.append(f"name: '{details['task_name']}'")
+        if details.get('due_date'): context_list.append(f"due_date: {details['due_date']}")
+        if details.get('due_time'): context_list.append(f"due_time: {details['due_time']}")
+        return f"Task context - {', '.join(context_list)}"
+
+
+def _is_locked(e: Exception) -> bool:
+    return isinstance(e, sqlite3.OperationalError) and "locked" in str(e).lower()
+
+
+def _run_bulk_command(session: Session, command: str, llm, recorder: Recorder):
+    t = time.perf_counter()
+    raw_operations = llm_handler.generate_bulk_operations(llm, command, session.context_str())
+    recorder.add("bulk_plan", (time.perf_counter() - t) * 1000)
+    valid, rejected = bulk_ops.validate_operations(raw_operations)
+    t = time.perf_counter()
+    try:
+        applied = db.apply_task_operations(session.user_name, session.user_email, valid) if valid else []
+    except sqlite3.Error as e:
+        recorder.error("locked" if _is_locked(e) else type(e).__name__)
+        return
+    recorder.add("bulk_apply", (time.perf_counter() - t) * 1000)
+    session.last_interacted_task_details = None
+    summarizer.template_summary("processed", bulk_ops.summarize_results(applied + rejected))
+
+
+def run_command(session: Session, command: str, llm, table_info: str, recorder: Recorder, args):
+    """Runs one command through the pipeline, recording each stage."""
+    start = time.perf_counter()
+    with session.lock:  # one command at a time per session, like a browser tab
+        if bulk_ops.looks_like_bulk(command):
+            _run_bulk_command(session, command, llm, recorder)
+            recorder.add("total", (time.perf_counter() - start) * 1000)
+            return
+        sql, params, filters, llm_sql, kind = None, None, None, None, None
+        context = session.context_str()
+        if args.fast_path:
+            t = time.perf_counter()
+            intent = intent_parser.parse_command(
+                command, session.user_name, session.user_email, session.last_interacted_task_details
+            )
+            recorder.add("fast_path", (time.perf_counter() - t) * 1000)
+            if intent:
+                sql, params, filters = intent.sql, intent.params, intent.filters
+        if sql is None:
+            t = time.perf_counter()
+            sql = llm_sql = llm_handler.generate_sql_query(
+                llm, command, table_info, session.user_name, session.user_email, context
+            )
+            recorder.add("generate_sql", (time.perf_counter() - t) * 1000)
+            t = time.perf_counter()
+            try:
+                guarded = sql_guard.guard(sql, params, session.user_email, mode=args.sql_guard)
+            except ValueError:
+                recorder.error("guard_rejected")
+                recorder.add("total", (time.perf_counter() - start) * 1000)
+                return
+            # guard_parse is the tokenize/check/rewrite part; sql_guard adds the EXPLAIN cost estimate.
+            recorder.add("guard_parse", guarded.parse_ms)
+            recorder.add("sql_guard", (time.perf_counter() - t) * 1000)
+            sql, params, kind = guarded.sql, guarded.params, guarded.kind
+
+        # Classified like app.py: the guard's kind for LLM SQL, statement_kind for the fast path.
+        kind = kind or sql_guard.statement_kind(sql)
+        action, summary_context = "processed", ""
+        try:
+            if kind == "select":
+                t = time.perf_counter()
+                # First page only, as the app renders it.
+                data, columns, next_cursor = db.fetch_listing_page(sql, params, user_email=session.user_email,
+                                                                   filters=filters)
+                recorder.add("execute_select", (time.perf_counter() - t) * 1000)
+                action = "retrieved"
+                summary_context = f"Retrieved {len(data)} task(s)." if data else "No tasks found matching your criteria."
+                single = len(data) == 1 and next_cursor is None
+                session.last_interacted_task_details = dict(zip(columns, data[0])) if single else None
+            else:
+                result = _execute_dml_with_retry(sql, params, session.user_email, recorder, args.lock_retries)
+                if kind == "insert":
+                    action = "added"
+                    details = db.get_task_by_id(result, session.user_email) if result else None
+                    session.last_interacted_task_details = details
+                    summary_context = f"Task '{details.get('task_name')}' (ID: {result}) was added." if details else "Task was added."
+                elif kind == "delete":
+                    action = "deleted"
+                    summary_context = f"Task(s) deleted. {result} row(s) affected."
+                    session.last_interacted_task_details = None
+                elif kind == "update":
+                    action = "updated"
+                    summary_context = f"Task(s) updated. {result} row(s) affected."
+            if llm_sql:
+                llm_handler.cache_sql_query(command, session.user_name, session.user_email, context, llm_sql)
+        except ValueError:
+            recorder.error("duplicate_task")
+            summary_context = "Task already exists."
+        except sqlite3.Error as e:
+            recorder.error("locked" if _is_locked(e) else type(e).__name__)
+            recorder.add("total", (time.perf_counter() - start) * 1000)
+            return
+
+        t = time.perf_counter()
+        if args.summary_mode == "llm":
+            llm_handler.summarize_query_result(llm, command, sql, summary_context)
+        elif args.summary_mode == "stream":
+            for _chunk in llm_handler.stream_query_result_summary(llm, command, sql, summary_context):
+                pass
+        elif args.summary_mode == "template":
+            summarizer.template_summary(action, summary_context)
+        recorder.add("summary", (time.perf_counter() - t) * 1000)
+    recorder.add("total", (time.perf_counter() - start) * 1000)
+
+
+def _execute_dml_with_retry(sql: str, params, user_email: str, recorder: Recorder, retries: int):
+    attempt = 0
+    while True:
+        t = time.perf_counter()
+        try:
+            result = db.execute_dml_query(sql, params, user_email)
+            recorder.add("execute_dml", (time.perf_counter() - t) * 1000)
+            return result
+        except sqlite3.OperationalError as e:
+            if not _is_locked(e):
+                raise
+            recorder.lock_error(retried=attempt < retries)
+            if attempt >= retries:
+                raise
+            attempt += 1
+            time.sleep(0.01 * attempt)
+
+
+def run(args) -> dict:
+    tmp_dir = None
+    db_path = args.db
+    if not db_path:
+        tmp_dir = tempfile.TemporaryDirectory()
+        db_path = os.path.join(tmp_dir.name, "load_tasks.db")
+    db.DB_FILENAME = db_path
+    if args.shards:
+        db.DB_SHARDS = str(args.shards)
+        db.DB_SHARD_DIR = os.path.join(os.path.dirname(os.path.abspath(db_path)), "shards")
+    db.create_db_and_table()
+    if db.is_sharded():
+        datasets.populate_shards(args.users, args.tasks)
+    else:
+        with db.connection() as conn:
+            if not conn.execute("SELECT COUNT(*) FROM tasks").fetchone()[0]:
+                datasets.populate(conn, args.users, args.tasks)
+                conn.execute("ANALYZE")
+                conn.commit()
+
+    if args.no_sql_cache:
+        llm_handler.sql_query_cache = None
+    elif llm_handler.sql_query_cache is not None:
+        llm_handler.sql_query_cache.clear()
+    if args.no_task_store:
+        db.task_store = None
+    elif db.task_store is not None:
+        db.task_store.clear()
+
+    llm = FakeLLM(latency_ms=args.llm_latency_ms, jitter_ms=args.llm_jitter_ms,
+                  summary_latency_ms=args.summary_latency_ms, seed=args.seed)
+    gateway = LLMGateway(LangChainBackend(llm), max_concurrency=args.llm_concurrency, rate_per_second=args.llm_rate,
+                         burst=args.llm_burst, hedge_after_s=args.llm_hedge_after_ms / 1000)
+    table_info = db.get_db_info()
+    # Compile the prompt prefixes once before timing starts.
+    for intent in prompt_builder.INTENTS:
+        prompt_builder.compile_sql_prefix(intent, table_info)
+    sessions = {}
+    sessions_lock = threading.Lock()
+    recorder = Recorder()
+
+    def session_for(index: int) -> Session:
+        with sessions_lock:
+            if index not in sessions:
+                sessions[index] = Session(index)
+            return sessions[index]
+
+    def worker(item):
+        user_index, command = item
+        try:
+            run_command(session_for(user_index), command, gateway, table_info, recorder, args)
+        except Exception as e:
+            recorder.error(type(e).__name__)
+
+    commands = list(datasets.iter_commands(args.commands, args.active_users or args.users, args.mix, args.seed))
+    fast_path_before = intent_parser.fast_path_stats.snapshot()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency, thread_name_prefix="load") as pool:
+        list(pool.map(worker, commands))
+    elapsed = time.perf_counter() - start
+
+    fast_path_after = intent_parser.fast_path_stats.snapshot()
+    fast_hits = fast_path_after["hits"] - fast_path_before["hits"]
+    fast_total = fast_hits + fast_path_after["misses"] - fast_path_before["misses"]
+    result = {
+        "config": {k: v for k, v in vars(args).items() if k not in ("json_path", "compare")},
+        "environment": {"python": platform.python_version(), "sqlite": sqlite3.sqlite_version, "machine": platform.machine()},
+        "elapsed_s": round(elapsed, 3),
+        "throughput_cps": round(len(commands) / elapsed, 2) if elapsed else 0.0,
+        "commands": len(commands),
+        "stages": recorder.summary(),
+        "errors": recorder.errors,
+        "db_lock": {"errors": recorder.lock_errors, "retries": recorder.lock_retries},
+        "llm_calls": llm.calls,
+        "llm_gateway": dict(gateway.stats),
+        "fast_path": {"hits": fast_hits, "hit_rate": round(fast_hits / fast_total, 4) if fast_total else 0.0},
+        "sql_cache": llm_handler.sql_query_cache.stats() if llm_handler.sql_query_cache is not None else None,
+        "task_store": db.task_store.stats() if db.task_store is not None else None,
+    }
+    gateway.close()
+    db.close_connections()
+    if tmp_dir:
+        tmp_dir.cleanup()
+    return result
+
+
+def print_report(result: dict, baseline: dict = None):
+    print(f"{result['commands']} commands in {result['elapsed_s']:.2f}s -> {result['throughput_cps']:.1f} commands/s "
+          f"({result['llm_calls']} LLM calls, fast-path hit rate {result['fast_path']['hit_rate']:.0%})")
+    header = f"  {'stage':<15}{'count':>7}{'p50 ms':>11}{'p95 ms':>11}{'p99 ms':>11}{'max ms':>11}"
+    print(header + ("   p95 vs baseline" if baseline else ""))
+    for stage, s in result["stages"].items():
+        if not s["count"]:
+            continue
+        line = f"  {stage:<15}{s['count']:>7}{s['p50_ms']:>11.2f}{s['p95_ms']:>11.2f}{s['p99_ms']:>11.2f}{s['max_ms']:>11.2f}"
+        base = (baseline or {}).get("stages", {}).get(stage)
+        if base and base["count"] and base["p95_ms"]:
+            line += f"   {(s['p95_ms'] - base['p95_ms']) / base['p95_ms']:+.1%}"
+        print(line)
+    print(f"  db lock errors: {result['db_lock']['errors']} (retried {result['db_lock']['retries']}), errors: {result['errors'] or 'none'}")
+    gw = result.get("llm_gateway")
+    if gw:
+        print(f"  llm gateway: {gw['attempts']} attempts, {gw['coalesced']} coalesced, {gw['hedges']} hedged, "
+              f"{gw['retries']} retries, {gw['timeouts']} timeouts")
+    if result["sql_cache"]:
+        print(f"  sql cache: {result['sql_cache']['hits']} hits / {result['sql_cache']['misses']} misses")
+    store = result.get("task_store")
+    if store:
+        print(f"  task store: {store['hit_rate']:.0%} hit rate ({store['hits']} hits, {store['misses']} loads, "
+              f"{store['uncacheable']} uncacheable), {store['write_throughs']} write-throughs, "
+              f"{store['invalidations']} invalidations, {store['evictions']} evictions")
+    if baseline:
+        print(f"  throughput vs baseline: {(result['throughput_cps'] - baseline['throughput_cps']) / baseline['throughput_cps']:+.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000, help="users in the seeded dataset")
+    parser.add_argument("--active-users", type=int, default=200, help="users issuing commands")
+    parser.add_argument("--tasks", type=int, default=100_000, help="tasks in the seeded dataset")
+    parser.add_argument("--commands", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--mix", choices=sorted(datasets.COMMAND_MIXES), default="default")
+    parser.add_argument("--llm-latency-ms", type=float, default=300.0)
+    parser.add_argument("--llm-jitter-ms", type=float, default=50.0)
+    parser.add_argument("--summary-latency-ms", type=float, default=None, help="defaults to --llm-latency-ms")
+    parser.add_argument("--llm-concurrency", type=int, default=8, help="gateway worker pool size")
+    parser.add_argument("--llm-rate", type=float, default=0.0, help="gateway requests/second (0 = unlimited)")
+    parser.add_argument("--llm-burst", type=int, default=10)
+    parser.add_argument("--llm-hedge-after-ms", type=float, default=0.0, help="send a hedged request after this long (0 = off)")
+    parser.add_argument("--summary-mode", choices=summarizer.SUMMARY_MODES, default=summarizer.SUMMARY_MODE)
+    parser.add_argument("--no-fast-path", dest="fast_path", action="store_false")
+    parser.add_argument("--no-sql-cache", action="store_true")
+    parser.add_argument("--shards", type=int, default=None,
+                        help="hash-shard users over this many database files (default: DB_SHARDS)")
+    parser.add_argument("--no-task-store", action="store_true", help="read every listing and task lookup from SQLite")
+    parser.add_argument("--sql-guard", choices=sql_guard.SQL_GUARD_MODES, default=sql_guard.SQL_GUARD,
+                        help="guard mode for model-generated SQL")
+    parser.add_argument("--lock-retries", type=int, default=0, help="retry DML this many times on 'database is locked'")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--db", default=None, help="database file to seed or reuse (default: temporary)")
+    parser.add_argument("--json", dest="json_path", default=None, help="write results as JSON")
+    parser.add_argument("--compare", default=None, help="JSON from an earlier run to compare against")
+    args = parser.parse_args()
+
+    result = run(args)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(result, baseline)
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
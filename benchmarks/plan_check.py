@@ -0,0 +1,125 @@
+"""
+Runs the query-plan check against a synthetic dataset (millions of tasks, thousands of users).
+
+Builds the database with the managed index set from database.py, then runs
+EXPLAIN QUERY PLAN plus a timed execution for the SQL the fast path emits and for
+typical LLM-generated forms, for the largest tenant and a typical one.
+
+    python -m benchmarks.plan_check --tasks 2000000 --users 5000 --db /tmp/plan_check.db --strict
+
+--strict exits with 1 if any fast-path query scans the table or sorts in a temp B-tree.
+Reusing --db skips the (slow) data load on later runs.
+"""
+import argparse
+import os
+import sys
+import time
+
+import database as db
+import intent_parser
+import query_planner
+from benchmarks import datasets
+
+TASK_COLUMNS = intent_parser.TASK_COLUMNS
+
+FAST_PATH_COMMANDS = [
+    "show pending tasks",
+    "show my tasks",
+    "show completed tasks",
+    "show my tasks for this week",
+    "what do I have today",
+    "show pending tasks for next week",
+    "show overdue tasks",
+    "mark it as done",
+    "mark 'Gym session' as completed",
+    "delete task 'Pay rent'",
+]
+
+# (label, SQL template, expected to pass the check). {email} is substituted.
+LLM_STYLE_QUERIES = [
+    ("llm: pending, recommended order", f"SELECT {TASK_COLUMNS} FROM tasks WHERE user_email = '{{email}}' AND status = 'pending' ORDER BY {db.DEFAULT_ORDER_BY}", True),
+    ("llm: pending, NULLS LAST order", f"SELECT {TASK_COLUMNS} FROM tasks WHERE user_email = '{{email}}' AND status = 'pending' ORDER BY due_date ASC NULLS LAST, due_time ASC NULLS LAST, created_at DESC", False),
+    ("llm: this week, DATE('now')", f"SELECT {TASK_COLUMNS} FROM tasks WHERE user_email = '{{email}}' AND {db.DATED_FILTER} AND due_date BETWEEN DATE('now') AND DATE('now', '+7 days') ORDER BY {db.DATED_ORDER_BY}", True),
+    ("llm: name search, no tenant filter", f"SELECT {TASK_COLUMNS} FROM tasks WHERE task_name LIKE '%meeting%'", False),
+    ("llm: update by id", "UPDATE tasks SET status = 'completed' WHERE id = 123 AND user_email = '{email}'", True),
+]
+
+
+def build_dataset(conn, db_path: str, users: int, tasks: int):
+    if conn.execute("SELECT COUNT(*) FROM tasks").fetchone()[0]:
+        print(f"Reusing existing dataset in {db_path}")
+        return
+    print(f"Loading {tasks:,} tasks for {users:,} users into {db_path} ...")
+    start = time.perf_counter()
+    # Loading without secondary indexes and building them afterwards is much faster.
+    for name in db.MANAGED_INDEXES:
+        conn.execute(f"DROP INDEX IF EXISTS {name}")
+    datasets.populate(conn, users, tasks)
+    loaded = time.perf_counter()
+    db.sync_managed_indexes(conn)
+    conn.execute("ANALYZE")
+    conn.commit()
+    print(f"  load {loaded - start:.1f}s, indexes + ANALYZE {time.perf_counter() - loaded:.1f}s")
+
+
+def _timed(conn, sql: str, params: tuple):
+    if not sql.lstrip().upper().startswith("SELECT"):
+        return None, None  # plans only; do not modify the dataset
+    start = time.perf_counter()
+    rows = conn.execute(sql, params or ()).fetchall()
+    return (time.perf_counter() - start) * 1000, len(rows)
+
+
+def run_checks(conn, tenants):
+    failures = []
+    for tenant_label, email in tenants:
+        print(f"\n== {tenant_label}: {email}")
+        last_task = {"id": 123, "task_name": "Gym session"}
+        cases = []
+        for command in FAST_PATH_COMMANDS:
+            intent = intent_parser.parse_command(command, "Bench", email, last_task, record_stats=False)
+            cases.append((f"fast: {command}", intent.sql, intent.params, True))
+        for label, template, expected_ok in LLM_STYLE_QUERIES:
+            cases.append((label, template.format(email=email), (), expected_ok))
+        for label, sql, params, expected_ok in cases:
+            report = query_planner.explain_query_plan(sql, params, conn)
+            elapsed_ms, rows = _timed(conn, sql, params)
+            timing = f"{elapsed_ms:8.1f} ms {rows:>7} rows" if elapsed_ms is not None else " " * 24
+            verdict = "ok" if report.ok else "FLAGGED: " + "; ".join(report.problems)
+            marker = "" if report.ok == expected_ok else "   <-- unexpected"
+            print(f"  {label:<40} {timing}  {verdict}{marker}")
+            if report.ok != expected_ok:
+                failures.append((tenant_label, label, report))
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=2_000_000)
+    parser.add_argument("--users", type=int, default=5_000)
+    parser.add_argument("--db", default=None, help="database file to build or reuse (default: temporary file)")
+    parser.add_argument("--strict", action="store_true", help="exit 1 when a plan does not match expectations")
+    args = parser.parse_args()
+
+    db_path = args.db or os.path.join(os.path.dirname(os.path.abspath(__file__)), f"plan_check_{args.tasks}.db")
+    db.create_db_and_table(db_path)
+    with db.connection(db_path) as conn:
+        build_dataset(conn, db_path, args.users, args.tasks)
+        sizes = conn.execute(
+            "SELECT user_email, COUNT(*) AS n FROM tasks GROUP BY user_email ORDER BY n DESC"
+        ).fetchall()
+        tenants = [("largest tenant", sizes[0][0]), ("median tenant", sizes[len(sizes) // 2][0])]
+        print(f"{sum(n for _, n in sizes):,} tasks, {len(sizes):,} users; largest tenant has {sizes[0][1]:,} tasks")
+
+        failures = run_checks(conn, tenants)
+    if not args.db:
+        db.close_connections()
+        os.remove(db_path)
+    if failures:
+        print(f"\n{len(failures)} plan(s) did not match expectations.")
+        if args.strict:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Estimated prompt tokens per SQL-generation request with intent-specific rule
+sections, compared with sending every section, over a command mix.
+
+    python -m benchmarks.prompt_size --mix default --commands 1000
+
+The stable prefix is what provider-side context caching can reuse across requests.
+"""
+import argparse
+import os
+import tempfile
+from collections import Counter, defaultdict
+
+import database as db
+import prompt_builder
+from benchmarks import datasets
+
+TODAY = "Sunday, 18 October 2026 (2026-10-18)"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mix", choices=sorted(datasets.COMMAND_MIXES), default="default")
+    parser.add_argument("--commands", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "prompt_size.db")
+        db.create_db_and_table(db_path)
+        table_info = db.get_db_info(db_path)
+        db.close_connections()
+
+    context = "Task context - id: 123, name: 'Team sync', due_date: 2026-10-20"
+    per_intent = defaultdict(list)
+    full_tokens = []
+    for user_index, command in datasets.iter_commands(args.commands, 100, args.mix, args.seed):
+        email = datasets.user_email(user_index)
+        prompt = prompt_builder.build_sql_prompt(command, table_info, f"User {user_index}", email, TODAY, context)
+        full = prompt_builder.build_sql_prompt(command, table_info, f"User {user_index}", email, TODAY, context, intent="any")
+        per_intent[prompt.intent].append(prompt)
+        full_tokens.append(full.total_tokens)
+
+    total = sum(p.total_tokens for prompts in per_intent.values() for p in prompts)
+    print(f"{args.commands} commands ({args.mix} mix)")
+    print(f"  {'intent':<8}{'share':>7}{'prefix':>9}{'tokens':>9}")
+    counts = Counter({intent: len(prompts) for intent, prompts in per_intent.items()})
+    for intent, count in counts.most_common():
+        prompts = per_intent[intent]
+        print(f"  {intent:<8}{count / args.commands:>7.0%}{prompts[0].prefix_tokens:>9}"
+              f"{sum(p.total_tokens for p in prompts) / count:>9.0f}")
+    print(f"  average tokens/request: {total / args.commands:.0f} vs {sum(full_tokens) / args.commands:.0f} "
+          f"with every rule section ({1 - total / sum(full_tokens):.0%} fewer)")
+
+
+if __name__ == "__main__":
+    main()
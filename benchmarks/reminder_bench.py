@@ -0,0 +1,121 @@
+"""
+Reminder scheduler cost with many pending tasks.
+
+Loads --tasks pending tasks due over the next day (plus as many completed or later
+ones that the window query must skip), then reports:
+
+- the initial window load (time, CPU, tasks queued);
+- execute_dml_query throughput with and without the scheduler running;
+- CPU used by the idle scheduler thread over --idle-seconds;
+- delivery throughput when a batch of reminders falls due at once.
+
+    python -m benchmarks.reminder_bench --tasks 300000 --changes 2000
+"""
+import argparse
+import os
+import random
+import resource
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import database as db
+import reminders
+
+INSERT_SQL = "INSERT INTO tasks (user_name, user_email, task_name, status, due_date, due_time) VALUES (?, ?, ?, ?, ?, ?)"
+
+
+def _populate(tasks: int, users: int, start: datetime, seed: int = 42, chunk_size: int = 50000):
+    rng = random.Random(seed)
+    with db.connection() as conn:
+        rows = []
+        for n in range(tasks * 2):
+            in_window = n % 2 == 0
+            due = start + timedelta(minutes=rng.randint(60, 24 * 60 - 1) if in_window else rng.randint(3 * 24 * 60, 90 * 24 * 60))
+            status = "pending" if in_window or n % 4 == 1 else "completed"
+            u = rng.randrange(users)
+            rows.append((f"User {u}", f"user{u}@example.com", f"Task #{n}", status,
+                         due.date().isoformat(), due.strftime("%H:%M")))
+            if len(rows) >= chunk_size:
+                conn.executemany(INSERT_SQL, rows)
+                conn.commit()
+                rows = []
+        if rows:
+            conn.executemany(INSERT_SQL, rows)
+            conn.commit()
+        conn.execute("ANALYZE")
+
+
+def _dml_rate(changes: int, users: int, start: datetime, seed: int = 7) -> float:
+    rng = random.Random(seed)
+    with db.connection() as conn:
+        max_id = conn.execute("SELECT MAX(id) FROM tasks").fetchone()[0]
+    began = time.perf_counter()
+    for n in range(changes):
+        task_id, user_email = rng.randint(1, max_id), f"user{rng.randrange(users)}@example.com"
+        if n % 3 == 0:
+            due = start + timedelta(minutes=rng.randint(60, 24 * 60 - 1))
+            db.execute_dml_query(
+                "INSERT INTO tasks (user_name, user_email, task_name, due_date, due_time) VALUES (?, ?, ?, ?, ?)",
+                ("Bench", user_email, f"bench {seed}-{n}", due.date().isoformat(), due.strftime("%H:%M")), user_email)
+        elif n % 3 == 1:
+            db.execute_dml_query("UPDATE tasks SET status = 'completed' WHERE id = ? AND user_email = ?",
+                                 (task_id, user_email), user_email)
+        else:
+            db.execute_dml_query("UPDATE tasks SET due_time = '23:59' WHERE id = ? AND user_email = ?",
+                                 (task_id, user_email), user_email)
+    return changes / (time.perf_counter() - began)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=300000, help="pending tasks due within the window")
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--changes", type=int, default=2000, help="DML statements per throughput run")
+    parser.add_argument("--idle-seconds", type=float, default=5.0)
+    parser.add_argument("--due-minutes", type=int, default=30, help="minutes of reminders to fire at once")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_FILENAME = os.path.join(tmp, "tasks.db")
+        db.DB_SHARDS = "1"
+        db.task_store = None
+        db.create_db_and_table()
+        start = datetime.now().replace(second=0, microsecond=0)
+        began = time.perf_counter()
+        _populate(args.tasks, args.users, start)
+        print(f"populated {args.tasks * 2:,} tasks in {time.perf_counter() - began:.1f}s")
+
+        offset = [0.0]
+        sink = reminders.MemorySink()
+        scheduler = reminders.ReminderScheduler(sink, lead_minutes=0, resync_seconds=0,
+                                                clock=lambda: time.time() + offset[0])
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        began, cpu = time.perf_counter(), time.process_time()
+        scheduler.run_pending()
+        stats = scheduler.stats()
+        print(f"initial load: {stats['queued']:,} queued in {time.perf_counter() - began:.2f}s "
+              f"({time.process_time() - cpu:.2f}s CPU), max RSS +{(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) / 1024:.0f} MB")
+
+        print(f"DML without scheduler: {_dml_rate(args.changes, args.users, start, seed=1):8.0f} statements/s")
+        # As in the app: the thread is running and the listener queues each write for it.
+        scheduler.start()
+        print(f"DML with scheduler:    {_dml_rate(args.changes, args.users, start, seed=2):8.0f} statements/s")
+        time.sleep(0.5)
+        cpu = time.process_time()
+        time.sleep(args.idle_seconds)
+        print(f"idle scheduler thread: {time.process_time() - cpu:.4f}s CPU over {args.idle_seconds:.0f}s "
+              f"({scheduler.stats()['sent']} sent)")
+        scheduler.stop()
+
+        offset[0] = 60 * (60 + args.due_minutes)
+        began, cpu = time.perf_counter(), time.process_time()
+        sent = scheduler.run_pending()
+        elapsed = time.perf_counter() - began
+        print(f"delivery: {sent:,} reminders in {elapsed:.3f}s ({sent / elapsed if elapsed else 0:,.0f}/s, "
+              f"{time.process_time() - cpu:.3f}s CPU); {scheduler.stats()}")
+        db.close_connections()
+
+
+if __name__ == "__main__":
+    main()
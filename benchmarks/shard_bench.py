@@ -0,0 +1,85 @@
+"""
+Write throughput against one database file versus hash shards.
+
+Each worker process commits single-task INSERTs through database.execute_dml_query
+for its own users, like separate app server processes would. With one file every
+commit queues on the same write lock; with shards, writers for different shards
+proceed in parallel, so throughput should grow with the shard count up to the number
+of cores.
+
+    python -m benchmarks.shard_bench --shards 1 4 8 --processes 8 --writes 2000
+"""
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import time
+
+import database as db
+
+
+def _configure(tmp: str, shards: int):
+    db.DB_FILENAME = os.path.join(tmp, "tasks.db")
+    db.DB_SHARDS = str(shards)
+    db.DB_SHARD_DIR = os.path.join(tmp, "shards")
+
+
+def _worker(tmp: str, shards: int, worker_id: int, writes: int, users_per_worker: int, start_at: float):
+    _configure(tmp, shards)
+    db.task_store = None
+    errors = 0
+    while time.time() < start_at:
+        time.sleep(0.001)
+    for n in range(writes):
+        user_email = f"user{worker_id * users_per_worker + n % users_per_worker}@example.com"
+        try:
+            db.execute_dml_query(
+                "INSERT INTO tasks (user_name, user_email, task_name, due_date) VALUES (?, ?, ?, ?)",
+                ("Bench", user_email, f"write {worker_id}-{n}", "2026-02-01"),
+                user_email,
+            )
+        except sqlite3.OperationalError:
+            errors += 1
+    db.close_connections()
+    return errors
+
+
+def _run(shards: int, processes: int, writes: int, users_per_worker: int) -> float:
+    with tempfile.TemporaryDirectory() as tmp:
+        _configure(tmp, shards)
+        db.create_db_and_table()
+        for user in range(processes * users_per_worker):
+            db.route(f"user{user}@example.com")
+        db.close_connections()
+        start_at = time.time() + 0.5
+        context = multiprocessing.get_context("spawn")
+        with context.Pool(processes) as pool:
+            pending = [pool.apply_async(_worker, (tmp, shards, i, writes, users_per_worker, start_at))
+                       for i in range(processes)]
+            errors = sum(p.get() for p in pending)
+        elapsed = time.time() - start_at
+        total = processes * writes
+        files = len(db.shard_paths())
+        print(f"shards={shards:<3} {files:>3} file(s)  {total:>7} commits in {elapsed:7.3f}s  ->  "
+              f"{total / elapsed:9.1f} commits/s  ({errors} lock errors)")
+        return total / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--writes", type=int, default=2000, help="commits per process")
+    parser.add_argument("--users-per-process", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{args.processes} writer process(es), {os.cpu_count()} CPU(s)")
+    results = {shards: _run(shards, args.processes, args.writes, args.users_per_process) for shards in args.shards}
+    baseline = results.get(1) or next(iter(results.values()))
+    for shards, rate in results.items():
+        print(f"  {shards} shard(s): {rate / baseline:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""
+Bulk command mode: several task changes in one message.
+
+"add dentist Monday 3pm, gym Tuesday 7am, and report due Friday" is sent to the
+LLM once (llm_handler.generate_bulk_operations) and comes back as a JSON list of
+operations. This module detects such messages, parses and validates the list, and
+database.apply_task_operations applies the valid items with executemany in a single
+transaction, returning one result per item.
+"""
+import json
+import re
+from datetime import datetime
+
+import intent_parser
+
+BULK_MAX_ITEMS = 100
+BULK_PREFIX = "bulk:"
+OPERATIONS = ("add", "update", "delete")
+STATUSES = ("pending", "completed", "cancelled")
+UPDATABLE_FIELDS = ("task_name", "status", "category", "due_date", "due_time")
+MAX_TASK_NAME_LENGTH = 200
+
+_QUOTED_RE = re.compile(r"""['"‘’“”][^'"‘’“”]*['"‘’“”]""")
+_SEGMENT_SPLIT_RE = re.compile(r"\s*(?:;|,\s*(?:and\s+)?|\band\s+(?:then\s+)?)\s*", re.IGNORECASE)
+_SCHEDULE_CUE_RE = re.compile(
+    r"\b(?:today|tonight|tomorrow|monday|tuesday|wednesday|thursday|friday|saturday|sunday|mon|tue|wed|thu|fri|sat|sun|"
+    r"next \w+|this \w+|in \d+ days?|\d{4}-\d{2}-\d{2}|\d{1,2}(?::\d{2})?\s*(?:am|pm)|\d{1,2}:\d{2}|noon|midnight)\b",
+    re.IGNORECASE,
+)
+# Bulk messages are commands: the first part starts with a write verb, and later parts
+# either start with one or continue the previous verb ("add A monday, B tuesday").
+_WRITE_START_RE = re.compile(
+    r"(?:(?:please|also|then|and|can you|could you)\s+)*"
+    r"(?:add|create|schedule|book|plan|put|new|remind me|i have|i've got|i need to|"
+    r"update|change|move|reschedule|rename|set|mark|complete|finish|cancel|delete|remove|drop)\b",
+    re.IGNORECASE,
+)
+_QUESTION_START_RE = re.compile(
+    r"(?:(?:and|also|then)\s+)?"
+    r"(?:what|what's|which|when|where|who|how|why|show|list|display|view|get|give me|find|search|"
+    r"is|are|any|am i|do i|did i|have i)\b",
+    re.IGNORECASE,
+)
+_CUE_FILLER_RE = re.compile(r"\b(?:at|on|by|due|for|the|a|an|my|tasks?|and)\b", re.IGNORECASE)
+_JSON_FENCE_RE = re.compile(r"^```(?:json)?\s*|\s*```$", re.IGNORECASE)
+
+
+def split_segments(text: str):
+    """Splits a message on newlines, semicolons, commas and 'and' (quoted names are kept whole)."""
+    masked = _QUOTED_RE.sub(lambda m: "x" * len(m.group(0)), text)
+    segments, start = [], 0
+    for line_match in re.finditer(r"[^\n]+", masked):
+        line_start, line = line_match.start(), line_match.group(0)
+        start = 0
+        for sep in _SEGMENT_SPLIT_RE.finditer(line):
+            segments.append(text[line_start + start:line_start + sep.start()])
+            start = sep.end()
+        segments.append(text[line_start + start:line_start + len(line)])
+    return [s.strip() for s in segments if s.strip()]
+
+
+def looks_like_bulk(user_query: str) -> bool:
+    """
+    True for messages that describe several task changes: an explicit "bulk:" prefix,
+    or a command (the first part starts with a write verb and no part is a question)
+    that spans several non-empty lines or has at least two comma/"and"-separated
+    parts that each name something *and* carry a date or time.
+    """
+    text = (user_query or "").strip()
+    if text.lower().startswith(BULK_PREFIX):
+        return True
+    segments = split_segments(text)
+    # "what do I have tomorrow, and what's due friday" asks two questions.
+    if not segments or not _WRITE_START_RE.match(segments[0]):
+        return False
+    if any(_QUESTION_START_RE.match(segment) or segment.endswith("?") for segment in segments):
+        return False
+    if len([line for line in text.splitlines() if line.strip()]) >= 2:
+        return True
+    scheduled_items = 0
+    for segment in segments:
+        if not _SCHEDULE_CUE_RE.search(segment):
+            continue
+        # "show tasks for today and tomorrow": the bare "tomorrow" part names nothing.
+        remainder = _CUE_FILLER_RE.sub(" ", _SCHEDULE_CUE_RE.sub(" ", segment))
+        if re.search(r"[a-z]{2,}", remainder, re.IGNORECASE):
+            scheduled_items += 1
+    return scheduled_items >= 2
+
+
+def strip_bulk_prefix(user_query: str) -> str:
+    text = user_query.strip()
+    return text[len(BULK_PREFIX):].strip() if text.lower().startswith(BULK_PREFIX) else text
+
+
+def parse_operations(response: str) -> list:
+    """Parses the model's JSON answer into a list of dicts; raises ValueError when it is not one."""
+    text = _JSON_FENCE_RE.sub("", (response or "").strip()).strip()
+    if not text.startswith("["):
+        start, end = text.find("["), text.rfind("]")
+        if start == -1 or end <= start:
+            raise ValueError("The model did not return a list of operations.")
+        text = text[start:end + 1]
+    try:
+        operations = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"The model returned malformed JSON for the bulk operations: {e}")
+    if not isinstance(operations, list):
+        raise ValueError("The model did not return a list of operations.")
+    return operations
+
+
+def _valid_date(value):
+    if value in (None, ""):
+        return None
+    try:
+        return datetime.strptime(str(value), "%Y-%m-%d").date().isoformat()
+    except ValueError:
+        raise ValueError(f"invalid due_date {value!r}, expected YYYY-MM-DD")
+
+
+def _valid_time(value):
+    if value in (None, ""):
+        return None
+    resolved = intent_parser.resolve_time(str(value))
+    if resolved is None:
+        raise ValueError(f"invalid due_time {value!r}, expected HH:MM")
+    return resolved
+
+
+def _valid_name(value, field: str = "task_name"):
+    if not isinstance(value, str) or not value.strip():
+        raise ValueError(f"{field} is required")
+    value = " ".join(value.split())
+    if len(value) > MAX_TASK_NAME_LENGTH:
+        raise ValueError(f"{field} is longer than {MAX_TASK_NAME_LENGTH} characters")
+    return value
+
+
+def _valid_status(value):
+    status = str(value or "pending").strip().lower()
+    if status not in STATUSES:
+        raise ValueError(f"invalid status {value!r}")
+    return status
+
+
+def _valid_target(raw: dict) -> dict:
+    task_id, match = raw.get("id"), raw.get("match") or raw.get("task_name")
+    if task_id not in (None, ""):
+        try:
+            return {"id": int(task_id)}
+        except (TypeError, ValueError):
+            raise ValueError(f"invalid id {task_id!r}")
+    if match:
+        return {"match": _valid_name(match, "match")}
+    raise ValueError("needs an id or a task name to match")
+
+
+_FIELD_VALIDATORS = {
+    "task_name": _valid_name,
+    "status": _valid_status,
+    "category": lambda v: _valid_name(v, "category") if v not in (None, "") else None,
+    "due_date": _valid_date,
+    "due_time": _valid_time,
+}
+
+
+def validate_operation(raw) -> dict:
+    """Returns a normalized operation or raises ValueError describing what is wrong."""
+    if not isinstance(raw, dict):
+        raise ValueError("not an object")
+    op = str(raw.get("op", "")).strip().lower()
+    if op not in OPERATIONS:
+        raise ValueError(f"unknown op {raw.get('op')!r}")
+    if op == "add":
+        task_name = _valid_name(raw.get("task_name"))
+        return {
+            "op": "add",
+            "task_name": task_name,
+            "status": _valid_status(raw.get("status")),
+            "category": _FIELD_VALIDATORS["category"](raw.get("category")) or intent_parser.infer_category(task_name),
+            "due_date": _valid_date(raw.get("due_date")),
+            "due_time": _valid_time(raw.get("due_time")),
+        }
+    operation = {"op": op, **_valid_target(raw)}
+    if op == "update":
+        changes = raw.get("set")
+        if not isinstance(changes, dict) or not changes:
+            raise ValueError("update needs a non-empty 'set' object")
+        unknown = set(changes) - set(UPDATABLE_FIELDS)
+        if unknown:
+            raise ValueError(f"cannot update {', '.join(sorted(unknown))}")
+        operation["set"] = {field: _FIELD_VALIDATORS[field](value) for field, value in changes.items()}
+    return operation
+
+
+def validate_operations(raw_operations: list):
+    """
+    Splits the model's list into (valid, rejected). `valid` holds (index, operation)
+    pairs; `rejected` holds per-item result dicts in the same shape as
+    database.apply_task_operations returns.
+    """
+    if len(raw_operations) > BULK_MAX_ITEMS:
+        raise ValueError(f"Too many operations in one bulk command ({len(raw_operations)} > {BULK_MAX_ITEMS}).")
+    valid, rejected = [], []
+    for index, raw in enumerate(raw_operations):
+        try:
+            valid.append((index, validate_operation(raw)))
+        except ValueError as e:
+            fields = raw if isinstance(raw, dict) else {}
+            label = fields.get("task_name") or fields.get("match")
+            op = fields.get("op")
+            rejected.append({"index": index, "op": op, "task_name": label, "id": None,
+                             "result": "invalid", "message": str(e)})
+    return valid, rejected
+
+
+def summarize_results(results: list) -> str:
+    """One-line summary context for the template/LLM summary, e.g. '3 added, 1 skipped (of 4).'"""
+    counts = {}
+    for item in results:
+        counts[item["result"]] = counts.get(item["result"], 0) + 1
+    if not results:
+        return "No operations were found in the bulk command."
+    parts = ", ".join(f"{count} {result.replace('_', ' ')}" for result, count in counts.items())
+    return f"Bulk command: {parts} (of {len(results)} operation(s))."
@@ -1,11 +1,311 @@
+import atexit
+import functools
+import logging
+import os
+import queue
+import re
 import sqlite3
-from langchain_community.utilities.sql_database import SQLDatabase
+import threading
+import zlib
+from contextlib import contextmanager
+import telemetry
+from task_store import RETURNING_FIELDS, TASK_FIELDS, TaskStore
+
+logger = logging.getLogger(__name__)
 
 DB_FILENAME = "tasks.db"
-DB_PATH_URI = f"sqlite:///{DB_FILENAME}"
 
-def create_db_and_table():
-    conn = sqlite3.connect(DB_FILENAME)
+# --- Connection Manager ---
+# A process-wide pool of at most DB_POOL_SIZE connections per database file. Callers
+# check a connection out with `with connection(path) as conn:` and it goes back to the
+# pool afterwards, so the connect and PRAGMA cost is paid once per pooled connection
+# rather than once per thread: Streamlit runs every rerun of a session on a new script
+# thread, so thread-local connections would never be reused. Connections are opened
+# with check_same_thread=False and used by one thread at a time; a thread that already
+# holds a connection to a file gets the same one back, so nested calls share it.
+BUSY_TIMEOUT_MS = 5000
+DB_POOL_SIZE = max(1, int(os.getenv("DB_POOL_SIZE", "8")))
+DB_POOL_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "30"))
+STATEMENT_CACHE_SIZE = 256
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",        # readers no longer block the writer
+    "PRAGMA synchronous = NORMAL",      # safe with WAL, avoids an fsync per commit
+    f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -8000",         # ~8 MB page cache per connection
+    "PRAGMA mmap_size = 67108864",
+)
+
+# --- Managed Indexes ---
+# Secondary indexes owned by create_db_and_table. Any other index named with the
+# MANAGED_INDEX_PREFIX is treated as stale and dropped, so changing this dict is
+# the whole migration. The "IS NULL" terms let SQLite walk the index for the
+# default listing order (DEFAULT_ORDER_BY) instead of sorting in a temp B-tree;
+# the trailing columns make the common listings covering.
+MANAGED_INDEX_PREFIX = "idx_tasks_"
+DEFAULT_ORDER_BY = "due_date IS NULL, due_date, due_time IS NULL, due_time, created_at DESC"
+# For listings already filtered with DATED_FILTER (no NULL due dates) the leading
+# "due_date IS NULL" term is constant and must be dropped for SQLite to use the index
+# order after a range condition on due_date.
+DATED_FILTER = "(due_date IS NULL) = 0"
+DATED_ORDER_BY = "due_date, due_time IS NULL, due_time, created_at DESC"
+MANAGED_INDEXES = {
+    # WHERE user_email = ? AND status = ? ORDER BY DEFAULT_ORDER_BY
+    "idx_tasks_user_status_order": (
+        "tasks (user_email, status, due_date IS NULL, due_date, due_time IS NULL, due_time, "
+        "created_at DESC, task_name, category)"
+    ),
+    # WHERE user_email = ? ORDER BY DEFAULT_ORDER_BY
+    "idx_tasks_user_order": (
+        "tasks (user_email, due_date IS NULL, due_date, due_time IS NULL, due_time, "
+        "created_at DESC, task_name, status, category)"
+    ),
+    # WHERE user_email = ? AND due_date BETWEEN ? AND ? ORDER BY DATED_ORDER_BY
+    "idx_tasks_user_due_date": "tasks (user_email, due_date, due_time IS NULL, due_time, created_at DESC)",
+    # WHERE status = 'pending' AND due_date BETWEEN ? AND ? across users (reminders.py); covering
+    "idx_tasks_pending_due": "tasks (due_date, due_time, status) WHERE status = 'pending'",
+}
+
+_held = threading.local()          # db_path -> [conn, depth] for connections this thread has checked out
+_pools = {}                         # db_path -> _ConnectionPool
+_pools_lock = threading.Lock()
+_schema_lock = threading.Lock()
+_schema_ready_paths = set()
+
+def _open_connection(db_path: str):
+    conn = sqlite3.connect(
+        db_path,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        cached_statements=STATEMENT_CACHE_SIZE,
+        check_same_thread=False,
+    )
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+class _ConnectionPool:
+    """Idle connections to one database file; opens new ones up to DB_POOL_SIZE."""
+
+    def __init__(self, db_path: str, size: int):
+        self.db_path = db_path
+        self.size = size
+        self.idle = queue.LifoQueue()
+        self.opened = 0
+        self.closed = False
+        self.lock = threading.Lock()
+
+    def checkout(self):
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self.lock:
+            can_open = self.opened < self.size
+            if can_open:
+                self.opened += 1
+        if can_open:
+            try:
+                return _open_connection(self.db_path)
+            except Exception:
+                with self.lock:
+                    self.opened -= 1
+                raise
+        try:
+            return self.idle.get(timeout=DB_POOL_TIMEOUT_SECONDS)
+        except queue.Empty:
+            raise sqlite3.OperationalError(
+                f"No pooled connection to {self.db_path} became free within {DB_POOL_TIMEOUT_SECONDS:g}s."
+            ) from None
+
+    def checkin(self, conn):
+        if self.closed:
+            self.discard(conn)
+            return
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error as e:
+            logger.warning(f"Discarding pooled connection to {self.db_path}: {e}")
+            self.discard(conn)
+            return
+        self.idle.put(conn)
+
+    def discard(self, conn):
+        with self.lock:
+            self.opened -= 1
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def close_idle(self):
+        while True:
+            try:
+                conn = self.idle.get_nowait()
+            except queue.Empty:
+                return
+            self.discard(conn)
+
+def _pool(db_path: str) -> _ConnectionPool:
+    pool = _pools.get(db_path)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.setdefault(db_path, _ConnectionPool(db_path, DB_POOL_SIZE))
+    return pool
+
+@contextmanager
+def connection(db_path: str = None):
+    """
+    Checks out a pooled connection to `db_path` (defaults to DB_FILENAME) for the
+    duration of the block. A transaction left open by the block is rolled back
+    before the connection is returned.
+    """
+    db_path = db_path or DB_FILENAME
+    held = getattr(_held, "connections", None)
+    if held is None:
+        held = _held.connections = {}
+    entry = held.get(db_path)
+    if entry is not None:
+        entry[1] += 1
+        try:
+            yield entry[0]
+        finally:
+            entry[1] -= 1
+        return
+    pool = _pool(db_path)
+    conn = pool.checkout()
+    held[db_path] = [conn, 1]
+    try:
+        yield conn
+    finally:
+        del held[db_path]
+        pool.checkin(conn)
+
+def close_connections(db_path: str = None):
+    """
+    Closes every idle pooled connection (only those to `db_path` when given); ones
+    checked out are closed as they come back.
+    """
+    with _pools_lock:
+        if db_path is None:
+            pools = list(_pools.values())
+            _pools.clear()
+        else:
+            pool = _pools.pop(db_path, None)
+            pools = [pool] if pool is not None else []
+    for pool in pools:
+        pool.closed = True
+        pool.close_idle()
+
+atexit.register(close_connections)
+
+def create_db_and_table(db_path: str = None):
+    """Creates the tasks table and its indexes once per process and database file."""
+    db_path = db_path or DB_FILENAME
+    if db_path in _schema_ready_paths:
+        return
+    with _schema_lock:
+        if db_path in _schema_ready_paths:
+            return
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        with connection(db_path) as conn:
+            _create_schema(conn)
+            advance_id_sequence(conn, shard_id_base(db_path))
+        _schema_ready_paths.add(db_path)
+
+def advance_id_sequence(conn, seq: int):
+    """Makes the next AUTOINCREMENT task id at least seq + 1."""
+    if seq <= 0:
+        return
+    updated = conn.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'tasks'", (seq,)).rowcount
+    if not updated:
+        conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('tasks', ?)", (seq,))
+    conn.commit()
+
+# --- Sharding ---
+# DB_SHARDS=1 (the default) keeps every user in DB_FILENAME. DB_SHARDS=N spreads users
+# over N files in DB_SHARD_DIR by a stable hash of their email; DB_SHARDS=tenant gives
+# each email domain its own file. Every shard has its own write lock and WAL, so
+# writers for different shards no longer queue behind one file lock. Statements are
+# routed by the acting user's email (generated SQL is unchanged); DB_FILENAME still
+# provides the reference schema for the prompt. shard_migrate.py splits an existing
+# database. Shard file names include N, so changing it never reads the wrong split.
+# Each shard hands out task ids from its own range (shard_id_base), so ids, and the
+# ICS UIDs built from them, stay unique across shards.
+DB_SHARDS = os.getenv("DB_SHARDS", "1").strip().lower()
+DB_SHARD_DIR = os.getenv("DB_SHARD_DIR", "shards")
+HASH_SHARD_ID_SPAN = 10 ** 12       # ids per hash shard
+TENANT_SHARD_ID_SPAN = 2 ** 31      # ids per tenant file; 2**32 slots keep ids below 2**63
+_TENANT_SLUG_RE = re.compile(r"[^a-z0-9.-]+")
+_HASH_SHARD_FILE_RE = re.compile(r"tasks-(\d+)-of-\d+\.db")
+_TENANT_SHARD_FILE_RE = re.compile(r"tenant-(.+)\.db")
+
+def shard_count():
+    """Number of hash shards, or None in tenant mode."""
+    return None if DB_SHARDS == "tenant" else max(1, int(DB_SHARDS))
+
+def is_sharded() -> bool:
+    return shard_count() != 1
+
+def shard_path(user_email: str) -> str:
+    """Database file that holds `user_email`'s tasks."""
+    key = (user_email or "").strip().lower()
+    shards = shard_count()
+    if shards is None:
+        tenant = _TENANT_SLUG_RE.sub("_", key.rpartition("@")[2]) or "_"
+        return os.path.join(DB_SHARD_DIR, f"tenant-{tenant}.db")
+    if shards == 1:
+        return DB_FILENAME
+    bucket = zlib.crc32(key.encode("utf-8")) % shards
+    return os.path.join(DB_SHARD_DIR, f"tasks-{bucket:03d}-of-{shards:03d}.db")
+
+def shard_id_base(db_path: str) -> int:
+    """
+    Where the id range of the shard at `db_path` starts: bucket * HASH_SHARD_ID_SPAN
+    for hash shards, CRC-32(domain) * TENANT_SHARD_ID_SPAN for tenant files (distinct
+    domains can share a slot, though rarely), and 0 for any other database.
+    """
+    name = os.path.basename(db_path)
+    match = _HASH_SHARD_FILE_RE.fullmatch(name)
+    if match:
+        return int(match.group(1)) * HASH_SHARD_ID_SPAN
+    match = _TENANT_SHARD_FILE_RE.fullmatch(name)
+    if match:
+        return zlib.crc32(match.group(1).encode("utf-8")) * TENANT_SHARD_ID_SPAN
+    return 0
+
+def shard_paths():
+    """Every database file holding tasks: all hash shards, or the tenant files created so far."""
+    shards = shard_count()
+    if shards is None:
+        if not os.path.isdir(DB_SHARD_DIR):
+            return []
+        return sorted(os.path.join(DB_SHARD_DIR, name) for name in os.listdir(DB_SHARD_DIR)
+                      if name.startswith("tenant-") and name.endswith(".db"))
+    if shards == 1:
+        return [DB_FILENAME]
+    return [os.path.join(DB_SHARD_DIR, f"tasks-{bucket:03d}-of-{shards:03d}.db") for bucket in range(shards)]
+
+def route(user_email: str = None) -> str:
+    """
+    Database file for a statement acting on behalf of `user_email`, with its schema
+    created. Sharded deployments need the email; without one the statement could only
+    guess a shard, so ValueError is raised.
+    """
+    if not is_sharded():
+        return DB_FILENAME
+    if not user_email:
+        raise ValueError("A user email is needed to pick the database shard for this query.")
+    path = shard_path(user_email)
+    create_db_and_table(path)
+    return path
+
+def connection_for(user_email: str = None):
+    """connection() to the database that holds `user_email`'s tasks."""
+    return connection(route(user_email))
+
+def _create_schema(conn):
     cursor = conn.cursor()
     cursor.execute("""
     CREATE TABLE IF NOT EXISTS tasks (
@@ -26,70 +326,667 @@ def create_db_and_table():
         ON tasks (user_email, task_name, due_date, COALESCE(due_time, ''));
         """)
     except sqlite3.OperationalError as e:
-        print(f"Warning: Could not create unique index idx_unq_user_task, it might exist or conflict: {e}")
+        logger.warning(f"Could not create unique index idx_unq_user_task, it might exist or conflict: {e}")
     conn.commit()
-    conn.close()
+    sync_managed_indexes(conn)
 
-def get_db_info():
-    db = SQLDatabase.from_uri(DB_PATH_URI, include_tables=['tasks'])
-    return db.get_table_info()
-
-def get_task_by_id(task_id: int, user_email: str):
-    query = "SELECT id, task_name, status, category, due_date, due_time, created_at FROM tasks WHERE id = ? AND user_email = ?"
-    conn = sqlite3.connect(DB_FILENAME)
+def sync_managed_indexes(conn):
+    """Creates missing managed indexes and drops stale ones (also useful after bulk loads)."""
     cursor = conn.cursor()
-    try:
-        cursor.execute(query, (task_id, user_email))
-        data = cursor.fetchone()
-        if data:
-            columns = [description[0] for description in cursor.description]
-            return dict(zip(columns, data))
+    existing = {
+        name for (name,) in cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'tasks' AND name LIKE ?",
+            (MANAGED_INDEX_PREFIX + "%",),
+        )
+    }
+    for name in existing - set(MANAGED_INDEXES):
+        cursor.execute(f"DROP INDEX IF EXISTS {name}")
+    for name, definition in MANAGED_INDEXES.items():
+        try:
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {definition}")
+        except sqlite3.OperationalError as e:
+            logger.warning(f"Could not create index {name}: {e}")
+    conn.commit()
+    cursor.execute("PRAGMA optimize")
+
+# --- Schema Descriptor ---
+# Compact schema text for the SQL generation prompt, built from PRAGMA introspection.
+# Cached per database file and rebuilt only when PRAGMA schema_version changes.
+SCHEMA_TABLES = ("tasks",)
+COLUMN_NOTES = {
+    "tasks": {
+        "id": "unique task id",
+        "user_name": "name of the user",
+        "user_email": "owner of the task, always filter on it",
+        "task_name": "short task description",
+        "status": "'pending', 'completed' or 'cancelled'",
+        "category": "e.g. 'Work', 'Personal', 'School', 'Meeting'",
+        "created_at": "'YYYY-MM-DD HH:MM:SS', set by the database",
+        "due_date": "'YYYY-MM-DD'",
+        "due_time": "'HH:MM' 24-hour, NULL when no time is given",
+    },
+}
+
+_schema_info_cache = {}
+_schema_info_lock = threading.Lock()
+
+def _describe_table(conn, table: str) -> str:
+    notes = COLUMN_NOTES.get(table, {})
+    autoincrement = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_sequence'"
+    ).fetchone() is not None
+    columns = list(conn.execute(f"PRAGMA table_info({table})"))
+    lines = []
+    for position, (_cid, name, col_type, notnull, default, pk) in enumerate(columns):
+        parts = [name, col_type or ""]
+        if pk:
+            parts.append("PRIMARY KEY" + (" AUTOINCREMENT" if autoincrement and col_type.upper() == "INTEGER" else ""))
+        if notnull:
+            parts.append("NOT NULL")
+        # Only literal defaults; expression defaults (created_at) are described by the note.
+        if default is not None and re.fullmatch(r"'[^']*'|-?\d+(?:\.\d+)?|NULL", default):
+            parts.append(f"DEFAULT {default}")
+        line = " ".join(p for p in parts if p)
+        if position < len(columns) - 1:
+            line += ","
+        if name in notes:
+            line += f" -- {notes[name]}"
+        lines.append(f"  {line}")
+    if not lines:
+        return ""
+    described = f"TABLE {table} (\n" + "\n".join(lines) + "\n)"
+    for _seq, index_name, unique, _origin, _partial in conn.execute(f"PRAGMA index_list({table})"):
+        if not unique:
+            continue
+        row = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'index' AND name = ?", (index_name,)).fetchone()
+        if row and row[0]:
+            match = re.search(r"\((.*)\)", row[0], re.DOTALL)
+            if match:
+                described += f"\nUNIQUE ({' '.join(match.group(1).split())})"
+    return described
+
+def get_db_info(db_path: str = None) -> str:
+    """Returns the compact schema descriptor, recomputing it only after a schema change."""
+    db_path = db_path or DB_FILENAME
+    with connection(db_path) as conn:
+        schema_version = conn.execute("PRAGMA schema_version").fetchone()[0]
+        cached = _schema_info_cache.get(db_path)
+        if cached and cached[0] == schema_version:
+            return cached[1]
+        with _schema_info_lock:
+            info = "\n".join(filter(None, (_describe_table(conn, table) for table in SCHEMA_TABLES)))
+            _schema_info_cache[db_path] = (schema_version, info)
+    return info
+
+# --- Task store ---
+# Recently active users' tasks are kept in memory (task_store.TaskStore): lookups by id
+# and fast-path listings are answered without touching disk, and writes through
+# execute_dml_query are applied write-through. Set TASK_STORE_MAX_ROWS=0 to disable it.
+TASK_STORE_MAX_ROWS = int(os.getenv("TASK_STORE_MAX_ROWS", "20000"))
+TASK_STORE_MAX_USER_TASKS = int(os.getenv("TASK_STORE_MAX_USER_TASKS", "1000"))
+TASK_STORE_TTL_SECONDS = float(os.getenv("TASK_STORE_TTL_SECONDS", "300"))
+
+def _load_user_tasks(db_path: str, user_email: str, limit: int):
+    with connection(db_path) as conn, telemetry.span("db.load_user_tasks") as span:
+        rows = conn.execute(
+            f"SELECT {', '.join(TASK_FIELDS)} FROM tasks WHERE user_email = ? LIMIT ?", (user_email, limit)
+        ).fetchall()
+        span.set(rows=len(rows))
+    return rows
+
+task_store = TaskStore(
+    _load_user_tasks,
+    max_rows=TASK_STORE_MAX_ROWS,
+    max_user_tasks=TASK_STORE_MAX_USER_TASKS,
+    ttl_seconds=TASK_STORE_TTL_SECONDS,
+) if TASK_STORE_MAX_ROWS > 0 else None
+
+# --- Change Listeners ---
+# Callbacks told about committed writes, e.g. the reminder scheduler. Each is called as
+# listener(db_path, user_email, kind, rows): `rows` are the RETURNING_FIELDS rows of a
+# write-through write of `kind` ("insert", "update" or "delete"), or None when only the
+# acting user is known (user_email None: any user's tasks may have changed).
+_change_listeners = []
+
+def add_change_listener(listener):
+    _change_listeners.append(listener)
+
+def remove_change_listener(listener):
+    if listener in _change_listeners:
+        _change_listeners.remove(listener)
+
+def _publish_change(db_path: str, user_email: str, kind: str = None, rows=None):
+    for listener in list(_change_listeners):
+        try:
+            listener(db_path, user_email, kind, rows)
+        except Exception as e:
+            logger.error(f"Change listener {listener!r} failed: {e}")
+
+def _tasks_changed(db_path: str, user_email: str):
+    """A committed write that cannot be described row by row: drop cached tasks and tell listeners."""
+    if task_store is not None:
+        task_store.invalidate(user_email, db_path)
+    _publish_change(db_path, user_email)
+
+_WRITE_TARGET_RE = re.compile(
+    r"\s*(?:INSERT(?:\s+OR\s+(?P<insert_or>\w+))?\s+INTO|(?P<replace>REPLACE)\s+INTO|"
+    r"(?P<update>UPDATE)(?:\s+OR\s+(?P<update_or>\w+))?|(?P<delete>DELETE)\s+FROM)"
+    r"\s+[\"`\[]?tasks[\"`\]]?(?=[\s(]|$)",
+    re.IGNORECASE,
+)
+_STRING_LITERAL_RE = re.compile(r"'(?:[^']|'')*'")
+
+def _replaces_rows(query: str) -> bool:
+    """True for writes on `tasks` with REPLACE conflict resolution."""
+    match = _WRITE_TARGET_RE.match(query)
+    if not match:
+        return False
+    conflict = (match.group("insert_or") or match.group("update_or") or "").upper()
+    return bool(match.group("replace")) or conflict == "REPLACE"
+
+@functools.lru_cache(maxsize=256)
+def _write_through_sql(query: str):
+    """
+    Returns (kind, query + RETURNING) for single-statement writes on `tasks` whose
+    effect the task store can follow from the returned rows, otherwise None. REPLACE
+    conflict resolution deletes rows without returning them, and a trailing comment,
+    second statement, ORDER BY/LIMIT or existing RETURNING leaves no place to add one.
+    """
+    text = query.strip().rstrip(";").rstrip()
+    match = _WRITE_TARGET_RE.match(text)
+    if not match:
         return None
-    except sqlite3.Error as e:
-        print(f"Error fetching task by ID {task_id}: {e}")
+    if _replaces_rows(text):
         return None
-    finally:
-        conn.close()
+    bare = _STRING_LITERAL_RE.sub("''", text)
+    if ";" in bare or "--" in bare or "/*" in bare:
+        return None
+    words = {word.upper() for _pos, word in _top_level_keywords(text)}
+    if "RETURNING" in words:
+        return None
+    kind = "update" if match.group("update") else "delete" if match.group("delete") else "insert"
+    if kind != "insert" and words & {"ORDER", "LIMIT"}:
+        return None
+    return kind, f"{text} RETURNING {', '.join(RETURNING_FIELDS)}"
 
-def execute_select_query(query: str, params: tuple = None):
-    conn = sqlite3.connect(DB_FILENAME)
-    cursor = conn.cursor()
-    try:
-        cursor.execute(query, params or ())
-        data = cursor.fetchall()
-        columns = [description[0] for description in cursor.description] if cursor.description else []
-        return data, columns
-    except sqlite3.Error as e:
-        print(f"Error executing SELECT query: {query}\n{e}")
-        raise
-    finally:
-        conn.close()
+def get_task_by_id(task_id: int, user_email: str):
+    query = "SELECT id, task_name, status, category, due_date, due_time, created_at FROM tasks WHERE id = ? AND user_email = ?"
+    with telemetry.span("db.get_task", cache_hit=False) as span:
+        db_path = route(user_email)
+        if task_store is not None and isinstance(task_id, int):
+            answered, task = task_store.get_task(user_email, task_id, db_path)
+            if answered:
+                span.set(cache_hit=True, rows=1 if task else 0)
+                return task
+        with connection(db_path) as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(query, (task_id, user_email))
+                data = cursor.fetchone()
+                span.set(rows=1 if data else 0)
+                if data:
+                    columns = [description[0] for description in cursor.description]
+                    return dict(zip(columns, data))
+                return None
+            except sqlite3.Error as e:
+                logger.error(f"Error fetching task by ID {task_id}: {e}")
+                return None
+            finally:
+                cursor.close()
 
-def execute_dml_query(query: str, params: tuple = None):
-    conn = sqlite3.connect(DB_FILENAME)
-    cursor = conn.cursor()
+def execute_select_query(query: str, params: tuple = None, user_email: str = None):
+    with connection_for(user_email) as conn, telemetry.span("db.select") as span:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(query, params or ())
+            data = cursor.fetchall()
+            columns = [description[0] for description in cursor.description] if cursor.description else []
+            span.set(rows=len(data))
+            return data, columns
+        except sqlite3.Error as e:
+            logger.error(f"Error executing SELECT query: {query}\n{e}")
+            raise
+        finally:
+            cursor.close()
+
+def execute_dml_query(query: str, params: tuple = None, user_email: str = None):
+    """
+    Runs one INSERT/UPDATE/DELETE and commits it. Returns the new row id for INSERTs,
+    otherwise the number of affected rows. `user_email` names the acting user; a write
+    the task store cannot follow drops that user's cached tasks (all users' if None or
+    if the write uses REPLACE conflict resolution), and picks the shard when the database is sharded. Committed changes are published
+    to the change listeners.
+    """
+    db_path = route(user_email)
     is_insert = query.strip().upper().startswith("INSERT")
-    try:
-        cursor.execute(query, params or ())
-        conn.commit()
-        if is_insert:
-            return cursor.lastrowid
-        return cursor.rowcount
-    
-    except sqlite3.IntegrityError as e: 
-        error_code = getattr(e, 'sqlite_errorcode', None) 
-        if not error_code and hasattr(e, 'args') and len(e.args) > 0: 
-            if "UNIQUE constraint failed" in str(e.args[0]).upper(): 
-                 error_code = 2067 
-        if error_code == 2067 or error_code == 1555 or \
-           (isinstance(e, sqlite3.IntegrityError) and "UNIQUE constraint failed" in str(e).upper()):
-            raise ValueError(f"Task likely already exists with the same name, due date, and time. (Details: {e})")
-        else:
-            print(f"Unhandled IntegrityError executing DML query: {query}\nCode: {error_code}, Error: {e}")
-            raise 
+    follow = task_store is not None or bool(_change_listeners)
+    write_through = _write_through_sql(query) if follow else None
+    with connection(db_path) as conn, telemetry.span("db.dml", write_through=write_through is not None) as span:
+        cursor = conn.cursor()
+        try:
+            if write_through:
+                kind, returning_query = write_through
+                cursor.execute(returning_query, params or ())
+                returned = cursor.fetchall()
+            else:
+                cursor.execute(query, params or ())
+            conn.commit()
+            if write_through:
+                if task_store is not None:
+                    task_store.apply_returning(kind, returned, db_path)
+                _publish_change(db_path, user_email, kind, returned)
+            else:
+                # REPLACE deletes whichever rows conflict, which may be other users' tasks.
+                _tasks_changed(db_path, None if _replaces_rows(query) else user_email)
+            span.set(rows=cursor.rowcount)
+            if is_insert:
+                return cursor.lastrowid
+            return cursor.rowcount
+        
+        except sqlite3.IntegrityError as e: 
+            conn.rollback()
+            error_code = getattr(e, 'sqlite_errorcode', None) 
+            if not error_code and hasattr(e, 'args') and len(e.args) > 0: 
+                if "UNIQUE CONSTRAINT FAILED" in str(e.args[0]).upper(): 
+                     error_code = 2067 
+            if error_code == 2067 or error_code == 1555 or \
+               (isinstance(e, sqlite3.IntegrityError) and "UNIQUE CONSTRAINT FAILED" in str(e).upper()):
+                raise ValueError(f"Task likely already exists with the same name, due date, and time. (Details: {e})")
+            else:
+                logger.error(f"Unhandled IntegrityError executing DML query: {query}\nCode: {error_code}, Error: {e}")
+                raise 
 
-    except sqlite3.Error as e:
-        print(f"General SQLite error executing DML query: {query}\n{e}")
-        raise
-    finally:
-        conn.close()
\ No newline at end of file
+        except sqlite3.Error as e:
+            conn.rollback()
+            logger.error(f"General SQLite error executing DML query: {query}\n{e}")
+            raise
+        finally:
+            cursor.close()
+
+# --- Paginated SELECTs ---
+# Listings are fetched one page at a time so memory is bounded by the page size, not
+# by how many tasks a user has. The query is wrapped as a subquery and paged by keyset
+# on its own ORDER BY terms plus `id`: the cursor holds the last row's sort key values
+# and the next page starts strictly after them. Queries that cannot be keyset-paged
+# (no ORDER BY, no `id` column, NULLS FIRST/LAST, COLLATE, ordinal terms) fall back to
+# LIMIT/OFFSET over the same subquery. A LIMIT inside the query still caps the total.
+DEFAULT_PAGE_SIZE = 50
+_PAGE_KEY_PREFIX = "__page_key_"
+
+def _top_level_keywords(sql: str):
+    """Yields (position, word) for identifiers outside string literals, quotes and parentheses."""
+    depth, i, n = 0, 0, len(sql)
+    while i < n:
+        ch = sql[i]
+        if ch in "'\"`[":
+            close = "]" if ch == "[" else ch
+            end = sql.find(close, i + 1)
+            i = n if end == -1 else end + 1
+            continue
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        elif depth == 0 and (ch.isalpha() or ch == "_"):
+            start = i
+            while i < n and (sql[i].isalnum() or sql[i] in "_$"):
+                i += 1
+            yield start, sql[start:i]
+            continue
+        i += 1
+
+def _split_top_level_commas(text: str):
+    parts, depth, start, quote = [], 0, 0, None
+    for i, ch in enumerate(text):
+        if quote:
+            if ch == quote:
+                quote = None
+        elif ch in "'\"`":
+            quote = ch
+        elif ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        elif ch == "," and depth == 0:
+            parts.append(text[start:i])
+            start = i + 1
+    parts.append(text[start:])
+    return [p.strip() for p in parts]
+
+@functools.lru_cache(maxsize=256)
+def _keyset_order(query: str):
+    """Returns [(expression, descending), ...] for the query's outer ORDER BY, or None if unusable."""
+    words = list(_top_level_keywords(query.strip().rstrip(";")))
+    order_at = None
+    for (pos, word), (_next_pos, next_word) in zip(words, words[1:]):
+        if word.upper() == "ORDER" and next_word.upper() == "BY":
+            order_at = _next_pos + 2
+    if order_at is None:
+        return None
+    end = len(query.strip().rstrip(";"))
+    for pos, word in words:
+        if pos > order_at and word.upper() in ("LIMIT", "OFFSET"):
+            end = pos
+            break
+    terms = []
+    for term in _split_top_level_commas(query.strip().rstrip(";")[order_at:end]):
+        match = re.fullmatch(r"(.+?)(?:\s+(ASC|DESC))?", term, re.IGNORECASE | re.DOTALL)
+        expression, direction = match.group(1).strip(), (match.group(2) or "ASC").upper()
+        if not expression or expression.isdigit() or re.search(r"\b(COLLATE|NULLS)\b", expression, re.IGNORECASE):
+            return None
+        # Output columns of the wrapped query are not table-qualified.
+        expression = re.sub(r"\b[A-Za-z_]\w*\.(?=[A-Za-z_])", "", expression)
+        terms.append((expression, direction == "DESC"))
+    terms.append(("id", False))
+    return terms
+
+def _keyset_page_sql(query: str, terms, cursor_values):
+    keys = ", ".join(f"({expr}) AS {_PAGE_KEY_PREFIX}{i}" for i, (expr, _desc) in enumerate(terms))
+    order = ", ".join(f"{_PAGE_KEY_PREFIX}{i}{' DESC' if desc else ''}" for i, (_expr, desc) in enumerate(terms))
+    where, params = "", []
+    if cursor_values is not None:
+        # Rows strictly after the cursor in ORDER BY order, spelled out term by term so
+        # NULLs (which sort first in SQLite) compare correctly.
+        branches = []
+        for i, (expr, desc) in enumerate(terms):
+            value = cursor_values[i]
+            if desc and value is None:
+                continue
+            conditions = [f"({e}) IS ?" for e, _d in terms[:i]]
+            branch_params = list(cursor_values[:i])
+            if value is None:
+                conditions.append(f"({expr}) IS NOT NULL")
+            elif desc:
+                conditions.append(f"(({expr}) < ? OR ({expr}) IS NULL)")
+                branch_params.append(value)
+            else:
+                conditions.append(f"({expr}) > ?")
+                branch_params.append(value)
+            branches.append("(" + " AND ".join(conditions) + ")")
+            params.extend(branch_params)
+        lead_expr, lead_desc = terms[0]
+        lead = ""
+        if not lead_desc and cursor_values[0] is not None:
+            # Redundant with the branches, but gives SQLite a range to seek on.
+            lead = f"({lead_expr}) >= ? AND "
+            params.insert(0, cursor_values[0])
+        where = f" WHERE {lead}(" + (" OR ".join(branches) or "0") + ")"
+    sql = f"SELECT *, {keys} FROM ({query.strip().rstrip(';')}) AS page_source{where} ORDER BY {order} LIMIT ?"
+    return sql, params
+
+def fetch_select_page(query: str, params: tuple = None, page_size: int = DEFAULT_PAGE_SIZE, cursor=None,
+                      user_email: str = None, db_path: str = None):
+    """
+    Returns (rows, columns, next_cursor) for one page of a SELECT. `cursor` is None for
+    the first page, then the `next_cursor` of the previous page; it is None once the
+    result is exhausted. Cursors are small tuples, safe to keep in session state.
+    The query runs on `user_email`'s shard, or on `db_path` when given.
+    """
+    params = tuple(params or ())
+    terms = _keyset_order(query)
+    mode = "keyset" if terms and (cursor is None or cursor[0] == "keyset") else "offset"
+    with connection(db_path or route(user_email)) as conn, telemetry.span("db.select_page", mode=mode) as span:
+        db_cursor = conn.cursor()
+        try:
+            if mode == "keyset":
+                try:
+                    sql, cursor_params = _keyset_page_sql(query, terms, cursor[1] if cursor else None)
+                    db_cursor.execute(sql, params + tuple(cursor_params) + (page_size + 1,))
+                except sqlite3.OperationalError:
+                    # e.g. the query does not select `id` or an ORDER BY column.
+                    if cursor is not None:
+                        raise
+                    mode = "offset"
+                    span.set(mode=mode)
+            if mode == "offset":
+                offset = cursor[1] if cursor else 0
+                db_cursor.execute(
+                    f"SELECT * FROM ({query.strip().rstrip(';')}) AS page_source LIMIT ? OFFSET ?",
+                    params + (page_size + 1, offset),
+                )
+            rows = db_cursor.fetchmany(page_size + 1)
+            columns = [d[0] for d in db_cursor.description] if db_cursor.description else []
+        except sqlite3.Error as e:
+            logger.error(f"Error executing paginated SELECT query: {query}\n{e}")
+            raise
+        finally:
+            db_cursor.close()
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        next_cursor = None
+        if mode == "keyset":
+            key_count = len(terms)
+            if has_more:
+                next_cursor = ("keyset", tuple(rows[-1][-key_count:]))
+            rows = [row[:-key_count] for row in rows]
+            columns = columns[:-key_count]
+        elif has_more:
+            next_cursor = ("offset", (cursor[1] if cursor else 0) + page_size)
+        span.set(rows=len(rows))
+        return rows, columns, next_cursor
+
+def fetch_listing_page(query: str, params: tuple = None, page_size: int = DEFAULT_PAGE_SIZE, cursor=None,
+                       user_email: str = None, filters: dict = None):
+    """
+    fetch_select_page for listings the task store can answer. `filters` describes
+    what `query` selects for `user_email` (see task_store.matches); when the user's
+    tasks are cached the page is cut from memory, otherwise the query runs as usual.
+    Both paths use the same order and offset cursors, so paging can switch between them.
+    """
+    if task_store is not None and filters is not None and user_email and (cursor is None or cursor[0] == "offset"):
+        with telemetry.span("db.store_page") as span:
+            rows = task_store.list_tasks(user_email, filters, route(user_email))
+            span.set(cache_hit=rows is not None)
+            if rows is not None:
+                offset = cursor[1] if cursor else 0
+                page = rows[offset:offset + page_size]
+                span.set(rows=len(page))
+                next_cursor = ("offset", offset + page_size) if len(rows) > offset + page_size else None
+                return page, list(TASK_FIELDS), next_cursor
+    return fetch_select_page(query, params, page_size, cursor, user_email)
+
+def iter_select_pages(query: str, params: tuple = None, page_size: int = DEFAULT_PAGE_SIZE,
+                      user_email: str = None, db_path: str = None):
+    """Yields (rows, columns) one page at a time until the result is exhausted."""
+    cursor = None
+    while True:
+        rows, columns, cursor = fetch_select_page(query, params, page_size, cursor, user_email, db_path)
+        yield rows, columns
+        if cursor is None:
+            return
+
+# --- Bulk operations ---
+BULK_INSERT_SQL = (
+    "INSERT INTO tasks (user_name, user_email, task_name, status, category, due_date, due_time) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?)"
+)
+
+def like_contains(fragment: str) -> str:
+    """LIKE pattern, for use with ESCAPE '\\', matching text that contains `fragment` literally."""
+    return "%" + re.sub(r"([\\%_])", r"\\\1", fragment) + "%"
+
+def _bulk_result(index: int, operation: dict, result: str, task_id=None, message: str = "") -> dict:
+    return {
+        "index": index,
+        "op": operation["op"],
+        "task_name": operation.get("task_name") or operation.get("match"),
+        "id": task_id,
+        "result": result,
+        "message": message,
+    }
+
+def apply_task_operations(user_name: str, user_email: str, operations):
+    """
+    Applies validated bulk operations (see bulk_ops.validate_operation) for one user in
+    a single transaction: adds with one executemany, updates with one executemany per
+    set of changed columns, deletes with one executemany. Duplicates and update/delete
+    targets are resolved under the write lock, so every item gets its own result
+    ('added', 'updated', 'deleted', 'skipped' or 'not_found'). Any database error rolls
+    the whole batch back.
+    """
+    db_path = route(user_email)
+    results = {}
+    with connection(db_path) as conn, telemetry.span("db.bulk", items=len(operations)) as span:
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            adds, updates, deletes = [], {}, []
+            seen_keys = set()
+            for index, operation in operations:
+                if operation["op"] != "add":
+                    continue
+                key = (operation["task_name"], operation["due_date"], operation["due_time"] or "")
+                # Mirrors idx_unq_user_task, where NULL due dates never collide.
+                duplicate = operation["due_date"] is not None and (key in seen_keys or conn.execute(
+                    "SELECT 1 FROM tasks WHERE user_email = ? AND task_name = ? AND due_date = ? "
+                    "AND COALESCE(due_time, '') = ?",
+                    (user_email, *key),
+                ).fetchone() is not None)
+                if duplicate:
+                    results[index] = _bulk_result(index, operation, "skipped", message="task already exists")
+                    continue
+                seen_keys.add(key)
+                adds.append((index, operation))
+            added_ids = []
+            if adds:
+                conn.executemany(BULK_INSERT_SQL, [
+                    (user_name, user_email, op["task_name"], op["status"], op["category"], op["due_date"], op["due_time"])
+                    for _index, op in adds
+                ])
+                # AUTOINCREMENT ids are consecutive while this transaction holds the write lock.
+                last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+                for offset, (index, operation) in enumerate(adds):
+                    added_ids.append((index, last_id - len(adds) + 1 + offset))
+                    results[index] = _bulk_result(index, operation, "added", added_ids[-1][1])
+
+            for index, operation in operations:
+                if operation["op"] == "add":
+                    continue
+                # Updates and deletes see existing tasks plus those added earlier in the list.
+                later_ids = [task_id for add_index, task_id in added_ids if add_index > index]
+                visible = f" AND id < {later_ids[0]}" if later_ids else ""
+                if "id" in operation:
+                    row = conn.execute(
+                        f"SELECT id FROM tasks WHERE id = ? AND user_email = ?{visible}", (operation["id"], user_email)
+                    ).fetchone()
+                else:
+                    row = conn.execute(
+                        f"SELECT MAX(id) FROM tasks WHERE user_email = ? AND task_name LIKE ? ESCAPE '\\'{visible}",
+                        (user_email, like_contains(operation["match"])),
+                    ).fetchone()
+                task_id = row[0] if row else None
+                if task_id is None:
+                    results[index] = _bulk_result(index, operation, "not_found", message="no matching task")
+                elif operation["op"] == "update":
+                    columns = tuple(sorted(operation["set"]))
+                    updates.setdefault(columns, []).append((index, operation, task_id))
+                else:
+                    deletes.append((index, operation, task_id))
+
+            for columns, items in updates.items():
+                assignments = ", ".join(f"{column} = ?" for column in columns)
+                conn.executemany(
+                    f"UPDATE tasks SET {assignments} WHERE id = ? AND user_email = ?",
+                    [tuple(op["set"][c] for c in columns) + (task_id, user_email) for _index, op, task_id in items],
+                )
+                for index, operation, task_id in items:
+                    results[index] = _bulk_result(index, operation, "updated", task_id)
+            if deletes:
+                conn.executemany(
+                    "DELETE FROM tasks WHERE id = ? AND user_email = ?",
+                    [(task_id, user_email) for _index, _op, task_id in deletes],
+                )
+                for index, operation, task_id in deletes:
+                    results[index] = _bulk_result(index, operation, "deleted", task_id)
+            conn.commit()
+            _tasks_changed(db_path, user_email)
+        except sqlite3.IntegrityError as e:
+            conn.rollback()
+            if "UNIQUE CONSTRAINT FAILED" in str(e).upper():
+                raise ValueError(f"Bulk change conflicts with an existing task; nothing was applied. (Details: {e})")
+            logger.error(f"IntegrityError applying bulk operations for {user_email}: {e}")
+            raise
+        except sqlite3.Error as e:
+            conn.rollback()
+            logger.error(f"Error applying bulk operations for {user_email}: {e}")
+            raise
+        span.set(rows=len(adds) + sum(len(items) for items in updates.values()) + len(deletes))
+    return [results[index] for index in sorted(results)]
+
+
+# --- Batched upserts (imports) ---
+# Dated rows use idx_unq_user_task as the conflict target, so re-importing a file
+# updates existing tasks instead of duplicating them. The index treats NULL due dates
+# as distinct, so undated rows are matched explicitly on (user_email, task_name,
+# due_time) with a NULL due_date.
+UPSERT_COLUMNS = ("user_name", "user_email", "task_name", "status", "category", "due_date", "due_time", "created_at")
+_CREATED_AT_DEFAULT = "COALESCE(?, strftime('%Y-%m-%d %H:%M:%S', 'now', 'localtime'))"
+_UPSERT_DATED_SQL = (
+    f"INSERT INTO tasks ({', '.join(UPSERT_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?, {_CREATED_AT_DEFAULT}) "
+    "ON CONFLICT (user_email, task_name, due_date, COALESCE(due_time, '')) DO "
+)
+_UNDATED_MATCH = "user_email = ? AND task_name = ? AND due_date IS NULL AND COALESCE(due_time, '') = ?"
+# Only rows whose values differ are rewritten, so re-importing an unchanged file
+# touches no pages and no index entries.
+_UPSERT_CHANGED = "(user_name, status, category) IS NOT (COALESCE(?, user_name), ?, ?)"
+UPSERT_ACTIONS = {
+    "update": (
+        "UPDATE SET user_name = COALESCE(excluded.user_name, tasks.user_name), status = excluded.status, "
+        "category = excluded.category WHERE (tasks.user_name, tasks.status, tasks.category) "
+        "IS NOT (COALESCE(excluded.user_name, tasks.user_name), excluded.status, excluded.category)"
+    ),
+    "skip": "NOTHING",
+}
+
+
+def upsert_task_rows(rows, on_conflict: str = "update", db_path: str = None):
+    """
+    Inserts one batch of UPSERT_COLUMNS tuples in its own transaction and returns
+    (inserted, updated). With on_conflict="skip", existing tasks are left untouched.
+    """
+    if on_conflict not in UPSERT_ACTIONS:
+        raise ValueError(f"on_conflict must be one of {', '.join(UPSERT_ACTIONS)}")
+    if db_path is None and is_sharded():
+        # One transaction per shard; rows for different users may land in different files.
+        by_shard = {}
+        for row in rows:
+            by_shard.setdefault(route(row[1]), []).append(row)
+        inserted = updated = 0
+        for shard, shard_rows in by_shard.items():
+            shard_inserted, shard_updated = upsert_task_rows(shard_rows, on_conflict, shard)
+            inserted += shard_inserted
+            updated += shard_updated
+        return inserted, updated
+    dated = [row for row in rows if row[5] is not None]
+    undated = [row for row in rows if row[5] is None]
+    with connection(db_path) as conn, telemetry.span("db.upsert", items=len(rows)) as span:
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            max_id_before = conn.execute("SELECT COALESCE(MAX(id), 0) FROM tasks").fetchone()[0]
+            changes_before = conn.total_changes
+            if dated:
+                conn.executemany(_UPSERT_DATED_SQL + UPSERT_ACTIONS[on_conflict], dated)
+            if undated:
+                if on_conflict == "update":
+                    conn.executemany(
+                        f"UPDATE tasks SET user_name = COALESCE(?, user_name), status = ?, category = ? WHERE {_UNDATED_MATCH} AND {_UPSERT_CHANGED}",
+                        [(r[0], r[3], r[4], r[1], r[2], r[6] or "", r[0], r[3], r[4]) for r in undated],
+                    )
+                conn.executemany(
+                    f"INSERT INTO tasks ({', '.join(UPSERT_COLUMNS)}) "
+                    f"SELECT ?, ?, ?, ?, ?, ?, ?, {_CREATED_AT_DEFAULT} "
+                    f"WHERE NOT EXISTS (SELECT 1 FROM tasks WHERE {_UNDATED_MATCH})",
+                    [r + (r[1], r[2], r[6] or "") for r in undated],
+                )
+            changed = conn.total_changes - changes_before
+            # ids are AUTOINCREMENT and the write lock is held, so new rows are exactly those above max_id_before.
+            inserted = conn.execute("SELECT COUNT(*) FROM tasks WHERE id > ?", (max_id_before,)).fetchone()[0]
+            conn.commit()
+            if changed:
+                for user_email in {row[1] for row in rows}:
+                    _tasks_changed(db_path or DB_FILENAME, user_email)
+        except sqlite3.Error as e:
+            conn.rollback()
+            logger.error(f"Error upserting a batch of {len(rows)} task(s): {e}")
+            raise
+        span.set(rows=changed)
+    return inserted, changed - inserted
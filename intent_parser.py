@@ -0,0 +1,396 @@
+"""
+Deterministic fast path for common task commands.
+
+`parse_command` recognises a small grammar of everyday commands ("show pending tasks",
+"mark it as done", "delete task 'X'", "add task 'X' tomorrow at 3pm") and turns them
+into parameterized SQL for the `tasks` table without calling the LLM. Anything it is
+not confident about returns None so the caller falls back to `llm_handler`.
+"""
+import re
+import threading
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+import database as db
+import telemetry
+
+TASK_COLUMNS = "id, task_name, status, category, due_date, due_time, created_at"
+DEFAULT_ORDER_BY = db.DEFAULT_ORDER_BY
+MIN_CONFIDENCE = 0.8
+# A listing named only by a date ("tomorrow") might be an add or an update the grammar
+# does not cover, so it scores below MIN_CONFIDENCE; a bare status ("done") usually
+# means "mark the task in context", so it scores lower still.
+PERIOD_ONLY_CONFIDENCE = 0.7
+STATUS_ONLY_CONFIDENCE = 0.3
+
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
+STATUS_WORDS = {
+    "pending": "pending", "open": "pending", "outstanding": "pending", "remaining": "pending",
+    "incomplete": "pending", "todo": "pending", "to-do": "pending",
+    "completed": "completed", "complete": "completed", "done": "completed", "finished": "completed",
+    "cancelled": "cancelled", "canceled": "cancelled",
+}
+
+CATEGORY_HINTS = {
+    "Meeting": ("meeting", "sync", "standup", "stand-up", "call with"),
+    "Work": ("report", "presentation", "deadline", "client", "project", "review"),
+    "School": ("homework", "assignment", "exam", "lecture", "class", "study"),
+    "Health": ("doctor", "dentist", "gym", "workout", "run", "appointment"),
+    "Personal": ("groceries", "birthday", "call mom", "call dad", "laundry", "shopping"),
+}
+
+
+@dataclass
+class ParsedIntent:
+    kind: str           # 'select', 'insert', 'update' or 'delete'
+    sql: str
+    params: tuple
+    confidence: float
+    rule: str
+    # For listings: what the SQL selects, so database.fetch_listing_page can answer it
+    # from the task store (see task_store.matches).
+    filters: dict = None
+
+
+class FastPathStats:
+    """Thread-safe hit/miss counters for the fast path."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.rule_hits = {}
+
+    def record(self, intent):
+        with self._lock:
+            if intent is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.rule_hits[intent.rule] = self.rule_hits.get(intent.rule, 0) + 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "rule_hits": dict(self.rule_hits),
+            }
+
+
+fast_path_stats = FastPathStats()
+
+
+# --- Date / time resolution ---
+def resolve_date(phrase: str, today: date):
+    """Resolves 'today', 'tomorrow', 'friday', 'next monday', 'in 3 days' or 'YYYY-MM-DD'."""
+    phrase = phrase.strip().lower()
+    if phrase == "today" or phrase == "tonight":
+        return today
+    if phrase == "tomorrow":
+        return today + timedelta(days=1)
+    if re.fullmatch(r"\d{4}-\d{2}-\d{2}", phrase):
+        try:
+            return datetime.strptime(phrase, "%Y-%m-%d").date()
+        except ValueError:
+            return None
+    m = re.fullmatch(r"in (\d{1,3}) days?", phrase)
+    if m:
+        return today + timedelta(days=int(m.group(1)))
+    m = re.fullmatch(r"(?:(next|this|on) )?(" + "|".join(WEEKDAYS) + r")", phrase)
+    if m:
+        weekday = WEEKDAYS.index(m.group(2))
+        if m.group(1) == "next":
+            # "next friday" is the friday of next week.
+            start_of_next_week = today + timedelta(days=7 - today.weekday())
+            return start_of_next_week + timedelta(days=weekday)
+        return today + timedelta(days=(weekday - today.weekday()) % 7)
+    return None
+
+
+def resolve_time(phrase: str):
+    """Resolves '3pm', '3:30 pm', '9 AM', '15:00' or 'noon' to 'HH:MM' (24-hour)."""
+    phrase = phrase.strip().lower().replace(".", "")
+    if phrase == "noon":
+        return "12:00"
+    if phrase == "midnight":
+        return "00:00"
+    m = re.fullmatch(r"(\d{1,2})(?::(\d{2}))?\s*(am|pm)?", phrase)
+    if not m:
+        return None
+    hour, minute, meridiem = int(m.group(1)), int(m.group(2) or 0), m.group(3)
+    if meridiem is None and m.group(2) is None:
+        return None  # a bare number is too ambiguous
+    if meridiem == "pm" and hour < 12:
+        hour += 12
+    elif meridiem == "am" and hour == 12:
+        hour = 0
+    if hour > 23 or minute > 59:
+        return None
+    return f"{hour:02d}:{minute:02d}"
+
+
+def resolve_period(phrase: str, today: date):
+    """Returns an inclusive (start, end) date range for listing phrases, or None."""
+    phrase = phrase.strip().lower()
+    if phrase in ("today", "tonight"):
+        return today, today
+    if phrase == "tomorrow":
+        tomorrow = today + timedelta(days=1)
+        return tomorrow, tomorrow
+    if phrase == "this week":
+        return today, today + timedelta(days=6 - today.weekday())
+    if phrase == "next week":
+        start = today + timedelta(days=7 - today.weekday())
+        return start, start + timedelta(days=6)
+    m = re.fullmatch(r"(?:the )?next (\d{1,3}) days", phrase)
+    if m:
+        return today, today + timedelta(days=int(m.group(1)))
+    single = resolve_date(phrase, today)
+    if single:
+        return single, single
+    return None
+
+
+# One alternation per category (checked in CATEGORY_HINTS order); bulk imports call this per row.
+_CATEGORY_RES = tuple(
+    (category, re.compile("|".join(re.escape(hint) for hint in hints))) for category, hints in CATEGORY_HINTS.items()
+)
+
+
+def infer_category(task_name: str) -> str:
+    lowered = task_name.lower()
+    for category, hint_re in _CATEGORY_RES:
+        if hint_re.search(lowered):
+            return category
+    return "General"
+
+
+# --- Grammar ---
+_QUOTED = r"""['"‘’“”](?P<name>[^'"‘’“”]+)['"‘’“”]"""
+_IT = r"(?:it|that|this|that task|this task|the task|that one|this one|the last task|last task)"
+_STATUS_ALT = "|".join(sorted(STATUS_WORDS, key=len, reverse=True))
+_PERIOD = (r"(?P<period>today|tonight|tomorrow|this week|next week|(?:the )?next \d{1,3} days|\d{4}-\d{2}-\d{2}|"
+           r"(?:(?:next|this|on) )?(?:" + "|".join(WEEKDAYS) + r"))")
+
+_LIST_RE = re.compile(
+    r"(?P<verb>(?:can you |please )?(?:show|list|display|view|get|give)(?: me)?|what(?:'s| is| are)|what do i have|which)?"
+    r"\s*(?:all\s+)?(?:of\s+)?(?:my\s+|the\s+)?(?P<status>" + _STATUS_ALT + r")?\s*(?:tasks?|todos?|items?)?"
+    r"(?:(?:^|\s+)(?:are\s+)?(?:due\s+)?(?:for\s+|on\s+|due\s+)?" + _PERIOD + r")?"
+    r"(?:\s+(?P<overdue>overdue))?"
+)
+_OVERDUE_RE = re.compile(r"(?:(?:show|list|display|what(?:'s| is| are))(?: me)?\s+)?(?:my\s+|the\s+)?overdue(?:\s+tasks?)?")
+_MARK_RE = re.compile(
+    r"(?:mark|set|change)\s+(?:" + _IT + r"|(?:task\s+)?" + _QUOTED + r")\s+(?:as\s+|to\s+)?(?P<status>" + _STATUS_ALT + r")",
+    re.IGNORECASE,
+)
+_DONE_RE = re.compile(
+    r"(?:i(?:'ve| have)?\s+)?(?:finished|completed|attended|did|done with)\s+(?:" + _IT + r"|(?:the\s+)?(?:task\s+)?" + _QUOTED + r")",
+    re.IGNORECASE,
+)
+_IT_IS_RE = re.compile(
+    r"(?:" + _IT + r"|(?:task\s+)?" + _QUOTED + r")\s+is\s+(?:now\s+)?(?P<status>" + _STATUS_ALT + r")",
+    re.IGNORECASE,
+)
+_DELETE_RE = re.compile(
+    r"(?:please\s+)?(?:delete|remove|cancel|drop)\s+(?:" + _IT + r"|(?:the\s+)?(?:task\s+)?" + _QUOTED + r")",
+    re.IGNORECASE,
+)
+_ADD_RE = re.compile(
+    r"(?:add|create|new|schedule|remind me to|remember to)\s+(?:a\s+)?(?:new\s+)?(?:task\s+)?" + _QUOTED +
+    r"(?P<rest>.*)",
+    re.IGNORECASE,
+)
+_ADD_DATE_RE = re.compile(r"(?:(?:due|on|for|by)\s+)?" + _PERIOD.replace("(?P<period>", "(?P<date>"))
+_ADD_TIME_RE = re.compile(r"(?:at|by|@)\s+(?P<time>\d{1,2}(?::\d{2})?(?:\s*(?:am|pm|a\.m\.|p\.m\.))?|noon|midnight)")
+_ADD_CATEGORY_RE = re.compile(r"(?:in\s+)?(?:category|cat\.?)\s*:?\s+(?P<category>[a-z]+)")
+
+
+def _clean(user_query: str) -> str:
+    text = " ".join(user_query.strip().split())
+    return text.rstrip(".!?").strip()
+
+
+def _context_id(last_task_details):
+    if last_task_details and last_task_details.get("id"):
+        return last_task_details["id"]
+    return None
+
+
+def _target_clause(match, last_task_details, user_email: str):
+    """Builds the WHERE clause for 'it'/'that task' or a quoted task name."""
+    name = match.groupdict().get("name")
+    if name:
+        # Most recently created task whose name contains the quoted text (% and _ are
+        # literal), mirroring the LLM prompt rules.
+        # ids are AUTOINCREMENT, so MAX(id) is the newest and needs no sort.
+        return (
+            "id = (SELECT MAX(id) FROM tasks WHERE user_email = ? AND task_name LIKE ? ESCAPE '\\') AND user_email = ?",
+            (user_email, db.like_contains(name.strip()), user_email),
+        )
+    task_id = _context_id(last_task_details)
+    if task_id is None:
+        return None
+    return "id = ? AND user_email = ?", (task_id, user_email)
+
+
+def _parse_list(text: str, user_email: str, today: date):
+    lowered = text.lower()
+    if _OVERDUE_RE.fullmatch(lowered):
+        return ParsedIntent(
+            "select",
+            f"SELECT {TASK_COLUMNS} FROM tasks WHERE user_email = ? AND status = ? AND {db.DATED_FILTER} "
+            f"AND due_date < ? ORDER BY {db.DATED_ORDER_BY}",
+            (user_email, "pending", today.isoformat()),
+            1.0,
+            "list_overdue",
+            {"status": "pending", "due_before": today.isoformat()},
+        )
+    m = _LIST_RE.fullmatch(lowered)
+    if not m:
+        return None
+    status = STATUS_WORDS.get(m.group("status")) if m.group("status") else None
+    period = m.group("period")
+    # Require at least one concrete signal besides an optional verb, otherwise this
+    # would match almost anything.
+    has_verb = bool(m.group("verb"))
+    has_noun = re.search(r"\b(?:tasks?|todos?|items?)\b", lowered) is not None
+    if not (status or period or (has_noun and has_verb)):
+        return None
+    if has_verb or has_noun:
+        confidence = 1.0 if (status or period) else 0.9
+    elif period or m.group("overdue"):
+        confidence = PERIOD_ONLY_CONFIDENCE
+    else:
+        confidence = STATUS_ONLY_CONFIDENCE
+
+    where = ["user_email = ?"]
+    params = [user_email]
+    filters = {"status": status}
+    if status:
+        where.append("status = ?")
+        params.append(status)
+    if m.group("overdue") or period:
+        where.append(db.DATED_FILTER)
+    if m.group("overdue"):
+        where.append("due_date < ?")
+        params.append(today.isoformat())
+        filters["due_before"] = today.isoformat()
+    if period:
+        date_range = resolve_period(period, today)
+        if date_range is None:
+            return None
+        start, end = date_range
+        if start == end:
+            where.append("due_date = ?")
+            params.append(start.isoformat())
+        else:
+            where.append("due_date BETWEEN ? AND ?")
+            params.extend([start.isoformat(), end.isoformat()])
+        filters.update(due_from=start.isoformat(), due_to=end.isoformat())
+    order_by = db.DATED_ORDER_BY if db.DATED_FILTER in where else DEFAULT_ORDER_BY
+    sql = f"SELECT {TASK_COLUMNS} FROM tasks WHERE {' AND '.join(where)} ORDER BY {order_by}"
+    return ParsedIntent("select", sql, tuple(params), confidence, "list", filters)
+
+
+def _parse_status_update(text: str, user_email: str, last_task_details):
+    for rule, regex, default_status in (
+        ("mark_status", _MARK_RE, None),
+        ("done_with", _DONE_RE, "completed"),
+        ("it_is_status", _IT_IS_RE, None),
+    ):
+        m = regex.fullmatch(text)
+        if not m:
+            continue
+        target = _target_clause(m, last_task_details, user_email)
+        if target is None:
+            return None
+        status = default_status or STATUS_WORDS[m.group("status").lower()]
+        where, params = target
+        return ParsedIntent("update", f"UPDATE tasks SET status = ? WHERE {where}", (status,) + params, 1.0, rule)
+    return None
+
+
+def _parse_delete(text: str, user_email: str, last_task_details):
+    m = _DELETE_RE.fullmatch(text)
+    if not m:
+        return None
+    target = _target_clause(m, last_task_details, user_email)
+    if target is None:
+        return None
+    where, params = target
+    return ParsedIntent("delete", f"DELETE FROM tasks WHERE {where}", params, 1.0, "delete")
+
+
+def _parse_add(text: str, user_name: str, user_email: str, today: date):
+    m = _ADD_RE.fullmatch(text)
+    if not m:
+        return None
+    task_name = m.group("name").strip()
+    rest = m.group("rest").strip().lower()
+    due_date = due_time = category = None
+    # Consume recognised modifiers in any order; leftover words mean we are unsure.
+    while rest:
+        rest = rest.lstrip(", ").strip()
+        if rest.startswith("and "):
+            rest = rest[4:]
+        for regex, field in ((_ADD_TIME_RE, "time"), (_ADD_CATEGORY_RE, "category"), (_ADD_DATE_RE, "date")):
+            mm = regex.match(rest)
+            if not mm:
+                continue
+            end = mm.end()
+            if end < len(rest) and rest[end] not in " ,":
+                continue
+            value = mm.group(field)
+            if field == "date":
+                due_date = resolve_date(value, today)
+                if due_date is None:
+                    return None
+            elif field == "time":
+                due_time = resolve_time(value)
+                if due_time is None:
+                    return None
+            else:
+                category = value.strip().title()
+            rest = rest[end:]
+            break
+        else:
+            return None
+    if due_time and not due_date:
+        due_date = today
+    return ParsedIntent(
+        "insert",
+        "INSERT INTO tasks (user_name, user_email, task_name, status, category, due_date, due_time) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (user_name, user_email, task_name, "pending", category or infer_category(task_name),
+         due_date.isoformat() if due_date else None, due_time),
+        1.0,
+        "add",
+    )
+
+
+def parse_command(user_query: str, user_name: str, user_email: str, last_task_details=None,
+                  today: date = None, min_confidence: float = MIN_CONFIDENCE, record_stats: bool = True):
+    """
+    Returns a ParsedIntent for commands the grammar understands with at least
+    `min_confidence`, otherwise None (the caller should ask the LLM).
+    """
+    today = today or datetime.now().date()
+    text = _clean(user_query)
+    intent = None
+    with telemetry.span("fast_path") as span:
+        if text:
+            intent = (
+                _parse_add(text, user_name, user_email, today)
+                or _parse_status_update(text, user_email, last_task_details)
+                or _parse_delete(text, user_email, last_task_details)
+                or _parse_list(text, user_email, today)
+            )
+            if intent is not None and intent.confidence < min_confidence:
+                intent = None
+        span.set(cache_hit=intent is not None, rule=intent.rule if intent else None)
+    if record_stats:
+        fast_path_stats.record(intent)
+    return intent
@@ -0,0 +1,335 @@
+"""
+Async gateway in front of the LLM.
+
+LLMGateway runs an asyncio loop on a background thread and exposes the same
+`invoke(prompt)` / `stream(prompt)` methods as the LangChain client, so
+`llm_handler` can call it from Streamlit's synchronous script thread. Every request,
+streamed or not, goes through:
+
+- a token bucket (LLM_RATE_PER_SECOND, LLM_BURST), paused when the provider
+  answers with a rate-limit error
+- a bounded worker pool (LLM_MAX_CONCURRENCY concurrent calls)
+- coalescing: identical prompts already in flight share one call (not for streams)
+- a per-attempt timeout (LLM_TIMEOUT_SECONDS), an optional hedged second attempt
+  after LLM_HEDGE_AFTER_SECONDS (not for streams), and retries with exponential
+  backoff (LLM_MAX_RETRIES); a stream is only retried until its first chunk
+
+Backends are pluggable: LangChainBackend wraps anything with `invoke` (and
+optionally `ainvoke` / `stream`), FakeBackend is a scripted local model for tests.
+"""
+import asyncio
+import logging
+import os
+import random
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_RATE_PER_SECOND = float(os.getenv("LLM_RATE_PER_SECOND", "5"))   # 0 disables rate limiting
+LLM_BURST = int(os.getenv("LLM_BURST", "10"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "30"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_HEDGE_AFTER_SECONDS = float(os.getenv("LLM_HEDGE_AFTER_SECONDS", "0"))  # 0 disables hedging
+LLM_BACKOFF_SECONDS = float(os.getenv("LLM_BACKOFF_SECONDS", "0.5"))
+RATE_LIMIT_PAUSE_SECONDS = 5.0
+
+_RATE_LIMIT_RE = re.compile(r"\b429\b|rate.?limit|resource.?exhausted|quota", re.IGNORECASE)
+_RETRY_AFTER_RE = re.compile(r"retry.{0,20}?(\d+(?:\.\d+)?)\s*s", re.IGNORECASE)
+_END_OF_STREAM = object()
+
+
+class LLMTimeoutError(TimeoutError):
+    """The LLM did not answer within the configured timeout on any attempt."""
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    return bool(_RATE_LIMIT_RE.search(f"{type(error).__name__} {error}"))
+
+
+# --- Backends ---
+class LLMBackend(ABC):
+    """Interface for model backends. Subclasses implement `generate`; `stream` is optional."""
+
+    @abstractmethod
+    async def generate(self, prompt: str) -> str:
+        """Returns the model's answer to `prompt`."""
+
+    def stream(self, prompt: str):
+        """Synchronous chunk iterator; the default yields the whole answer at once."""
+        yield asyncio.run(self.generate(prompt))
+
+
+class LangChainBackend(LLMBackend):
+    def __init__(self, llm):
+        self.llm = llm
+
+    async def generate(self, prompt: str) -> str:
+        if hasattr(self.llm, "ainvoke"):
+            return await self.llm.ainvoke(prompt)
+        return await asyncio.to_thread(self.llm.invoke, prompt)
+
+    def stream(self, prompt: str):
+        if hasattr(self.llm, "stream"):
+            yield from self.llm.stream(prompt)
+        else:
+            yield self.llm.invoke(prompt)
+
+
+class FakeBackend(LLMBackend):
+    """
+    Scripted local model. `responder(prompt)` (or a fixed `response`) provides the
+    answer after `latency_s`; the first `fail_times` calls raise `error` instead.
+    """
+
+    def __init__(self, responder=None, response: str = "", latency_s: float = 0.0,
+                 fail_times: int = 0, error: Exception = None):
+        self.responder = responder
+        self.response = response
+        self.latency_s = latency_s
+        self.fail_times = fail_times
+        self.error = error or RuntimeError("fake backend failure")
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    async def generate(self, prompt: str) -> str:
+        with self._lock:
+            self.calls += 1
+            should_fail = self.calls <= self.fail_times
+        if self.latency_s:
+            await asyncio.sleep(self.latency_s)
+        if should_fail:
+            raise self.error
+        return self.responder(prompt) if self.responder else self.response
+
+    def stream(self, prompt: str):
+        with self._lock:
+            self.calls += 1
+            should_fail = self.calls <= self.fail_times
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        if should_fail:
+            raise self.error
+        text = self.responder(prompt) if self.responder else self.response
+        for word in re.findall(r"\S+\s*", text):
+            yield word
+
+
+# --- Rate limiting ---
+class TokenBucket:
+    """Async token bucket; `pause(seconds)` stops all issuance (e.g. after a 429)."""
+
+    def __init__(self, rate_per_second: float, burst: int):
+        self.rate = rate_per_second
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.waits = 0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    self.waits += 1
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                self.waits += 1
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+# --- Gateway ---
+class LLMGateway:
+    def __init__(self, backend: LLMBackend, max_concurrency: int = LLM_MAX_CONCURRENCY,
+                 rate_per_second: float = LLM_RATE_PER_SECOND, burst: int = LLM_BURST,
+                 timeout_s: float = LLM_TIMEOUT_SECONDS, max_retries: int = LLM_MAX_RETRIES,
+                 hedge_after_s: float = LLM_HEDGE_AFTER_SECONDS, backoff_s: float = LLM_BACKOFF_SECONDS):
+        self.backend = backend
+        self.max_concurrency = max_concurrency
+        self.timeout_s = timeout_s
+        self.max_retries = max_retries
+        self.hedge_after_s = hedge_after_s
+        self.backoff_s = backoff_s
+        self.stats = {"requests": 0, "coalesced": 0, "attempts": 0, "retries": 0, "hedges": 0,
+                      "timeouts": 0, "rate_limited": 0, "failures": 0}
+        self._inflight = {}
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="llm-gateway", daemon=True)
+        self._thread.start()
+        # asyncio primitives must be created on the loop they are used from.
+        self._bucket, self._semaphore = self._call_soon(self._make_primitives(rate_per_second, burst))
+
+    async def _make_primitives(self, rate_per_second: float, burst: int):
+        return TokenBucket(rate_per_second, burst), asyncio.Semaphore(self.max_concurrency)
+
+    def _call_soon(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    # --- Synchronous facade (what llm_handler and Streamlit use) ---
+    def invoke(self, prompt: str) -> str:
+        return self._call_soon(self.agenerate(prompt))
+
+    def invoke_many(self, prompts) -> list:
+        """Runs a batch concurrently (subject to the pool and rate limit); results keep input order."""
+        return self._call_soon(self.agenerate_many(prompts))
+
+    def stream(self, prompt: str):
+        """
+        Streams from the backend under the same rate limit, worker pool and timeout
+        (per chunk) as invoke. The worker slot is held until the stream ends. Failures
+        before the first chunk are retried like invoke; once text has been yielded the
+        error is raised. Streams are not coalesced or hedged.
+        """
+        self.stats["requests"] += 1
+        attempt = 0
+        while True:
+            self._call_soon(self._acquire_slot())
+            streamed = False
+            try:
+                chunks = iter(self.backend.stream(prompt))
+                while True:
+                    chunk = self._call_soon(self._next_chunk(chunks))
+                    if chunk is _END_OF_STREAM:
+                        return
+                    streamed = True
+                    yield chunk
+            except Exception as e:
+                if streamed:
+                    self.stats["failures"] += 1
+                    raise
+                delay = self._before_retry(e, attempt)
+                if delay is None:
+                    raise
+                attempt += 1
+            finally:
+                self._loop.call_soon_threadsafe(self._semaphore.release)
+            time.sleep(delay)
+
+    # --- Async API ---
+    async def agenerate_many(self, prompts) -> list:
+        return await asyncio.gather(*(self.agenerate(p) for p in prompts))
+
+    async def agenerate(self, prompt: str) -> str:
+        self.stats["requests"] += 1
+        inflight = self._inflight.get(prompt)
+        if inflight is not None:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(inflight)
+        task = asyncio.ensure_future(self._generate_with_retries(prompt))
+        self._inflight[prompt] = task
+        try:
+            return await asyncio.shield(task)
+        finally:
+            if task.done():
+                self._inflight.pop(prompt, None)
+            else:
+                task.add_done_callback(lambda _t: self._inflight.pop(prompt, None))
+
+    async def _generate_with_retries(self, prompt: str) -> str:
+        attempt = 0
+        while True:
+            try:
+                return await self._hedged(prompt)
+            except Exception as e:
+                delay = self._before_retry(e, attempt)
+                if delay is None:
+                    raise
+                attempt += 1
+                await asyncio.sleep(delay)
+
+    def _before_retry(self, error: Exception, attempt: int):
+        """Records failed attempt number `attempt`; returns the backoff before the next one, or None if out of retries."""
+        if is_rate_limit_error(error):
+            self.stats["rate_limited"] += 1
+            retry_after = _RETRY_AFTER_RE.search(str(error))
+            self._bucket.pause(float(retry_after.group(1)) if retry_after else RATE_LIMIT_PAUSE_SECONDS)
+        if attempt >= self.max_retries:
+            self.stats["failures"] += 1
+            return None
+        self.stats["retries"] += 1
+        delay = self.backoff_s * (2 ** attempt) * random.uniform(0.8, 1.2)
+        logger.warning(f"LLM call failed ({type(error).__name__}: {error}); retry {attempt + 1}/{self.max_retries} in {delay:.2f}s")
+        return delay
+
+    async def _attempt(self, prompt: str) -> str:
+        await self._bucket.acquire()
+        async with self._semaphore:
+            self.stats["attempts"] += 1
+            try:
+                return await asyncio.wait_for(self.backend.generate(prompt), self.timeout_s)
+            except asyncio.TimeoutError:
+                self.stats["timeouts"] += 1
+                raise LLMTimeoutError(f"LLM did not respond within {self.timeout_s:.1f}s")
+
+    async def _acquire_slot(self):
+        await self._bucket.acquire()
+        await self._semaphore.acquire()
+        self.stats["attempts"] += 1
+
+    async def _next_chunk(self, chunks):
+        # A chunk that never arrives leaves its worker thread blocked in the backend; the
+        # stream is abandoned rather than closed, as a running generator cannot be.
+        try:
+            return await asyncio.wait_for(asyncio.to_thread(next, chunks, _END_OF_STREAM), self.timeout_s)
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            raise LLMTimeoutError(f"LLM stream stalled for {self.timeout_s:.1f}s")
+
+    async def _hedged(self, prompt: str) -> str:
+        if not self.hedge_after_s or self.hedge_after_s >= self.timeout_s:
+            return await self._attempt(prompt)
+        primary = asyncio.ensure_future(self._attempt(prompt))
+        done, _ = await asyncio.wait({primary}, timeout=self.hedge_after_s)
+        if done:
+            return primary.result()
+        # The primary is slow: race a second attempt against it and take whichever succeeds first.
+        self.stats["hedges"] += 1
+        hedge = asyncio.ensure_future(self._attempt(prompt))
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    for other in pending:
+                        other.cancel()
+                    return task.result()
+                error = task.exception()
+        raise error
+
+    def close(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+
+
+_gateways = {}
+_gateways_lock = threading.Lock()
+
+
+def ensure_gateway(llm) -> LLMGateway:
+    """Returns `llm` if it is already a gateway, otherwise a shared gateway wrapping it."""
+    if isinstance(llm, LLMGateway):
+        return llm
+    with _gateways_lock:
+        entry = _gateways.get(id(llm))
+        if entry is None or entry[0] is not llm:
+            entry = _gateways[id(llm)] = (llm, LLMGateway(LangChainBackend(llm)))
+        return entry[1]
@@ -0,0 +1,185 @@
+"""
+Prompt assembly for the SQL generation and summary calls.
+
+The SQL prompt is split into a stable prefix (instructions, schema and the rule
+sections for the detected intent) and a short per-request suffix (user, date,
+task context, query). Prefixes are compiled once per (intent, schema) and contain
+nothing user- or date-specific, so identical bytes lead every request of the same
+intent and provider-side context caching can apply. Only the rules that matter for
+the detected intent are sent: an INSERT does not need the listing order rules and
+a SELECT does not need task-name normalisation. When the intent is unclear every
+section is included.
+"""
+import functools
+import re
+from dataclasses import dataclass
+
+import telemetry
+
+INTENTS = ("insert", "select", "modify", "any")
+
+HEADER = """You are an AI assistant that translates user requests into SQLite queries for a task management system.
+Your goal is to generate a SINGLE, EXECUTABLE SQLite query.
+Resolve relative dates like 'today', 'tomorrow', 'next week' against Today's Date given at the end. Due dates are 'YYYY-MM-DD'; 'due_time' is 'HH:MM' (24-hour, e.g. "2pm" becomes "14:00", "9 AM" becomes "09:00") or NULL when no time is given.
+
+Database Table Schema (tasks table):
+{table_info}
+
+SQL Generation Rules:"""
+
+# Rule sections, in prompt order. Each is numbered when the prompt is compiled.
+RULES = {
+    "targeting_read_write": """**Targeting User Data**: For `SELECT`, `UPDATE`, `DELETE` queries, ALWAYS include `WHERE user_email = '<Email>'` with the current user's email.""",
+    "targeting_insert": """**Targeting User Data (INSERT)**: ALWAYS include `user_name` and `user_email` of the current user in the `VALUES`. 'created_at' is set by the database; 'status' defaults to 'pending'.""",
+    "insert_fields": """**New Tasks**:
+    - Use a concise, normalized 'task_name' without conversational fluff (e.g. "I have a meeting tomorroww at 2pm about project alpha" -> "Project alpha meeting"). Spell common words correctly.
+    - ALWAYS infer a 'category' (e.g. 'Work', 'Personal', 'School', 'Meeting'); if not inferable, use 'General'.
+    - If a time is mentioned ("at 2pm", "by 17:00"), store it in `due_time`; otherwise `due_time` is NULL.""",
+    "select_columns": """**Column Selection**: Do NOT use `SELECT *`. List `id, task_name, status, category, due_date, due_time, created_at`. Use SQLite date functions like `DATE('now')`, `DATE('now', '+X days')` and `>=` for "on or after".""",
+    "select_order": """**Default Ordering**: For queries listing multiple tasks, use exactly `ORDER BY due_date IS NULL, due_date, due_time IS NULL, due_time, created_at DESC`. When filtering on `due_date`, also add `(due_date IS NULL) = 0` to the `WHERE` clause and use `ORDER BY due_date, due_time IS NULL, due_time, created_at DESC`.""",
+    "modify_where": """**Specific Targets**: For `UPDATE` or `DELETE`, make the `WHERE` clause specific: `id` (if known from context), `task_name` (possibly `LIKE '%fragment%'`), `due_date` and/or `due_time`. If several tasks match a vague description without context, target the most recently created one or the one with the nearest matching due date.""",
+    "modify_context": """**Contextual Follow-ups**: The task context may hold `id`, `task_name`, `due_date`, `due_time` of a recently discussed task. If the query refers to it ("mark *it* as done", "cancel *that task*"), use its `id`, e.g. `UPDATE tasks SET status = 'completed' WHERE id = 123 AND user_email = '<Email>'`. Details in the query itself ("cancel the meeting on *next Monday*") take priority over the context.""",
+    "modify_status": """**Status Updates**: "Attended", "finished", "done" mean `status = 'completed'`. "Cancel the meeting" usually means `DELETE`; "the meeting is cancelled" means `UPDATE ... SET status = 'cancelled'`.""",
+    "output": """**Output Format**: Generate ONLY the SQLite query. No explanations, comments, or markdown like ```sql.""",
+}
+
+INTENT_RULES = {
+    "insert": ("targeting_insert", "insert_fields", "output"),
+    "select": ("targeting_read_write", "select_columns", "select_order", "output"),
+    "modify": ("targeting_read_write", "modify_where", "modify_context", "modify_status", "output"),
+    "any": tuple(RULES),
+}
+
+SQL_PROMPT_SUFFIX = """
+Current User:
+- Name: {user_name}
+- Email: {user_email}
+
+Today's Date: {today_date}
+
+User Query: {input}
+Previous relevant task context (if any): {previous_task_context}
+
+SQLiteQuery:
+"""
+
+SUMMARY_PROMPT_PREFIX = """
+Based on the user's original request, the SQL query executed, and the result from the database, provide a concise, friendly, and human-readable summary.
+Be direct and confirm the action taken or the information found. If a task was modified or added, mention its name.
+"""
+SUMMARY_PROMPT_SUFFIX = """
+Original User Query: {user_query}
+SQL Query Executed: {sql_query}
+SQL Query Result/Effect: {sql_result_str}
+
+Friendly Summary:
+"""
+
+BULK_PROMPT_PREFIX = """You convert a message describing several task changes into a JSON array of operations for a task manager.
+Return ONLY the JSON array: no explanations, no markdown. One element per task mentioned, in the order given:
+- {"op": "add", "task_name": "...", "due_date": "YYYY-MM-DD" or null, "due_time": "HH:MM" or null, "category": "...", "status": "pending"}
+- {"op": "update", "id": 123 or null, "match": "name fragment" or null, "set": {"status" | "task_name" | "category" | "due_date" | "due_time": value}}
+- {"op": "delete", "id": 123 or null, "match": "name fragment" or null}
+Rules:
+1.  Use concise, normalized task names without conversational fluff ("I have a dentist visit" -> "Dentist visit").
+2.  Infer a category ('Work', 'Personal', 'School', 'Meeting'); use 'General' if none fits.
+3.  Resolve relative dates ('Monday', 'tomorrow', 'next week') against Today's Date. Times are 24-hour 'HH:MM' ("3pm" -> "15:00"); null when no time is given.
+4.  For update/delete, use `match` with a fragment of the existing task's name; use `id` only when the message refers to the task in the context ("it", "that task").
+5.  "Done", "finished", "attended" mean {"status": "completed"}.
+"""
+BULK_PROMPT_SUFFIX = """
+Today's Date: {today_date}
+
+User Query: {input}
+Previous relevant task context (if any): {previous_task_context}
+
+JSON:
+"""
+
+# Keyword cues per intent. A query matching exactly one intent gets that intent's
+# rules; anything else (no cue, or cues for several) gets every section.
+_INTENT_CUES = {
+    "insert": re.compile(r"\b(add|schedule|create|remind|book|plan|new task|i have|i've got|i need to|there is|there's)\b", re.IGNORECASE),
+    "select": re.compile(r"\b(show|list|what|what's|which|view|display|find|search|how many|do i have|any)\b", re.IGNORECASE),
+    "modify": re.compile(r"\b(mark|done|finish(?:ed)?|complete(?:d)?|attended|cancel(?:led)?|delete|remove|update|change|rename|move|reschedule|postpone|drop)\b", re.IGNORECASE),
+}
+_QUESTION_HAVE_RE = re.compile(r"\bdo i have\b", re.IGNORECASE)
+
+
+@dataclass
+class BuiltPrompt:
+    text: str
+    intent: str
+    prefix_chars: int
+    prefix_tokens: int
+    total_tokens: int
+
+    @property
+    def dynamic_tokens(self) -> int:
+        return self.total_tokens - self.prefix_tokens
+
+
+def detect_intent(user_query: str) -> str:
+    """Classifies a command as 'insert', 'select', 'modify', or 'any' when unsure."""
+    text = user_query or ""
+    matched = set()
+    for intent, cue in _INTENT_CUES.items():
+        probe = _QUESTION_HAVE_RE.sub(" ", text) if intent == "insert" else text
+        if cue.search(probe):
+            matched.add(intent)
+    return matched.pop() if len(matched) == 1 else "any"
+
+
+@functools.lru_cache(maxsize=32)
+def compile_sql_prefix(intent: str, table_info: str) -> str:
+    """The cacheable part of the SQL prompt; computed once per intent and schema."""
+    rules = "\n".join(
+        f"{number}.  {RULES[name]}" for number, name in enumerate(INTENT_RULES[intent], start=1)
+    )
+    return HEADER.format(table_info=table_info) + "\n" + rules + "\n"
+
+
+def build_sql_prompt(user_query: str, table_info: str, user_name: str, user_email: str, today_date: str,
+                     previous_task_context: str, intent: str = None) -> BuiltPrompt:
+    intent = intent or detect_intent(user_query)
+    prefix = compile_sql_prefix(intent, table_info)
+    text = prefix + SQL_PROMPT_SUFFIX.format(
+        user_name=user_name,
+        user_email=user_email,
+        today_date=today_date,
+        input=user_query,
+        previous_task_context=previous_task_context,
+    )
+    return BuiltPrompt(
+        text=text,
+        intent=intent,
+        prefix_chars=len(prefix),
+        prefix_tokens=telemetry.estimate_tokens(prefix),
+        total_tokens=telemetry.estimate_tokens(text),
+    )
+
+
+def build_summary_prompt(user_query: str, sql_query: str, sql_result_str: str) -> BuiltPrompt:
+    text = SUMMARY_PROMPT_PREFIX + SUMMARY_PROMPT_SUFFIX.format(
+        user_query=user_query, sql_query=sql_query, sql_result_str=sql_result_str
+    )
+    return BuiltPrompt(
+        text=text,
+        intent="summary",
+        prefix_chars=len(SUMMARY_PROMPT_PREFIX),
+        prefix_tokens=telemetry.estimate_tokens(SUMMARY_PROMPT_PREFIX),
+        total_tokens=telemetry.estimate_tokens(text),
+    )
+
+
+def build_bulk_prompt(user_query: str, today_date: str, previous_task_context: str) -> BuiltPrompt:
+    text = BULK_PROMPT_PREFIX + BULK_PROMPT_SUFFIX.format(
+        today_date=today_date, input=user_query, previous_task_context=previous_task_context
+    )
+    return BuiltPrompt(
+        text=text,
+        intent="bulk",
+        prefix_chars=len(BULK_PROMPT_PREFIX),
+        prefix_tokens=telemetry.estimate_tokens(BULK_PROMPT_PREFIX),
+        total_tokens=telemetry.estimate_tokens(text),
+    )
@@ -0,0 +1,161 @@
+"""
+EXPLAIN QUERY PLAN checks for generated SQL.
+
+`check_query_plan` flags statements that scan the whole `tasks` table or sort through
+a temporary B-tree, and depending on QUERY_PLAN_CHECK either ignores them ("off"),
+prints a warning ("log", the default) or raises QueryPlanError ("reject"). Each
+report also carries a rough estimate of the rows the plan visits (see estimate_rows).
+"""
+import logging
+import os
+import re
+import sqlite3
+from dataclasses import dataclass, field
+import database as db
+import telemetry
+
+logger = logging.getLogger(__name__)
+
+QUERY_PLAN_MODES = ("off", "log", "reject")
+QUERY_PLAN_CHECK = os.getenv("QUERY_PLAN_CHECK", "log").strip().lower()
+if QUERY_PLAN_CHECK not in QUERY_PLAN_MODES:
+    QUERY_PLAN_CHECK = "log"
+
+_TEMP_BTREE_RE = re.compile(r"USE TEMP B-TREE FOR (.+)")
+_STEP_RE = re.compile(
+    r"^(?P<op>SCAN|SEARCH) (?P<table>\w+)(?: AS \w+)?"
+    r"(?: USING (?:(?:COVERING )?INDEX (?P<index>\w+)|(?P<rowid>(?:INTEGER )?PRIMARY KEY)))?(?: \((?P<terms>.*)\))?$"
+)
+_EQ_TERM_RE = re.compile(r"\b\w+=")
+# Subqueries and CTEs the plan materializes or runs as co-routines; "SCAN <name>" then
+# reads their result, not a table.
+_SUBQUERY_RE = re.compile(r"^(?:MATERIALIZE|CO-ROUTINE) (\w+)")
+# Rows per equality-constrained index column when sqlite_stat1 has no figures.
+DEFAULT_ROWS_PER_KEY = 10
+
+
+class QueryPlanError(ValueError):
+    """Raised in reject mode when a statement's plan scans or sorts the whole table."""
+
+    def __init__(self, report):
+        self.report = report
+        super().__init__(f"Query rejected by the plan check: {', '.join(report.problems)}.")
+
+
+@dataclass
+class PlanReport:
+    sql: str
+    plan: list = field(default_factory=list)
+    full_scans: list = field(default_factory=list)
+    temp_btrees: list = field(default_factory=list)
+    estimated_rows: int = 0
+
+    @property
+    def problems(self):
+        return [f"full scan of {t}" for t in self.full_scans] + [f"temp B-tree for {p}" for p in self.temp_btrees]
+
+    @property
+    def ok(self) -> bool:
+        return not self.problems
+
+
+def explain_query_plan(sql: str, params: tuple = None, conn=None) -> PlanReport:
+    """Runs EXPLAIN QUERY PLAN for `sql` and classifies each plan step."""
+    if conn is None:
+        with db.connection() as conn:
+            return explain_query_plan(sql, params, conn)
+    report = PlanReport(sql=sql)
+    rows = conn.execute(f"EXPLAIN QUERY PLAN {sql.strip().rstrip(';')}", params or ()).fetchall()
+    subqueries = set()
+    for _id, _parent, _unused, detail in rows:
+        report.plan.append(detail)
+        subquery = _SUBQUERY_RE.match(detail)
+        if subquery:
+            subqueries.add(subquery.group(1))
+        # "SCAN tasks" and "SCAN tasks USING INDEX ..." both visit every row; a covering
+        # index scan is cheaper per row but still linear in the table size. Steps that
+        # are not table scans ("SCAN 2 CONSTANT ROWS" for a multi-row VALUES) fail _STEP_RE.
+        step = _STEP_RE.match(detail)
+        if step and step.group("op") == "SCAN" and step.group("table") not in subqueries \
+                and not (step.group("rowid") and step.group("terms")):
+            report.full_scans.append(step.group("table"))
+        sort = _TEMP_BTREE_RE.search(detail)
+        if sort:
+            report.temp_btrees.append(sort.group(1))
+    report.estimated_rows = estimate_rows(report.plan, conn)
+    return report
+
+
+def _index_stats(conn):
+    """{index or table name: [rows, avg rows per 1-column prefix, per 2-column prefix, ...]} from ANALYZE."""
+    try:
+        rows = conn.execute("SELECT tbl, idx, stat FROM sqlite_stat1").fetchall()
+    except sqlite3.OperationalError:
+        return {}
+    stats = {}
+    for table, index, stat in rows:
+        numbers = [int(n) for n in str(stat).split() if n.isdigit()]
+        if numbers:
+            stats[index or table] = numbers
+    return stats
+
+
+def estimate_rows(plan, conn) -> int:
+    """
+    Rough number of rows the plan steps visit, summed: a SCAN reads the whole table, a
+    rowid lookup one row, and an index SEARCH on k equality columns the index's average
+    rows per k-column prefix from sqlite_stat1 (or 1/DEFAULT_ROWS_PER_KEY per column
+    without statistics); a range term divides by four. Table sizes come from MAX(rowid).
+    """
+    stats, table_rows, index_tables = None, {}, None
+    total = 0
+    for detail in plan:
+        step = _STEP_RE.match(detail)
+        if not step:
+            continue
+        if stats is None:
+            stats = _index_stats(conn)
+            index_tables = dict(conn.execute("SELECT name, tbl_name FROM sqlite_master WHERE type IN ('index', 'table')"))
+        # Plans name aliases ("SCAN t"); the index tells the real table.
+        table = index_tables.get(step.group("index")) or step.group("table")
+        if index_tables.get(table) != table:
+            table = db.SCHEMA_TABLES[0]
+        if table not in table_rows:
+            table_rows[table] = conn.execute(f"SELECT COALESCE(MAX(rowid), 0) FROM {table}").fetchone()[0]
+        rows = table_rows[table]
+        terms = step.group("terms") or ""
+        equalities = len(_EQ_TERM_RE.findall(terms))
+        if step.group("op") == "SEARCH":
+            if step.group("rowid") and equalities:
+                rows = 1
+            elif step.group("index"):
+                index_stats = stats.get(step.group("index"))
+                if index_stats and len(index_stats) > equalities:
+                    rows = index_stats[equalities]
+                else:
+                    rows = rows // DEFAULT_ROWS_PER_KEY ** equalities
+            if "<" in terms or ">" in terms:
+                rows //= 4
+        total += max(1, rows)
+    return total
+
+
+def check_query_plan(sql: str, params: tuple = None, mode: str = None, conn=None):
+    """Applies the configured plan policy; returns the PlanReport, or None when checks are off."""
+    mode = mode or QUERY_PLAN_CHECK
+    if mode == "off":
+        return None
+    try:
+        with telemetry.span("db.plan_check") as span:
+            report = explain_query_plan(sql, params, conn)
+            span.set(full_scans=len(report.full_scans), temp_btrees=len(report.temp_btrees),
+                     estimated_rows=report.estimated_rows)
+    except sqlite3.Error as e:
+        # The statement itself will fail (and be reported) when it is executed.
+        logger.warning(f"EXPLAIN QUERY PLAN failed for: {sql}\n{e}")
+        return None
+    if not report.ok:
+        if mode == "reject":
+            raise QueryPlanError(report)
+        logger.warning(f"Slow query plan ({'; '.join(report.problems)}): {sql}\n  Plan: {report.plan}")
+    return report
@@ -0,0 +1,525 @@
+"""
+Deadline reminders.
+
+ReminderScheduler keeps the pending tasks that fall due inside a sliding window
+(REMINDER_LOOKBACK_HOURS back to REMINDER_HORIZON_DAYS ahead) in a heap ordered by
+the next moment something has to be sent: an "upcoming" reminder
+REMINDER_LEAD_MINUTES before the due time and an "overdue" one at the due time.
+Its thread sleeps until the top of the heap is due, so queued tasks cost memory
+but no CPU. Tasks without a due time are due at REMINDER_DEFAULT_TIME.
+
+The heap is fed incrementally rather than by polling the table:
+
+- The window is loaded once at start and extended a day at a time as days pass,
+  with range scans on the partial index idx_tasks_pending_due.
+- Writes through database.execute_dml_query are applied from their RETURNING rows
+  (database.add_change_listener). The listener only queues them; the scheduler
+  thread merges the queue on its next step and is woken early only when a change
+  may be due before it would wake anyway. Writes that only name the user (bulk
+  commands, imports, statements without RETURNING) reload that user's window.
+- Every REMINDER_RESYNC_SECONDS the window is re-read to pick up writes made by
+  other processes.
+
+Just before sending, the scheduler re-reads the task by id. A task that was
+completed, deleted or rescheduled without the scheduler noticing is dropped or
+re-queued instead of announced.
+
+Notifications go to a pluggable sink (REMINDER_SINK): `log`, `file:<path>` (JSON
+lines) or an http(s) webhook URL. Run the scheduler inside the app with
+REMINDERS_ENABLED=true, or standalone with `python reminders.py`; standalone it
+only sees the app's writes at resyncs.
+"""
+import argparse
+import functools
+import heapq
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import urllib.request
+from abc import ABC, abstractmethod
+from datetime import date, datetime, timedelta
+
+import database as db
+import telemetry
+from task_store import RETURNING_FIELDS
+
+logger = logging.getLogger(__name__)
+
+REMINDERS_ENABLED = os.getenv("REMINDERS_ENABLED", "false").lower() in ("1", "true", "yes")
+REMINDER_SINK = os.getenv("REMINDER_SINK", "log")
+REMINDER_LEAD_MINUTES = float(os.getenv("REMINDER_LEAD_MINUTES", "15"))
+REMINDER_HORIZON_DAYS = int(os.getenv("REMINDER_HORIZON_DAYS", "1"))
+REMINDER_LOOKBACK_HOURS = float(os.getenv("REMINDER_LOOKBACK_HOURS", "24"))
+REMINDER_DEFAULT_TIME = os.getenv("REMINDER_DEFAULT_TIME", "09:00")
+REMINDER_RESYNC_SECONDS = float(os.getenv("REMINDER_RESYNC_SECONDS", "300"))
+
+EVENTS = ("upcoming", "overdue")
+_DONE = len(EVENTS)
+FETCH_SIZE = 5000
+VERIFY_CHUNK = 500
+MAX_DIRTY_USERS = 100     # with more users to reload, the whole window is re-read instead
+MAX_QUEUED_CHANGES = 10000  # queued RETURNING rows that wake the thread to merge them
+MAX_SLEEP_SECONDS = 3600  # wake at least hourly to move the window
+_R_ID, _R_STATUS, _R_DUE_DATE, _R_DUE_TIME = (RETURNING_FIELDS.index(f) for f in
+                                              ("id", "status", "due_date", "due_time"))
+
+_WINDOW_SQL = "SELECT id, status, due_date, due_time FROM tasks WHERE status = 'pending' AND due_date BETWEEN ? AND ?"
+# Not filtered on status, so tasks completed since the last load are seen and dropped.
+_USER_SQL = "SELECT id, status, due_date, due_time FROM tasks WHERE user_email = ? AND due_date BETWEEN ? AND ?"
+_VERIFY_SQL = "SELECT id, user_name, user_email, task_name, status, due_date, due_time FROM tasks WHERE id IN ({})"
+
+
+@functools.lru_cache(maxsize=65536)
+def due_timestamp(due_date, due_time, default_time: str = REMINDER_DEFAULT_TIME):
+    """Epoch seconds of a task's local due moment, or None when its date or time cannot be read."""
+    if not isinstance(due_date, str):
+        return None
+    clock_time = due_time.strip() if isinstance(due_time, str) and due_time.strip() else default_time
+    try:
+        day = date.fromisoformat(due_date.strip()[:10])
+        hour, minute = clock_time.split(":")[:2]
+        return datetime(day.year, day.month, day.day, int(hour), int(minute[:2])).timestamp()
+    except ValueError:
+        return None
+
+
+# --- Sinks ---
+class ReminderSink(ABC):
+    """Interface for notification targets. `send` gets one notification dict and raises on failure."""
+
+    @abstractmethod
+    def send(self, notification: dict):
+        """Delivers one notification."""
+
+    def close(self):
+        pass
+
+
+class LogSink(ReminderSink):
+    def send(self, notification: dict):
+        logger.info("Reminder (%s) for %s: '%s' due %s", notification["event"], notification["user_email"],
+                    notification["task_name"], notification["due_at"])
+
+
+class FileSink(ReminderSink):
+    """Appends one JSON object per notification to `path`."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def send(self, notification: dict):
+        with self._lock:
+            self._file.write(json.dumps(notification) + "\n")
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class WebhookSink(ReminderSink):
+    """POSTs each notification as JSON to `url`."""
+
+    def __init__(self, url: str, timeout: float = 5.0):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, notification: dict):
+        request = urllib.request.Request(
+            self.url, data=json.dumps(notification).encode("utf-8"),
+            headers={"Content-Type": "application/json"}, method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+
+class MemorySink(ReminderSink):
+    """Keeps notifications in a list; for tests and benchmarks."""
+
+    def __init__(self):
+        self.notifications = []
+        self._lock = threading.Lock()
+
+    def send(self, notification: dict):
+        with self._lock:
+            self.notifications.append(notification)
+
+
+def sink_from_spec(spec: str) -> ReminderSink:
+    """Builds the sink named by REMINDER_SINK: `log`, `file:<path>` or an http(s) URL."""
+    spec = (spec or "log").strip()
+    if spec == "log":
+        return LogSink()
+    if spec.startswith("file:"):
+        return FileSink(spec[len("file:"):])
+    if spec.startswith(("http://", "https://")):
+        return WebhookSink(spec)
+    raise ValueError(f"Unknown reminder sink {spec!r}; use log, file:<path> or an http(s) URL.")
+
+
+# --- Scheduler ---
+class _Reminder:
+    __slots__ = ("due_at", "stage")
+
+    def __init__(self, due_at: float):
+        self.due_at = due_at
+        self.stage = 0      # index into EVENTS of the next notification; _DONE when all are sent
+
+
+class ReminderScheduler:
+    """
+    Heap of pending tasks keyed by (db_path, task id). `clock` returns epoch seconds
+    and `db_paths` the database files to watch (database.shard_paths by default);
+    tests and benchmarks can drive the scheduler with run_pending() instead of start().
+    """
+
+    def __init__(self, sink: ReminderSink, lead_minutes: float = REMINDER_LEAD_MINUTES,
+                 horizon_days: int = REMINDER_HORIZON_DAYS, lookback_hours: float = REMINDER_LOOKBACK_HOURS,
+                 resync_seconds: float = REMINDER_RESYNC_SECONDS, clock=time.time, db_paths=None):
+        self.sink = sink
+        self.lead_seconds = lead_minutes * 60
+        self.horizon_days = horizon_days
+        self.lookback_seconds = lookback_hours * 3600
+        self.resync_seconds = resync_seconds
+        self.clock = clock
+        self.db_paths = db_paths or db.shard_paths
+        self._tasks = {}            # (db_path, id) -> _Reminder
+        self._heap = []             # (fire_at, key, due_at, stage); stale entries are skipped when popped
+        self._window = None         # (first, last) due_date loaded, ISO strings
+        self._next_resync = 0.0
+        self._dirty_users = set()   # (db_path, user_email) whose window must be reloaded
+        self._reload_all = False
+        self._changes = []          # (db_path, kind, rows) from on_change, merged by _merge_changes
+        self._queued_rows = 0
+        self._queued_fire_at = None # earliest reminder a queued change may need to send
+        self._wake_at = 0.0         # when the thread next wakes on its own; 0 while it is awake
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self.loads = 0
+
+    # --- Heap maintenance (callers hold self._cond) ---
+    def _track(self, key, status, due_date, due_time, now: float):
+        due_at = due_timestamp(due_date, due_time) if status == "pending" else None
+        window = self._window
+        if (due_at is None or window is None or not window[0] <= due_date[:10] <= window[1]
+                or due_at < now - self.lookback_seconds):
+            self._tasks.pop(key, None)
+            return
+        reminder = self._tasks.get(key)
+        if reminder is not None and reminder.due_at == due_at:
+            return
+        reminder = self._tasks[key] = _Reminder(due_at)
+        self._push(key, reminder, now)
+
+    def _push(self, key, reminder: _Reminder, now: float):
+        if reminder.stage == 0 and (not self.lead_seconds or now >= reminder.due_at):
+            reminder.stage = 1      # already due: skip straight to "overdue"
+        if reminder.stage >= _DONE:
+            return
+        fire_at = reminder.due_at - self.lead_seconds if reminder.stage == 0 else reminder.due_at
+        heapq.heappush(self._heap, (fire_at, key, reminder.due_at, reminder.stage))
+
+    def _compact(self):
+        if len(self._heap) <= 2 * len(self._tasks) + 1024:
+            return
+        heap = [(r.due_at - self.lead_seconds if r.stage == 0 else r.due_at, key, r.due_at, r.stage)
+                for key, r in self._tasks.items() if r.stage < _DONE]
+        heapq.heapify(heap)
+        self._heap = heap
+
+    def _prune(self, now: float):
+        """Forgets tasks that fell out of the back of the window (their reminders are long sent)."""
+        cutoff = now - self.lookback_seconds
+        for key in [key for key, r in self._tasks.items() if r.due_at < cutoff]:
+            del self._tasks[key]
+        self._compact()
+
+    # --- Change feed ---
+    def on_change(self, db_path: str, user_email: str, kind: str = None, rows=None):
+        """
+        database change listener (see database.add_change_listener). Runs on the
+        writer's thread, so it only queues the rows. Completions, deletions and later
+        due moments can wait for the next step: a reminder that fires first is
+        re-checked against the table before it is sent.
+        """
+        if rows is None:
+            with self._cond:
+                if user_email is None or len(self._dirty_users) >= MAX_DIRTY_USERS:
+                    self._reload_all = True
+                else:
+                    self._dirty_users.add((db_path, user_email))
+                self._cond.notify()
+            return
+        if not rows:
+            return
+        fire_at = None
+        if kind != "delete":
+            for row in rows:
+                due_at = due_timestamp(row[_R_DUE_DATE], row[_R_DUE_TIME]) if row[_R_STATUS] == "pending" else None
+                if due_at is not None and (fire_at is None or due_at - self.lead_seconds < fire_at):
+                    fire_at = due_at - self.lead_seconds
+        with self._cond:
+            self._changes.append((db_path, kind, rows))
+            self._queued_rows += len(rows)
+            if fire_at is not None and (self._queued_fire_at is None or fire_at < self._queued_fire_at):
+                self._queued_fire_at = fire_at
+            if ((fire_at is not None and self._wake_at and fire_at < self._wake_at)
+                    or self._queued_rows >= MAX_QUEUED_CHANGES):
+                self._cond.notify()
+
+    def _merge_changes(self, now: float):
+        with self._cond:
+            changes, self._changes, self._queued_rows, self._queued_fire_at = self._changes, [], 0, None
+            for db_path, kind, rows in changes:
+                for row in rows:
+                    key = (db_path, row[_R_ID])
+                    if kind == "delete":
+                        self._tasks.pop(key, None)
+                    else:
+                        self._track(key, row[_R_STATUS], row[_R_DUE_DATE], row[_R_DUE_TIME], now)
+
+    # --- Loading ---
+    def _window_bounds(self, now: float):
+        first = datetime.fromtimestamp(now - self.lookback_seconds).date()
+        last = datetime.fromtimestamp(now).date() + timedelta(days=self.horizon_days)
+        return first.isoformat(), last.isoformat()
+
+    def _load(self, db_path: str, sql: str, params) -> int:
+        db.create_db_and_table(db_path)
+        with db.connection(db_path) as conn:
+            return self._load_rows(db_path, conn.execute(sql, params))
+
+    def _load_rows(self, db_path: str, cursor) -> int:
+        loaded = 0
+        try:
+            while True:
+                rows = cursor.fetchmany(FETCH_SIZE)
+                if not rows:
+                    return loaded
+                now = self.clock()
+                with self._cond:
+                    for task_id, status, due_date, due_time in rows:
+                        self._track((db_path, task_id), status, due_date, due_time, now)
+                loaded += len(rows)
+        finally:
+            cursor.close()
+
+    def _maintain(self, now: float):
+        first, last = self._window_bounds(now)
+        with self._cond:
+            previous, reload_all, dirty = self._window, self._reload_all, self._dirty_users
+            self._window, self._reload_all, self._dirty_users = (first, last), False, set()
+            if previous is not None and previous[0] != first:
+                self._prune(now)
+        resync = self.resync_seconds and now >= self._next_resync
+        if previous is None or reload_all or resync:
+            ranges, users = [(first, last)], ()
+            self._next_resync = now + self.resync_seconds
+        else:
+            # Only the dates that just entered the window, then users with unknown changes.
+            start = max(first, (date.fromisoformat(previous[1]) + timedelta(days=1)).isoformat())
+            ranges, users = [(start, last)] if start <= last else [], dirty
+        if not ranges and not users:
+            return
+        with telemetry.span("reminders.load", users=len(users)) as span:
+            loaded = 0
+            for range_first, range_last in ranges:
+                for db_path in self.db_paths():
+                    loaded += self._load(db_path, _WINDOW_SQL, (range_first, range_last))
+            for db_path, user_email in users:
+                loaded += self._load(db_path, _USER_SQL, (user_email, first, last))
+            self.loads += 1
+            span.set(rows=loaded)
+
+    # --- Delivery ---
+    def _pop_due(self, now: float):
+        due = []
+        with self._cond:
+            while self._heap and self._heap[0][0] <= now:
+                _fire_at, key, due_at, stage = heapq.heappop(self._heap)
+                reminder = self._tasks.get(key)
+                if reminder is None or reminder.due_at != due_at or reminder.stage != stage:
+                    continue
+                reminder.stage = stage + 1
+                due.append((key, due_at, stage))
+            self._compact()
+        return due
+
+    def _deliver(self, due, now: float):
+        by_path = {}
+        for item in due:
+            by_path.setdefault(item[0][0], []).append(item)
+        for db_path, items in by_path.items():
+            for start in range(0, len(items), VERIFY_CHUNK):
+                chunk = items[start:start + VERIFY_CHUNK]
+                with db.connection(db_path) as conn:
+                    rows = {row[0]: row for row in conn.execute(
+                        _VERIFY_SQL.format(", ".join("?" for _ in chunk)), [key[1] for key, _due_at, _stage in chunk])}
+                for key, due_at, stage in chunk:
+                    self._send(key, due_at, stage, rows.get(key[1]), now)
+
+    def _send(self, key, due_at: float, stage: int, row, now: float):
+        if row is None or row[4] != "pending" or due_timestamp(row[5], row[6]) != due_at:
+            # Changed behind the scheduler's back: re-queue with the current values, if any.
+            self.dropped += 1
+            with self._cond:
+                if row is None:
+                    self._tasks.pop(key, None)
+                else:
+                    self._track(key, row[4], row[5], row[6], now)
+            return
+        task_id, user_name, user_email, task_name, _status, due_date, due_time = row
+        notification = {
+            "event": EVENTS[stage],
+            "task_id": task_id,
+            "user_name": user_name,
+            "user_email": user_email,
+            "task_name": task_name,
+            "due_date": due_date,
+            "due_time": due_time,
+            "due_at": datetime.fromtimestamp(due_at).isoformat(timespec="minutes"),
+            "sent_at": datetime.fromtimestamp(now).isoformat(timespec="seconds"),
+        }
+        try:
+            self.sink.send(notification)
+            self.sent += 1
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"Could not send {EVENTS[stage]} reminder for task {task_id}: {e}")
+        with self._cond:
+            reminder = self._tasks.get(key)
+            if reminder is not None and reminder.due_at == due_at and reminder.stage == stage + 1:
+                self._push(key, reminder, now)
+
+    def run_pending(self) -> int:
+        """One scheduling step: loads what the window needs, then sends what is due. Returns reminders sent."""
+        now = self.clock()
+        self._maintain(now)
+        self._merge_changes(now)
+        due = self._pop_due(now)
+        if not due:
+            return 0
+        sent_before = self.sent
+        with telemetry.span("reminders.deliver", due=len(due)) as span:
+            self._deliver(due, now)
+            span.set(sent=self.sent - sent_before)
+        return self.sent - sent_before
+
+    def _sleep_seconds(self, now: float) -> float:
+        wake_at = now + MAX_SLEEP_SECONDS
+        if self._heap:
+            wake_at = min(wake_at, self._heap[0][0])
+        if self._queued_fire_at is not None:
+            wake_at = min(wake_at, self._queued_fire_at)
+        if self.resync_seconds:
+            wake_at = min(wake_at, self._next_resync)
+        tomorrow = datetime.fromtimestamp(now).date() + timedelta(days=1)
+        wake_at = min(wake_at, datetime(tomorrow.year, tomorrow.month, tomorrow.day).timestamp())
+        return max(0.0, wake_at - now)
+
+    # --- Thread ---
+    def _run(self):
+        while True:
+            failed = False
+            try:
+                self.run_pending()
+            except Exception as e:
+                failed = True
+                logger.error(f"Reminder scheduler step failed: {e}")
+            with self._cond:
+                if self._stopping:
+                    return
+                if failed:
+                    self._reload_all = True
+                    self._cond.wait(5)
+                elif not (self._dirty_users or self._reload_all or self._queued_rows >= MAX_QUEUED_CHANGES):
+                    now = self.clock()
+                    sleep_seconds = self._sleep_seconds(now)
+                    self._wake_at = now + sleep_seconds
+                    self._cond.wait(sleep_seconds)
+                    self._wake_at = 0.0
+
+    def start(self):
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="reminder-scheduler", daemon=True)
+        db.add_change_listener(self.on_change)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        db.remove_change_listener(self.on_change)
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "tracked": len(self._tasks),
+                "queued": sum(1 for r in self._tasks.values() if r.stage < _DONE),
+                "heap": len(self._heap),
+                "next_at": self._heap[0][0] if self._heap else None,
+                "window": self._window,
+                "sent": self.sent,
+                "failed": self.failed,
+                "dropped": self.dropped,
+                "loads": self.loads,
+                "queued_changes": self._queued_rows,
+            }
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def start_scheduler(sink_spec: str = None) -> ReminderScheduler:
+    """Starts the process-wide scheduler once; later calls return the running one."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = ReminderScheduler(sink_from_spec(sink_spec or REMINDER_SINK))
+            _scheduler.start()
+        return _scheduler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Send deadline reminders for pending tasks.")
+    parser.add_argument("--sink", default=REMINDER_SINK, help="log, file:<path> or an http(s) webhook URL")
+    parser.add_argument("--once", action="store_true", help="send what is due now and exit")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+    try:
+        sink = sink_from_spec(args.sink)
+    except ValueError as e:
+        parser.error(str(e))
+    scheduler = ReminderScheduler(sink)
+    try:
+        if args.once:
+            print(f"{scheduler.run_pending()} reminder(s) sent", file=sys.stderr)
+            return 0
+        scheduler.start()
+        while True:
+            time.sleep(MAX_SLEEP_SECONDS)
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        scheduler.stop()
+        sink.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+"""
+Splits an existing single-file tasks database into shards (see database.py, "Sharding").
+
+    python shard_migrate.py --source tasks.db --shards 8
+    python shard_migrate.py --source tasks.db --tenant --shard-dir tenants
+
+Shards are filled one at a time, so only one shard file is open at once however many
+there are: the users database.shard_path() sends to a shard are looked up first, then
+their rows are copied, ids included, one transaction per batch. Each shard gets its
+secondary indexes built once at the end, and its id sequence moved past both the
+source's and the start of its own range (database.shard_id_base), so ids handed out
+after the split collide neither with migrated ones nor across shards. The source is
+opened read-only and left untouched; each shard and the whole copy are verified by
+row count and id checksum. Afterwards start the app with the printed DB_SHARDS /
+DB_SHARD_DIR settings.
+"""
+import argparse
+import logging
+import os
+import sqlite3
+import sys
+import time
+
+import database as db
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 50000
+USERS_PER_QUERY = 500
+COLUMNS = ("id", "user_name", "user_email", "task_name", "status", "category", "created_at", "due_date", "due_time")
+INSERT_SQL = f"INSERT INTO tasks ({', '.join(COLUMNS)}) VALUES ({', '.join('?' for _ in COLUMNS)})"
+
+
+def _open_source(path: str):
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Source database {path!r} does not exist.")
+    return sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+
+
+def _prepare_shard(path: str, conn):
+    if conn.execute("SELECT 1 FROM tasks LIMIT 1").fetchone() is not None:
+        raise ValueError(f"Shard {path} already holds tasks; remove it or choose another --shard-dir.")
+    for name in db.MANAGED_INDEXES:
+        conn.execute(f"DROP INDEX IF EXISTS {name}")
+    conn.commit()
+
+
+def _users_by_shard(source) -> dict:
+    """Maps each shard path to the users whose tasks it will hold (read from idx_unq_user_task)."""
+    users = {}
+    for (user_email,) in source.execute("SELECT DISTINCT user_email FROM tasks"):
+        users.setdefault(db.shard_path(user_email), []).append(user_email)
+    return users
+
+
+def _iter_user_batches(source, user_emails: list, batch_size: int):
+    """Yields the tasks of `user_emails` in batches of up to `batch_size` rows."""
+    select = f"SELECT {', '.join(COLUMNS)} FROM tasks WHERE "
+    emails = [email for email in user_emails if email is not None]
+    queries = [(select + f"user_email IN ({', '.join('?' for _ in chunk)}) ORDER BY id", chunk)
+               for chunk in (emails[i:i + USERS_PER_QUERY] for i in range(0, len(emails), USERS_PER_QUERY))]
+    if len(emails) < len(user_emails):
+        queries.append((select + "user_email IS NULL ORDER BY id", []))
+    for sql, params in queries:
+        cursor = source.execute(sql, params)
+        while True:
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                break
+            yield batch
+
+
+def _copy_shard(source, path: str, user_emails: list, batch_size: int, sequence: int):
+    """Copies the users' tasks into the shard at `path`; returns (rows, id sum) as read back."""
+    db.create_db_and_table(path)
+    try:
+        with db.connection(path) as conn:
+            _prepare_shard(path, conn)
+            copied = id_sum = 0
+            for batch in _iter_user_batches(source, user_emails, batch_size):
+                conn.executemany(INSERT_SQL, batch)
+                conn.commit()
+                copied += len(batch)
+                id_sum += sum(row[0] for row in batch)
+            db.sync_managed_indexes(conn)
+            db.advance_id_sequence(conn, sequence)
+            actual = tuple(conn.execute("SELECT COUNT(*), COALESCE(SUM(id), 0) FROM tasks").fetchone())
+    finally:
+        # Done with this shard: do not keep a pooled connection per shard open.
+        db.close_connections(path)
+    if actual != (copied, id_sum):
+        raise ValueError(f"Shard {path} holds {actual[0]:,} rows (id sum {actual[1]}) "
+                         f"but {copied:,} (id sum {id_sum}) were copied.")
+    return actual
+
+
+def migrate(source_path: str, batch_size: int = BATCH_SIZE) -> dict:
+    """
+    Copies every task of `source_path` into the shards configured by db.DB_SHARDS and
+    db.DB_SHARD_DIR, one shard at a time. Returns {shard path: rows copied}; raises
+    ValueError when the copy does not match the source.
+    """
+    if not db.is_sharded():
+        raise ValueError("Set a shard count above 1 or tenant mode before migrating.")
+    source = _open_source(source_path)
+    start = time.perf_counter()
+    copied = {}
+    actual_rows = actual_sum = 0
+    try:
+        expected_rows, expected_sum, max_id = source.execute(
+            "SELECT COUNT(*), COALESCE(SUM(id), 0), COALESCE(MAX(id), 0) FROM tasks"
+        ).fetchone()
+        sequence = source.execute("SELECT COALESCE(MAX(seq), 0) FROM sqlite_sequence WHERE name = 'tasks'").fetchone()[0]
+        for path, user_emails in sorted(_users_by_shard(source).items()):
+            rows, id_sum = _copy_shard(source, path, user_emails, batch_size, max(sequence, max_id))
+            copied[path] = rows
+            actual_rows += rows
+            actual_sum += id_sum
+            logger.info(f"copied {actual_rows:,}/{expected_rows:,} tasks ({path}: {rows:,})")
+    finally:
+        source.close()
+    if (actual_rows, actual_sum) != (expected_rows, expected_sum):
+        raise ValueError(f"Shard contents do not match the source: {actual_rows:,} rows (id sum {actual_sum}) "
+                         f"vs {expected_rows:,} (id sum {expected_sum}).")
+    logger.info(f"migrated {actual_rows:,} tasks into {len(copied)} shard(s) in {time.perf_counter() - start:.2f}s")
+    return copied
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", default=db.DB_FILENAME, help=f"database to split (default: {db.DB_FILENAME})")
+    layout = parser.add_mutually_exclusive_group(required=True)
+    layout.add_argument("--shards", type=int, help="number of hash shards")
+    layout.add_argument("--tenant", action="store_true", help="one database per email domain")
+    parser.add_argument("--shard-dir", default=db.DB_SHARD_DIR, help=f"directory for the shards (default: {db.DB_SHARD_DIR})")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+
+    db.DB_SHARDS = "tenant" if args.tenant else str(args.shards)
+    db.DB_SHARD_DIR = args.shard_dir
+    try:
+        copied = migrate(args.source, args.batch_size)
+    except (ValueError, FileNotFoundError, sqlite3.Error) as e:
+        logger.error(str(e))
+        return 1
+    for path, rows in sorted(copied.items()):
+        print(f"{path}\t{rows:,}")
+    print(f"Start the app with DB_SHARDS={db.DB_SHARDS} DB_SHARD_DIR={db.DB_SHARD_DIR}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
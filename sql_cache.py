@@ -0,0 +1,179 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+
+# Only pure politeness is dropped: verbs and nouns ("get", "show", "tasks") decide
+# whether a command reads or writes, so "Please show my tasks" and "show my tasks"
+# share a key but "get groceries" and "show groceries" do not.
+POLITE_WORDS = {"please", "pls", "kindly"}
+POLITE_OPENERS = (("could", "you"), ("can", "you"), ("would", "you"), ("will", "you"))
+
+# Date literals in generated SQL, e.g. due_date = '2026-10-19'.
+_DATE_LITERAL_RE = re.compile(r"'(\d{4}-\d{2}-\d{2})'")
+_MAX_TEMPLATED_DAY_OFFSET = 366
+# Date phrasings that do not move by whole days with "today": weekdays, weeks, months,
+# calendar dates. A command using one keeps its date in the templated key and its date
+# literals verbatim; only commands like "today", "tomorrow" or "in 3 days" (or with no
+# date at all) get their dates stored as offsets from today.
+_CALENDAR_DATE_RE = re.compile(
+    r"\b(?:(?:mon|tues|wednes|thurs|fri|satur|sun)days?|mon|tue|tues|wed|thu|thur|thurs|fri|sat|sun)\b"
+    r"|\bweek(?:end)?s?\b|\bmonths?\b|\byears?\b"
+    r"|\b(?:jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?|sept?(?:ember)?"
+    r"|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)\b"
+    r"|\d{4}-\d{1,2}-\d{1,2}|\b\d{1,2}[/.]\d{1,2}\b|\b\d{1,2}(?:st|nd|rd|th)\b"
+)
+
+
+def is_day_relative(user_query: str) -> bool:
+    """True if every date the command names is relative to today ("today", "tomorrow", "in 3 days")."""
+    return _CALENDAR_DATE_RE.search(user_query.lower()) is None
+
+
+def normalize_query_text(user_query: str) -> str:
+    """Lower-cases and strips punctuation and politeness so near-identical commands share a key."""
+    text = user_query.lower().replace("’", "'")
+    # Quoted task names are significant; keep them verbatim.
+    quoted = re.findall(r"'[^']*'|\"[^\"]*\"", text)
+    for i, q in enumerate(quoted):
+        text = text.replace(q, f" __q{i}__ ", 1)
+    words = re.findall(r"[a-z0-9_:']+", text)
+    words = [w.strip("'") for w in words]
+    kept = [w for w in words if w and w not in POLITE_WORDS]
+    for opener in POLITE_OPENERS:
+        if tuple(kept[:len(opener)]) == opener:
+            kept = kept[len(opener):]
+            break
+    normalized = " ".join(kept)
+    for i, q in enumerate(quoted):
+        normalized = normalized.replace(f"__q{i}__", q.strip("'\""))
+    return normalized
+
+
+def _sql_string_literal(value: str) -> str:
+    return value.replace("'", "''")
+
+
+class SQLQueryCache:
+    """
+    LRU/TTL cache for natural-language -> SQL translations.
+
+    In exact mode the key is (normalized query, user_email, resolved date, context) and
+    the cached value is the SQL returned by the LLM.
+
+    In templating mode the user's name and email are replaced by placeholders before
+    storing and the key drops the user. For day-relative commands (is_day_relative)
+    date literals within a year of today are stored as offsets and the key drops the
+    date too; other commands keep both. A hit binds the current user's values back in,
+    so one LLM answer serves every user (and, for relative dates, every day).
+    """
+
+    def __init__(self, max_entries: int = 512, ttl_seconds: float = 3600, templating: bool = False):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.templating = templating
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # --- Keys ---
+    def make_key(self, user_query: str, user_email: str, today: date, previous_task_context: str):
+        """The cache key, or None when nothing is left of the query to key on."""
+        normalized = normalize_query_text(user_query)
+        if not normalized:
+            return None
+        if self.templating:
+            if is_day_relative(user_query):
+                return ("template", normalized, previous_task_context or "None")
+            return ("template", normalized, today.isoformat(), previous_task_context or "None")
+        return ("exact", normalized, user_email, today.isoformat(), previous_task_context or "None")
+
+    # --- Templating ---
+    def _to_template(self, sql: str, user_name: str, user_email: str, today: date, relative_dates: bool = True):
+        if "{" in sql or "}" in sql:
+            return None
+        template = sql
+        for placeholder, value in (("{user_email}", user_email), ("{user_name}", user_name)):
+            if not value:
+                continue
+            literal = f"'{_sql_string_literal(value)}'"
+            # A literal that appears more than once might be task data (e.g. a user
+            # named "Work" and category 'Work'); binding it per user would be wrong.
+            if template.count(literal) > 1:
+                return None
+            template = template.replace(literal, f"'{placeholder}'")
+
+        def date_placeholder(match):
+            try:
+                literal = datetime.strptime(match.group(1), "%Y-%m-%d").date()
+            except ValueError:
+                return match.group(0)
+            offset = (literal - today).days
+            if abs(offset) > _MAX_TEMPLATED_DAY_OFFSET:
+                return match.group(0)
+            return f"'{{date{offset:+d}}}'"
+
+        return _DATE_LITERAL_RE.sub(date_placeholder, template) if relative_dates else template
+
+    def _bind_template(self, template: str, user_name: str, user_email: str, today: date) -> str:
+        def bind_date(match):
+            return (today + timedelta(days=int(match.group(1)))).isoformat()
+
+        sql = re.sub(r"\{date([+-]\d+)\}", bind_date, template)
+        return sql.replace("{user_email}", _sql_string_literal(user_email or "")).replace(
+            "{user_name}", _sql_string_literal(user_name or "")
+        )
+
+    # --- Lookup / store ---
+    def get(self, user_query: str, user_name: str, user_email: str, today: date, previous_task_context: str):
+        key = self.make_key(user_query, user_email, today, previous_task_context)
+        with self._lock:
+            entry = self._entries.get(key) if key is not None else None
+            if entry is not None and self.ttl_seconds and time.monotonic() - entry[1] > self.ttl_seconds:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            value = entry[0]
+        if self.templating:
+            return self._bind_template(value, user_name, user_email, today)
+        return value
+
+    def put(self, user_query: str, user_name: str, user_email: str, today: date, previous_task_context: str, sql: str):
+        """Stores `sql` for the query; call only once the statement has executed successfully."""
+        key = self.make_key(user_query, user_email, today, previous_task_context)
+        if not sql or key is None:
+            return
+        value = sql
+        if self.templating:
+            value = self._to_template(sql, user_name, user_email, today, is_day_relative(user_query))
+            if value is None:
+                return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "templating": self.templating,
+            }
@@ -0,0 +1,577 @@
+"""
+Safety and cost guard for LLM-generated SQL.
+
+Before a generated statement reaches database.py it is tokenized and checked:
+
+- exactly one SELECT, INSERT, UPDATE or DELETE on `tasks` (no second statement,
+  no other tables, joins, compound SELECTs or WITH clauses);
+- every SELECT scope, UPDATE and DELETE is filtered on `user_email = <current
+  user>` as a top-level AND term (added when missing), every INSERT sets
+  user_email to the current user (added when missing), and user_email is never
+  compared with anything else;
+- UPDATE and DELETE need a WHERE condition besides the tenant filter that can be
+  false for some row (`1=1`, `x = x` or `task_name LIKE '%'` do not count), and may
+  change at most SQL_GUARD_MAX_WRITE_ROWS tasks (checked with a COUNT(*) first);
+- no statement may pick row ids (an `id` column in an INSERT or SET) or resolve
+  conflicts by replacing or updating an existing row (REPLACE, OR REPLACE,
+  ON CONFLICT), since that row may belong to another user;
+- a top-level SELECT gets `LIMIT SQL_GUARD_MAX_ROWS` (a larger LIMIT is lowered);
+- string and number literals are rewritten to bound `?` parameters, so statements
+  that differ only in their values share one SQLite prepared statement;
+- the rewritten statement goes through query_planner, whose EXPLAIN QUERY PLAN
+  row estimate must stay under SQL_GUARD_MAX_COST.
+
+SQL_GUARD=enforce (default) applies rewrites and raises SQLGuardError on
+violations, "log" only logs what it would have done, "off" skips the analysis.
+"""
+import functools
+import logging
+import os
+import re
+import sqlite3
+import time
+from dataclasses import dataclass, field
+from typing import NamedTuple
+
+import database as db
+import query_planner
+import telemetry
+from task_store import RETURNING_FIELDS
+
+logger = logging.getLogger(__name__)
+
+SQL_GUARD_MODES = ("off", "log", "enforce")
+SQL_GUARD = os.getenv("SQL_GUARD", "enforce").strip().lower()
+if SQL_GUARD not in SQL_GUARD_MODES:
+    SQL_GUARD = "enforce"
+SQL_GUARD_MAX_ROWS = int(os.getenv("SQL_GUARD_MAX_ROWS", "1000"))
+SQL_GUARD_MAX_COST = int(os.getenv("SQL_GUARD_MAX_COST", "100000"))   # estimated rows visited; 0 disables
+SQL_GUARD_MAX_WRITE_ROWS = int(os.getenv("SQL_GUARD_MAX_WRITE_ROWS", "100"))   # rows one UPDATE/DELETE may change; 0 disables
+ALLOWED_TABLES = ("tasks",)
+TENANT_COLUMN = "user_email"
+
+_TOKEN_RE = re.compile(r"""
+    (?P<ws>\s+)
+  | (?P<comment>--[^\n]*|/\*.*?(?:\*/|\Z))
+  | (?P<blob>[xX]'[0-9A-Fa-f]*')
+  | (?P<string>'(?:[^']|'')*')
+  | (?P<ident>"(?:[^"]|"")*"|`(?:[^`]|``)*`|\[[^\]]*\])
+  | (?P<number>0[xX][0-9A-Fa-f]+|(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d+)?)
+  | (?P<param>\?\d*|[:@$][A-Za-z_]\w*)
+  | (?P<word>[A-Za-z_][\w$]*)
+  | (?P<op>\|\||<<|>>|<=|>=|==|!=|<>|->>|->|[-+*/%&|~<>=(),.;])
+""", re.VERBOSE | re.DOTALL)
+_KINDS = {"select": "select", "insert": "insert", "replace": "insert", "update": "update", "delete": "delete"}
+# Keywords that start a clause; literals keep their meaning by clause.
+_CLAUSES = {"select", "from", "where", "group", "having", "order", "limit", "offset", "set", "values",
+            "returning", "on", "conflict", "window", "partition", "into", "update", "delete", "insert", "replace"}
+_LITERAL_CLAUSES = {"order", "group", "limit", "offset", "partition"}   # ordinals and counts stay literal
+_PREDICATE_CLAUSES = {"where", "set", "on", "having"}
+_WHERE_END = {"group", "having", "order", "limit", "returning", "window"}
+_TABLE_INTRODUCERS = {"from", "join", "into", "update"}
+# Names that refer to a row's values; a WHERE term without any of them is constant.
+_ROW_REFERENCES = set(RETURNING_FIELDS) | {"user_name", "rowid", "oid", "_rowid_"}
+_SAME_SIDES_OPS = {"=", "==", ">=", "<=", "is"}     # `x OP x` holds for every non-NULL x
+_MATCH_ALL_PATTERNS = {"like": "%", "glob": "*"}
+_ROWID_COLUMNS = {"id", "rowid", "oid", "_rowid_"}
+
+
+class SQLGuardError(ValueError):
+    """Raised when a generated statement breaks a guard rule."""
+
+
+class _Token(NamedTuple):
+    kind: str
+    text: str
+    name: str       # lower-case word or unquoted identifier, else ""
+
+
+@dataclass
+class GuardedStatement:
+    sql: str
+    params: tuple
+    kind: str                                       # "select", "insert", "update" or "delete"
+    rewrites: list = field(default_factory=list)    # what the guard changed, for display
+    estimated_rows: int = None
+    scope_sql: str = None                           # UPDATE/DELETE: COUNT(*) of the rows the WHERE matches
+    scope_params: tuple = ()
+    parse_ms: float = 0.0
+
+
+@functools.lru_cache(maxsize=512)
+def _tokenize(sql: str):
+    tokens, pos = [], 0
+    while pos < len(sql):
+        match = _TOKEN_RE.match(sql, pos)
+        if not match:
+            raise SQLGuardError(f"Could not parse the generated SQL near {sql[pos:pos + 20]!r}.")
+        kind, text = match.lastgroup, match.group()
+        if kind == "word":
+            name = text.lower()
+        elif kind == "ident":
+            name = text[1:-1].replace(text[0] * 2, text[0]).lower() if text[0] != "[" else text[1:-1].lower()
+        else:
+            name = ""
+        tokens.append(_Token(kind, text, name))
+        pos = match.end()
+    return tuple(tokens)
+
+
+def _literal_value(token: _Token):
+    if token.kind == "string":
+        return token.text[1:-1].replace("''", "'")
+    if token.text[:2].lower() == "0x":
+        return int(token.text, 16)
+    if any(c in token.text for c in ".eE"):
+        return float(token.text)
+    return int(token.text)
+
+
+def statement_kind(sql: str):
+    """"select", "insert", "update", "delete" or None, from the first keyword."""
+    try:
+        tokens = _tokenize(sql)
+    except SQLGuardError:
+        return None
+    first = next((t for t in tokens if t.kind not in ("ws", "comment")), None)
+    return _KINDS.get(first.name) if first is not None and first.kind == "word" else None
+
+
+class _Statement:
+    """One tokenized statement with its structure and the edits the guard makes to it."""
+
+    def __init__(self, sql: str, params, user_email: str):
+        self.tokens = _tokenize(sql)
+        self.params = tuple(params or ())
+        self.user_email = user_email
+        self.sig = [i for i, t in enumerate(self.tokens) if t.kind not in ("ws", "comment")]
+        self.rewrites = []
+        self.bound = set()          # token indexes of literals to bind
+        self.replace = {}           # token index -> replacement text
+        self.before, self.after = {}, {}    # token index -> [(text, params)]
+        self.suffix = []            # [(text, params)] appended at the end
+        self.write_scope = None     # (table sig index, alias end, WHERE sig index, WHERE end) of an UPDATE/DELETE
+        self._structure()
+        self.param_at = {self.sig[n]: index for n, index in self.param_index.items()}
+
+    # --- Structure ---
+    def tok(self, n: int) -> _Token:
+        return self.tokens[self.sig[n]] if 0 <= n < len(self.sig) else _Token("end", "", "")
+
+    def _structure(self):
+        if not self.sig:
+            raise SQLGuardError("The generated SQL is empty.")
+        # A trailing semicolon is dropped; anything after a top-level one is a second statement.
+        while self.sig and self.tok(len(self.sig) - 1).text == ";":
+            self.sig.pop()
+        self.depth, self.clause, self.close = [], [], {}
+        opened, clauses = [], [None]
+        self.param_index, params_seen = {}, 0
+        for n in range(len(self.sig)):
+            token = self.tok(n)
+            if token.text == "(":
+                self.depth.append(len(opened))
+                self.clause.append(clauses[-1])
+                opened.append(n)
+                clauses.append(clauses[-1])
+                continue
+            if token.text == ")":
+                if not opened:
+                    raise SQLGuardError("The generated SQL has unbalanced parentheses.")
+                self.close[opened.pop()] = n
+                clauses.pop()
+            elif token.text == ";":
+                raise SQLGuardError("The generated SQL contains more than one statement.")
+            elif token.kind == "word" and token.name in _CLAUSES:
+                clauses[-1] = token.name
+            elif token.kind == "param":
+                if token.text != "?":
+                    raise SQLGuardError("Only ? placeholders are supported in generated SQL.")
+                self.param_index[n] = params_seen
+                params_seen += 1
+            self.depth.append(len(opened))
+            self.clause.append(clauses[-1])
+        if opened:
+            raise SQLGuardError("The generated SQL has unbalanced parentheses.")
+        if params_seen != len(self.params):
+            raise SQLGuardError(f"The generated SQL has {params_seen} placeholder(s) but {len(self.params)} parameter(s).")
+        first = self.tok(0)
+        if first.name == "with":
+            raise SQLGuardError("WITH queries are not supported; ask for the tasks directly.")
+        self.kind = _KINDS.get(first.name) if first.kind == "word" else None
+        if self.kind is None:
+            raise SQLGuardError("Only SELECT, INSERT, UPDATE and DELETE statements on tasks are allowed.")
+        if any(self.tok(n).name in ("union", "intersect", "except") for n in range(len(self.sig))):
+            raise SQLGuardError("Compound SELECTs are not supported in generated SQL.")
+
+    def _at_depth(self, start: int, end: int, depth: int):
+        return [n for n in range(start, end) if self.depth[n] == depth]
+
+    def _scopes(self):
+        """(start, end, depth) of the statement and of every parenthesized SELECT in it."""
+        scopes = [(0, len(self.sig), 0)]
+        for n, close in self.close.items():
+            if self.tok(n + 1).name == "select":
+                scopes.append((n + 1, close, self.depth[n] + 1))
+        return scopes
+
+    # --- Checks ---
+    def check_tables(self, start: int, end: int, depth: int) -> bool:
+        """Validates the table references of one scope; True if it reads or writes tasks."""
+        tables = 0
+        for n in self._at_depth(start, end, depth):
+            token = self.tok(n)
+            introduces = token.kind == "word" and token.name in _TABLE_INTRODUCERS
+            if not (introduces or token.text == "," and self.clause[n] == "from"):
+                continue
+            if token.name == "update" and self.tok(n - 1).name == "do":
+                continue    # ON CONFLICT ... DO UPDATE SET
+            target_n = n + 3 if token.name == "update" and self.tok(n + 1).name == "or" else n + 1
+            target = self.tok(target_n)
+            if target.text == "(":
+                continue    # subquery, checked as its own scope
+            if target.kind not in ("word", "ident"):
+                raise SQLGuardError("The generated SQL names no table.")
+            if self.tok(target_n + 1).text == "." or self.tok(target_n + 1).text == "(" and token.name != "into":
+                raise SQLGuardError(f"The generated SQL uses {target.text}{self.tok(target_n + 1).text}...; "
+                                    "only the tasks table is allowed.")
+            if target.name not in ALLOWED_TABLES:
+                raise SQLGuardError(f"The generated SQL uses the table {target.text}; only tasks is allowed.")
+            tables += 1
+        if tables > 1:
+            raise SQLGuardError("Joins are not supported in generated SQL.")
+        return tables == 1
+
+    def _tenant_value(self, n: int):
+        """Value compared by `user_email = <value>` at sig index n, or raises if the shape is anything else."""
+        token = self.tok(n)
+        following = self.tok(n + 1)
+        if token.kind == "string":
+            value = _literal_value(token)
+        elif token.kind == "param":
+            value = self.params[self.param_index[n]]
+        else:
+            value = None
+        if value is None or following.kind == "op" and following.text not in (")", ","):
+            raise SQLGuardError(f"{TENANT_COLUMN} may only be compared with = to your own email.")
+        return value
+
+    def check_overwrites(self):
+        """Rejects conflict handling that replaces or updates existing rows, and explicit row ids."""
+        if self.tok(0).name == "replace":
+            raise SQLGuardError("REPLACE is not allowed in generated SQL; use INSERT.")
+        for n in range(len(self.sig)):
+            token = self.tok(n)
+            if token.name == "or" and self.tok(n + 1).name == "replace" and self.tok(n - 1).name in ("insert", "update"):
+                raise SQLGuardError("OR REPLACE is not allowed in generated SQL.")
+            if token.name == "on" and self.tok(n + 1).name == "conflict":
+                raise SQLGuardError("ON CONFLICT clauses are not allowed in generated SQL.")
+            if self.clause[n] == "set" and token.name in _ROWID_COLUMNS and self._is_set_target(n):
+                raise SQLGuardError("Generated SQL may not change task ids.")
+
+    def _is_set_target(self, n: int) -> bool:
+        """True if sig index n is a column assigned by SET (`SET x = ...` or `SET (x, y) = ...`)."""
+        previous = self.tok(n - 1).text.lower()
+        if previous in ("set", ",") and self.depth[n] == 0:
+            return self.tok(n + 1).text == "="
+        if previous in ("(", ",") and self.depth[n] == 1:
+            opened = max(o for o in self.close if o < n and self.close[o] > n)
+            return self.tok(opened - 1).text.lower() in ("set", ",") and self.tok(self.close[opened] + 1).text == "="
+        return False
+
+    def check_tenant_references(self):
+        for n in range(len(self.sig)):
+            token = self.tok(n)
+            if token.name != TENANT_COLUMN or self.clause[n] not in _PREDICATE_CLAUSES:
+                continue
+            if self.tok(n + 1).text not in ("=", "==") or self.tok(n - 1).text in ("=", "=="):
+                raise SQLGuardError(f"{TENANT_COLUMN} may only be compared with = to your own email.")
+            if self._tenant_value(n + 2) != self.user_email:
+                raise SQLGuardError("The generated SQL reads or changes another user's tasks.")
+
+    def _is_tenant_term(self, first: int, last: int) -> bool:
+        names = [self.tok(n) for n in range(first, last + 1)]
+        if len(names) == 5 and names[1].text == ".":
+            names = names[2:]
+        return len(names) == 3 and names[0].name == TENANT_COLUMN and names[1].text in ("=", "==")
+
+    def enforce_tenant_filter(self, start: int, end: int, depth: int, write: bool):
+        """Adds `user_email = ?` to a scope's WHERE unless it is already a top-level AND term."""
+        level = self._at_depth(start, end, depth)
+        where = next((n for n in level if self.tok(n).name == "where"), None)
+        if where is None:
+            if write:
+                raise SQLGuardError(f"{self.kind.upper()} without a WHERE clause would change every task.")
+            stop = next((n for n in level if self.tok(n).name in _WHERE_END), end)
+            self.after.setdefault(self.sig[stop - 1], []).append((f" WHERE {TENANT_COLUMN} = ?", (self.user_email,)))
+            self.rewrites.append("tenant filter added")
+            return
+        where_end = next((n for n in level if n > where and self.tok(n).name in _WHERE_END), end)
+        terms, has_or, term_start, in_between = [], False, where + 1, False
+        for n in (n for n in level if where < n < where_end):
+            name = self.tok(n).name
+            if name == "between":
+                in_between = True
+            elif name == "and" and in_between:
+                in_between = False
+            elif name == "and":
+                terms.append((term_start, n - 1))
+                term_start = n + 1
+            elif name == "or":
+                has_or = True
+        terms.append((term_start, where_end - 1))
+        tenant_terms = [term for term in terms if self._is_tenant_term(*term)]
+        if write:
+            if self._always_true(where + 1, where_end - 1):
+                raise SQLGuardError(f"{self.kind.upper()} has no condition besides the user filter that narrows "
+                                    "it down and would change all your tasks.")
+            self.write_scope = (*self._write_target(), where, where_end)
+        if tenant_terms and not has_or:
+            return
+        self.before.setdefault(self.sig[where + 1], []).append((f"{TENANT_COLUMN} = ? AND (", (self.user_email,)))
+        self.after.setdefault(self.sig[where_end - 1], []).append((")", ()))
+        self.rewrites.append("tenant filter added")
+
+    def _split(self, level, word: str):
+        """(first, last) ranges of `level` split at top-level `word` ("and" skips BETWEEN ... AND)."""
+        parts, part_start, in_between = [], level[0], False
+        for n in level:
+            name = self.tok(n).name
+            if name == "between":
+                in_between = True
+            elif name == "and" and in_between:
+                in_between = False
+            elif name == word:
+                parts.append((part_start, n - 1))
+                part_start = n + 1
+        parts.append((part_start, level[-1]))
+        return parts
+
+    def _always_true(self, first: int, last: int) -> bool:
+        """
+        True for a condition that cannot narrow a write: only tenant terms, terms without
+        a row reference (1=1), `x = x`, match-all LIKE/GLOB patterns, or an OR with any
+        such branch. Conditions that hold for every row in subtler ways (id > 0) are
+        left to the SQL_GUARD_MAX_WRITE_ROWS count.
+        """
+        while first < last and self.tok(first).text == "(" and self.close.get(first) == last:
+            first, last = first + 1, last - 1
+        if first > last:
+            return True
+        level = [n for n in range(first, last + 1) if self.depth[n] == self.depth[first]]
+        branches = self._split(level, "or")
+        if len(branches) > 1:
+            return any(self._always_true(*branch) for branch in branches)
+        terms = self._split(level, "and")
+        if len(terms) > 1:
+            return all(self._always_true(*term) for term in terms)
+        if self._is_tenant_term(first, last):
+            return True
+        tokens = [self.tok(n) for n in range(first, last + 1)]
+        if not any(t.kind == "ident" or t.kind == "word" and t.name in _ROW_REFERENCES for t in tokens):
+            return True
+        for n in level:
+            token = self.tok(n)
+            if token.name in _MATCH_ALL_PATTERNS and self.tok(n - 1).name != "not" and n + 1 == last:
+                pattern = self.tok(last)
+                if pattern.kind == "string":
+                    value = _literal_value(pattern)
+                elif pattern.kind == "param":
+                    value = self.params[self.param_index[last]]
+                else:
+                    value = None
+                if isinstance(value, str) and value.strip(_MATCH_ALL_PATTERNS[token.name]) == "":
+                    return True
+            if token.text in _SAME_SIDES_OPS or token.name in _SAME_SIDES_OPS:
+                left = [self.tok(i).text.lower() for i in range(first, n)]
+                right = [self.tok(i).text.lower() for i in range(n + 1, last + 1)]
+                if left and left == right:
+                    return True
+        return False
+
+    def _write_target(self):
+        """(sig index of the UPDATE/DELETE table, sig index of its alias or itself)."""
+        target = next(n for n in range(len(self.sig)) if self.depth[n] == 0 and self.tok(n).name in ALLOWED_TABLES)
+        following = self.tok(target + 1)
+        if following.name == "as":
+            return target, target + 2
+        if following.kind in ("word", "ident") and following.name not in ("set", "where", "indexed", "not"):
+            return target, target + 1
+        return target, target
+
+    def enforce_insert_tenant(self):
+        into = next((n for n in range(len(self.sig)) if self.tok(n).name == "into"), None)
+        columns_open = into + 2 if into is not None else None
+        if columns_open is None or self.tok(columns_open).text != "(":
+            raise SQLGuardError("Generated INSERTs must list their columns.")
+        columns_close = self.close[columns_open]
+        columns = [self.tok(n).name for n in self._at_depth(columns_open + 1, columns_close, 1) if self.tok(n).text != ","]
+        if _ROWID_COLUMNS & set(columns):
+            raise SQLGuardError("Generated INSERTs may not set task ids.")
+        values = columns_close + 1
+        if self.tok(values).name != "values":
+            raise SQLGuardError("Only INSERT ... VALUES is supported in generated SQL.")
+        rows, n = [], values + 1
+        while self.tok(n).text == "(":
+            rows.append((n, self.close[n]))
+            n = self.close[n] + 1
+            if self.tok(n).text != ",":
+                break
+            n += 1
+        if not rows:
+            raise SQLGuardError("Only INSERT ... VALUES is supported in generated SQL.")
+        if TENANT_COLUMN not in columns:
+            self.after.setdefault(self.sig[columns_close - 1], []).append((f", {TENANT_COLUMN}", ()))
+            for _row_open, row_close in rows:
+                self.after.setdefault(self.sig[row_close - 1], []).append((", ?", (self.user_email,)))
+            self.rewrites.append(f"{TENANT_COLUMN} column added")
+            return
+        position = columns.index(TENANT_COLUMN)
+        for row_open, row_close in rows:
+            commas = [n for n in self._at_depth(row_open + 1, row_close, 1) if self.tok(n).text == ","]
+            bounds = [row_open] + commas + [row_close]
+            if position + 1 >= len(bounds) or bounds[position + 1] - bounds[position] != 2:
+                raise SQLGuardError(f"{TENANT_COLUMN} must be set to your own email.")
+            if self._tenant_value(bounds[position] + 1) != self.user_email:
+                raise SQLGuardError("The generated SQL adds a task for another user.")
+
+    def enforce_limit(self):
+        level = self._at_depth(0, len(self.sig), 0)
+        limit = next((n for n in level if self.tok(n).name == "limit"), None)
+        if limit is None:
+            self.suffix.append((f" LIMIT {SQL_GUARD_MAX_ROWS}", ()))
+            self.rewrites.append(f"LIMIT {SQL_GUARD_MAX_ROWS} added")
+            return
+        count = limit + 3 if self.tok(limit + 2).text == "," else limit + 1
+        token = self.tok(count)
+        if token.kind != "number" or self.tok(count + 1).kind == "op" and self.tok(count + 1).text != ",":
+            raise SQLGuardError("LIMIT must be a plain number in generated SQL.")
+        if _literal_value(token) > SQL_GUARD_MAX_ROWS:
+            self.replace[self.sig[count]] = str(SQL_GUARD_MAX_ROWS)
+            self.rewrites.append(f"LIMIT lowered to {SQL_GUARD_MAX_ROWS}")
+
+    def bind_literals(self):
+        for n in range(len(self.sig)):
+            token = self.tok(n)
+            if token.kind in ("string", "number") and self.clause[n] not in _LITERAL_CLAUSES \
+                    and self.tok(n - 1).name != "as" and self.sig[n] not in self.replace:
+                self.bound.add(self.sig[n])
+        if self.bound:
+            self.rewrites.append(f"{len(self.bound)} literal(s) bound as parameters")
+
+    # --- Output ---
+    def render(self, first: int = 0, last: int = None):
+        """The rewritten SQL and parameters of sig indexes first..last (the whole statement by default)."""
+        whole = last is None
+        last = len(self.sig) - 1 if whole else last
+        parts, params = [], []
+        for i in range(self.sig[first], self.sig[last] + 1):
+            token = self.tokens[i]
+            for text, values in self.before.get(i, ()):
+                parts.append(text)
+                params.extend(values)
+            if token.kind == "comment":
+                parts.append(" ")
+            elif token.kind == "param":
+                parts.append("?")
+                params.append(self.params[self.param_at[i]])
+            elif i in self.bound:
+                parts.append("?")
+                params.append(_literal_value(token))
+            else:
+                parts.append(self.replace.get(i, token.text))
+            for text, values in self.after.get(i, ()):
+                parts.append(text)
+                params.extend(values)
+        for text, values in self.suffix if whole else ():
+            parts.append(text)
+            params.extend(values)
+        return "".join(parts).strip(), tuple(params)
+
+    def render_scope(self):
+        """SELECT COUNT(*) of the rows an UPDATE/DELETE would change, or (None, ())."""
+        if self.write_scope is None:
+            return None, ()
+        target, alias_end, where, where_end = self.write_scope
+        table_sql, table_params = self.render(target, alias_end)
+        where_sql, where_params = self.render(where, where_end - 1)
+        return f"SELECT COUNT(*) FROM {table_sql} {where_sql}", table_params + where_params
+
+
+def analyze(sql: str, params: tuple = None, user_email: str = None) -> GuardedStatement:
+    """Checks and rewrites one statement for `user_email`; raises SQLGuardError on a violation."""
+    if not user_email:
+        raise SQLGuardError("A user email is needed to check generated SQL.")
+    started = time.perf_counter()
+    statement = _Statement(sql, params, user_email)
+    statement.check_overwrites()
+    statement.check_tenant_references()
+    if statement.kind == "insert":
+        statement.enforce_insert_tenant()
+    for start, end, depth in statement._scopes():
+        uses_tasks = statement.check_tables(start, end, depth)
+        if uses_tasks and (depth > 0 or statement.kind in ("select", "update", "delete")):
+            write = depth == 0 and statement.kind in ("update", "delete")
+            statement.enforce_tenant_filter(start, end, depth, write)
+    if statement.kind == "select":
+        statement.enforce_limit()
+    statement.bind_literals()
+    if any(t.kind == "comment" for t in statement.tokens):
+        statement.rewrites.append("comments removed")
+    guarded_sql, guarded_params = statement.render()
+    scope_sql, scope_params = statement.render_scope()
+    return GuardedStatement(guarded_sql, guarded_params, statement.kind, statement.rewrites,
+                            scope_sql=scope_sql, scope_params=scope_params,
+                            parse_ms=(time.perf_counter() - started) * 1000)
+
+
+def guard(sql: str, params: tuple = None, user_email: str = None, mode: str = None, conn=None) -> GuardedStatement:
+    """
+    Applies the SQL_GUARD policy to a generated statement and runs the query plan check
+    on the result. Returns the statement to execute; raises SQLGuardError when it is
+    rejected (enforce mode) and query_planner.QueryPlanError in its reject mode.
+    """
+    if conn is None:
+        with db.connection_for(user_email) as conn:
+            return guard(sql, params, user_email, mode, conn)
+    mode = mode or SQL_GUARD
+    with telemetry.span("sql.guard", mode=mode) as span:
+        guarded = GuardedStatement(sql, tuple(params or ()), statement_kind(sql))
+        if mode != "off":
+            try:
+                analyzed = analyze(sql, params, user_email)
+            except SQLGuardError as e:
+                if mode == "enforce":
+                    span.set(rejected=True)
+                    raise
+                logger.warning(f"SQL guard would reject ({e}): {sql}")
+            else:
+                if mode == "enforce":
+                    guarded = analyzed
+                elif analyzed.rewrites:
+                    logger.warning(f"SQL guard would rewrite ({', '.join(analyzed.rewrites)}): {sql}")
+                guarded.parse_ms = analyzed.parse_ms
+        report = query_planner.check_query_plan(guarded.sql, guarded.params, conn=conn)
+        if report is None and mode == "enforce" and SQL_GUARD_MAX_COST:
+            try:
+                report = query_planner.explain_query_plan(guarded.sql, guarded.params, conn)
+            except sqlite3.Error:
+                report = None   # the statement fails (and is reported) when executed
+        if report is not None:
+            guarded.estimated_rows = report.estimated_rows
+            if mode == "enforce" and SQL_GUARD_MAX_COST and report.estimated_rows > SQL_GUARD_MAX_COST:
+                span.set(rejected=True)
+                raise SQLGuardError(f"The query would visit about {report.estimated_rows:,} rows "
+                                    f"(limit {SQL_GUARD_MAX_COST:,}); please narrow it down.")
+        if mode == "enforce" and SQL_GUARD_MAX_WRITE_ROWS and guarded.scope_sql:
+            try:
+                matched = conn.execute(guarded.scope_sql, guarded.scope_params).fetchone()[0]
+            except sqlite3.Error:
+                matched = None  # the statement fails (and is reported) when executed
+            span.set(matched_rows=matched)
+            if matched is not None and matched > SQL_GUARD_MAX_WRITE_ROWS:
+                span.set(rejected=True)
+                raise SQLGuardError(f"The {guarded.kind.upper()} would change {matched:,} tasks "
+                                    f"(limit {SQL_GUARD_MAX_WRITE_ROWS:,}); please narrow it down.")
+        span.set(parse_ms=round(guarded.parse_ms, 3), rewrites=len(guarded.rewrites), estimated_rows=guarded.estimated_rows)
+    return guarded
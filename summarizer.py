@@ -0,0 +1,55 @@
+"""
+Result summaries for processed commands.
+
+SUMMARY_MODE selects how the "🤖 Summary" line is produced:
+- "template" (default): built locally from the summary context, no LLM call.
+- "stream": the LLM summary is streamed token by token after the result is shown.
+- "llm": the original blocking LLM summary.
+- "off": no summary.
+"""
+import logging
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+SUMMARY_MODES = ("template", "stream", "llm", "off")
+SUMMARY_MODE = os.getenv("SUMMARY_MODE", "template").strip().lower()
+if SUMMARY_MODE not in SUMMARY_MODES:
+    logger.warning(f"Unknown SUMMARY_MODE '{SUMMARY_MODE}', falling back to 'template'.")
+    SUMMARY_MODE = "template"
+
+TEMPLATE_LEADS = {
+    "added": "✅ All set!",
+    "updated": "✏️ Updated.",
+    "deleted": "🗑️ Removed.",
+    "retrieved": "📋 Here's what I found.",
+    "processed": "👍 Done.",
+}
+NO_MATCH_MESSAGE = "I couldn't find any tasks matching that. Try a different date, status or task name."
+
+
+def template_summary(action: str, summary_context: str) -> str:
+    """Builds a friendly summary from the same context string the LLM summary would receive."""
+    summary_context = (summary_context or "").strip()
+    if summary_context.startswith("No tasks found"):
+        return NO_MATCH_MESSAGE
+    if action in ("updated", "deleted") and summary_context.endswith(" 0 row(s) affected."):
+        return "Nothing changed — no task matched that description."
+    lead = TEMPLATE_LEADS.get(action, TEMPLATE_LEADS["processed"])
+    return f"{lead} {summary_context}".strip()
+
+
+def stream_with_fallback(chunks, action: str, summary_context: str):
+    """Yields streamed LLM chunks; if the stream fails before producing text, yields the template summary."""
+    produced = False
+    try:
+        for chunk in chunks:
+            if chunk:
+                produced = True
+                yield chunk
+    except Exception as e:
+        logger.error(f"Error streaming summary, using template summary instead: {e}")
+        if not produced:
+            yield template_summary(action, summary_context)
@@ -0,0 +1,451 @@
+"""
+Streaming import and export of tasks as CSV or iCalendar (VTODO / VEVENT).
+
+Files are read and written row by row and imported in batches of CHUNK_SIZE, each
+batch upserted in its own transaction through database.upsert_task_rows, so memory
+stays constant whatever the file size. Re-importing a file updates the matching
+tasks (idx_unq_user_task) instead of duplicating them; rows that did not change are
+not rewritten.
+
+    python task_io.py import backlog.csv --user-email ann@example.com --user-name Ann
+    python task_io.py import calendar.ics --user-email ann@example.com --on-conflict skip
+    python task_io.py export pending.ics --user-email ann@example.com --status pending
+    python task_io.py export - --format csv > all_tasks.csv
+
+CSV columns are those of the tasks table (task_name is the only required one;
+user_name/user_email fall back to the command-line values). When importing into an
+empty table the secondary indexes are rebuilt once at the end instead of being
+maintained row by row.
+"""
+import argparse
+import csv
+import io
+import functools
+import logging
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime, timezone
+
+import bulk_ops
+import database as db
+import intent_parser
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 50000
+EXPORT_PAGE_SIZE = 5000
+MAX_REPORTED_ERRORS = 20
+CSV_COLUMNS = ("id", "user_name", "user_email", "task_name", "status", "category", "due_date", "due_time", "created_at")
+ICS_COMPONENTS = ("VTODO", "VEVENT")
+ICS_PRODID = "-//AI Based Task Manager//task_io//EN"
+ICS_UID_DOMAIN = "ai-task-manager"
+
+# iCalendar STATUS values <-> task statuses.
+ICS_STATUS_IN = {
+    "NEEDS-ACTION": "pending", "IN-PROCESS": "pending", "TENTATIVE": "pending", "CONFIRMED": "pending",
+    "COMPLETED": "completed", "CANCELLED": "cancelled",
+}
+ICS_STATUS_OUT = {
+    "VTODO": {"pending": "NEEDS-ACTION", "completed": "COMPLETED", "cancelled": "CANCELLED"},
+    "VEVENT": {"pending": "CONFIRMED", "completed": "CONFIRMED", "cancelled": "CANCELLED"},
+}
+
+
+class ImportRowError(ValueError):
+    """A single input row that cannot be imported."""
+
+
+@dataclass
+class TransferReport:
+    rows: int = 0
+    inserted: int = 0
+    updated: int = 0
+    rejected: int = 0
+    elapsed_s: float = 0.0
+    errors: list = field(default_factory=list)
+
+    @property
+    def unchanged(self) -> int:
+        return self.rows - self.rejected - self.inserted - self.updated
+
+    def reject(self, where: str, error: Exception):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f"{where}: {error}")
+
+
+def detect_format(path: str, explicit: str = None) -> str:
+    if explicit:
+        return explicit
+    if path.lower().endswith((".ics", ".ical", ".ifb")):
+        return "ics"
+    return "csv"
+
+
+# --- Row normalisation ---
+@functools.lru_cache(maxsize=4096)  # imports repeat the same few dates and times
+def _normalize_date(value):
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value.strip()).isoformat()
+    except ValueError:
+        raise ImportRowError(f"invalid due_date {value!r}, expected YYYY-MM-DD")
+
+
+@functools.lru_cache(maxsize=4096)
+def _normalize_time(value):
+    if not value:
+        return None
+    value = value.strip()
+    if len(value) == 5 and value[2] == ":" and value[:2].isdigit() and value[3:].isdigit():
+        if int(value[:2]) < 24 and int(value[3:]) < 60:
+            return value
+    resolved = intent_parser.resolve_time(value)
+    if resolved is None:
+        raise ImportRowError(f"invalid due_time {value!r}, expected HH:MM")
+    return resolved
+
+
+def _normalize_created_at(value):
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.strip()).strftime("%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        raise ImportRowError(f"invalid created_at {value!r}")
+
+
+def normalize_row(record: dict, default_user_name: str = None, default_user_email: str = None) -> tuple:
+    """Turns a parsed CSV/ICS record into a database.UPSERT_COLUMNS tuple."""
+    task_name = " ".join((record.get("task_name") or "").split())
+    if not task_name:
+        raise ImportRowError("task_name is required")
+    if len(task_name) > bulk_ops.MAX_TASK_NAME_LENGTH:
+        raise ImportRowError(f"task_name is longer than {bulk_ops.MAX_TASK_NAME_LENGTH} characters")
+    user_email = (record.get("user_email") or default_user_email or "").strip()
+    if not user_email:
+        raise ImportRowError("user_email is missing (pass --user-email)")
+    status = (record.get("status") or "pending").strip().lower()
+    if status not in bulk_ops.STATUSES:
+        raise ImportRowError(f"invalid status {record.get('status')!r}")
+    category = (record.get("category") or "").strip() or intent_parser.infer_category(task_name)
+    return (
+        (record.get("user_name") or default_user_name or "").strip() or None,
+        user_email,
+        task_name,
+        status,
+        category,
+        _normalize_date(record.get("due_date")),
+        _normalize_time(record.get("due_time")),
+        _normalize_created_at(record.get("created_at")),
+    )
+
+
+# --- Readers (generators of (location, record) pairs) ---
+def read_csv(stream):
+    reader = csv.reader(stream)
+    header = [name.strip() for name in next(reader, [])]
+    if "task_name" not in header:
+        raise ValueError("CSV input needs a header row with at least a task_name column.")
+    for row in reader:
+        if row:
+            yield f"line {reader.line_num}", dict(zip(header, row))
+
+
+def _unfolded_lines(stream):
+    """RFC 5545 line unfolding: a line starting with a space or tab continues the previous one."""
+    pending = None
+    for raw in stream:
+        line = raw.rstrip("\r\n")
+        if line[:1] in (" ", "\t") and pending is not None:
+            pending += line[1:]
+            continue
+        if pending is not None:
+            yield pending
+        pending = line
+    if pending is not None:
+        yield pending
+
+
+def _ics_unescape(value: str) -> str:
+    out, i = [], 0
+    while i < len(value):
+        ch = value[i]
+        if ch == "\\" and i + 1 < len(value):
+            nxt = value[i + 1]
+            out.append("\n" if nxt in "nN" else nxt)
+            i += 2
+            continue
+        out.append(ch)
+        i += 1
+    return "".join(out)
+
+
+def _ics_split_list(value: str) -> list:
+    """Splits a multi-valued property (e.g. CATEGORIES) on unescaped commas; parts stay escaped."""
+    parts, start, i = [], 0, 0
+    while i < len(value):
+        if value[i] == "\\":
+            i += 2
+            continue
+        if value[i] == ",":
+            parts.append(value[start:i])
+            start = i + 1
+        i += 1
+    parts.append(value[start:])
+    return parts
+
+
+def _ics_datetime(params: str, value: str):
+    """Returns (due_date, due_time) from a DATE or DATE-TIME value; UTC times are converted to local time."""
+    value = value.strip()
+    if "VALUE=DATE" in params.upper().split(";") or len(value) == 8:
+        return datetime.strptime(value[:8], "%Y%m%d").date().isoformat(), None
+    parsed = datetime.strptime(_ics_timestamp(value), "%Y-%m-%d %H:%M:%S")
+    return parsed.date().isoformat(), parsed.strftime("%H:%M")
+
+
+def _ics_timestamp(value: str) -> str:
+    value = value.strip()
+    parsed = datetime.strptime(value.rstrip("Z")[:15], "%Y%m%dT%H%M%S")
+    if value.endswith("Z"):
+        parsed = parsed.replace(tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+    return parsed.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def read_ics(stream):
+    component, record, start_line = None, None, 0
+    for number, line in enumerate(_unfolded_lines(stream), start=1):
+        name, _, value = line.partition(":")
+        prop, _, params = name.partition(";")
+        prop = prop.upper()
+        if prop == "BEGIN" and value.upper() in ICS_COMPONENTS and component is None:
+            component, record, start_line = value.upper(), {}, number
+            continue
+        if component is None:
+            continue
+        if prop == "END" and value.upper() == component:
+            yield f"{component} at line {start_line}", record
+            component, record = None, None
+            continue
+        try:
+            if prop == "SUMMARY":
+                record["task_name"] = _ics_unescape(value)
+            elif prop == "DUE" or (prop == "DTSTART" and "due_date" not in record):
+                record["due_date"], record["due_time"] = _ics_datetime(params, value)
+            elif prop == "STATUS":
+                record["status"] = ICS_STATUS_IN.get(value.strip().upper(), "pending")
+            elif prop == "CATEGORIES" and not record.get("category"):
+                record["category"] = _ics_unescape(_ics_split_list(value)[0])
+            elif prop == "X-TASK-STATUS":
+                record["status"] = value.strip().lower()
+            elif prop == "CREATED":
+                record["created_at"] = _ics_timestamp(value)
+        except ValueError:
+            record["_error"] = f"unreadable {prop} value {value!r}"
+
+
+# --- Import ---
+def _write_batch(batch: list, on_conflict: str, db_path: str, report: TransferReport):
+    inserted, updated = db.upsert_task_rows(batch, on_conflict, db_path)
+    report.inserted += inserted
+    report.updated += updated
+
+
+def import_tasks(stream, fmt: str, user_name: str = None, user_email: str = None, on_conflict: str = "update",
+                 chunk_size: int = CHUNK_SIZE, db_path: str = None, rebuild_indexes: bool = None) -> TransferReport:
+    """Streams records from `stream` into the tasks table in batches of `chunk_size`."""
+    report = TransferReport()
+    start = time.perf_counter()
+    db.create_db_and_table(db_path)
+    if db_path is None and db.is_sharded():
+        # Rows are routed to their users' shards; the reference database holds no tasks.
+        rebuild_indexes = False
+    with db.connection(db_path) as conn:
+        if rebuild_indexes is None:
+            rebuild_indexes = conn.execute("SELECT 1 FROM tasks LIMIT 1").fetchone() is None
+        if rebuild_indexes:
+            # Maintaining every secondary index row by row is the slowest part of a large
+            # load; idx_unq_user_task stays because the upsert needs it.
+            for name in db.MANAGED_INDEXES:
+                conn.execute(f"DROP INDEX IF EXISTS {name}")
+            conn.commit()
+
+    records = read_ics(stream) if fmt == "ics" else read_csv(stream)
+    batch = []
+    try:
+        for where, record in records:
+            report.rows += 1
+            try:
+                if record.get("_error"):
+                    raise ImportRowError(record["_error"])
+                batch.append(normalize_row(record, user_name, user_email))
+            except ImportRowError as e:
+                report.reject(where, e)
+                continue
+            if len(batch) >= chunk_size:
+                _write_batch(batch, on_conflict, db_path, report)
+                batch = []
+        if batch:
+            _write_batch(batch, on_conflict, db_path, report)
+    finally:
+        if rebuild_indexes:
+            with db.connection(db_path) as conn:
+                db.sync_managed_indexes(conn)
+    report.elapsed_s = time.perf_counter() - start
+    return report
+
+
+# --- Export ---
+def iter_tasks(user_email: str = None, status: str = None, page_size: int = EXPORT_PAGE_SIZE):
+    """
+    Yields task rows (CSV_COLUMNS order) one page at a time via keyset pagination on id,
+    shard by shard when the database is sharded and no user is given.
+    """
+    where, params = [], []
+    if user_email:
+        where.append("user_email = ?")
+        params.append(user_email)
+    if status:
+        where.append("status = ?")
+        params.append(status)
+    query = f"SELECT {', '.join(CSV_COLUMNS)} FROM tasks"
+    if where:
+        query += " WHERE " + " AND ".join(where)
+    query += " ORDER BY id"
+    if user_email:
+        for rows, _columns in db.iter_select_pages(query, tuple(params), page_size, user_email=user_email):
+            yield from rows
+        return
+    for db_path in db.shard_paths():
+        db.create_db_and_table(db_path)
+        for rows, _columns in db.iter_select_pages(query, tuple(params), page_size, db_path=db_path):
+            yield from rows
+
+
+def write_csv(rows, stream) -> int:
+    writer = csv.writer(stream, lineterminator="\n")
+    writer.writerow(CSV_COLUMNS)
+    count = 0
+    for row in rows:
+        writer.writerow(["" if value is None else value for value in row])
+        count += 1
+    return count
+
+
+def _ics_escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+
+
+def _ics_fold(line: str) -> str:
+    """Folds a content line at 75 octets (RFC 5545 section 3.1)."""
+    encoded = line.encode("utf-8")
+    if len(encoded) <= 75:
+        return line + "\r\n"
+    parts, current, size = [], "", 0
+    for ch in line:
+        width = len(ch.encode("utf-8"))
+        if size + width > (75 if not parts else 74):
+            parts.append(current)
+            current, size = "", 0
+        current += ch
+        size += width
+    parts.append(current)
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def _ics_when(due_date: str, due_time: str) -> str:
+    if not due_time:
+        return f";VALUE=DATE:{due_date.replace('-', '')}"
+    return f":{due_date.replace('-', '')}T{due_time.replace(':', '')}00"
+
+
+def write_ics(rows, stream, component: str = "VTODO") -> int:
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    stream.write(f"BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:{ICS_PRODID}\r\nCALSCALE:GREGORIAN\r\n")
+    count = 0
+    for task_id, _user_name, _user_email, task_name, status, category, due_date, due_time, created_at in rows:
+        lines = [
+            f"BEGIN:{component}",
+            f"UID:task-{task_id}@{ICS_UID_DOMAIN}",
+            f"DTSTAMP:{stamp}",
+            f"SUMMARY:{_ics_escape(task_name or '')}",
+        ]
+        if due_date:
+            lines.append(("DUE" if component == "VTODO" else "DTSTART") + _ics_when(due_date, due_time))
+        lines.append(f"STATUS:{ICS_STATUS_OUT[component].get(status, ICS_STATUS_OUT[component]['pending'])}")
+        if component == "VEVENT" and status == "completed":
+            # VEVENT has no completed status; keep it so a round trip does not reopen the task.
+            lines.append("X-TASK-STATUS:completed")
+        if category:
+            lines.append(f"CATEGORIES:{_ics_escape(category)}")
+        if created_at:
+            lines.append(f"CREATED:{created_at.replace('-', '').replace(':', '').replace(' ', 'T')}")
+        lines.append(f"END:{component}")
+        stream.write("".join(_ics_fold(line) for line in lines))
+        count += 1
+    stream.write("END:VCALENDAR\r\n")
+    return count
+
+
+def export_tasks(stream, fmt: str, user_email: str = None, status: str = None, component: str = "VTODO") -> TransferReport:
+    start = time.perf_counter()
+    rows = iter_tasks(user_email, status)
+    count = write_ics(rows, stream, component) if fmt == "ics" else write_csv(rows, stream)
+    return TransferReport(rows=count, elapsed_s=time.perf_counter() - start)
+
+
+# --- CLI ---
+def _open(path: str, mode: str):
+    if path == "-":
+        return io.TextIOWrapper((sys.stdin if "r" in mode else sys.stdout).buffer, encoding="utf-8", newline="")
+    return open(path, mode, encoding="utf-8-sig" if "r" in mode else "utf-8", newline="")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=None, help=f"database file (default: {db.DB_FILENAME})")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    imp = commands.add_parser("import", help="import tasks from a CSV or .ics file ('-' for stdin)")
+    imp.add_argument("path")
+    imp.add_argument("--format", choices=("csv", "ics"), default=None, help="default: from the file extension")
+    imp.add_argument("--user-email", default=None, help="owner for rows without a user_email column")
+    imp.add_argument("--user-name", default=None)
+    imp.add_argument("--on-conflict", choices=tuple(db.UPSERT_ACTIONS), default="update")
+    imp.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    imp.add_argument("--rebuild-indexes", action="store_true", default=None,
+                     help="drop and rebuild secondary indexes around the load (default: only into an empty table)")
+
+    exp = commands.add_parser("export", help="export tasks to a CSV or .ics file ('-' for stdout)")
+    exp.add_argument("path")
+    exp.add_argument("--format", choices=("csv", "ics"), default=None, help="default: from the file extension")
+    exp.add_argument("--user-email", default=None, help="only this user's tasks (default: all users)")
+    exp.add_argument("--status", choices=bulk_ops.STATUSES, default=None)
+    exp.add_argument("--component", choices=ICS_COMPONENTS, default="VTODO", help="iCalendar component to write")
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+    if args.db:
+        db.DB_FILENAME = args.db
+    fmt = detect_format(args.path, args.format)
+    if args.command == "import":
+        with _open(args.path, "r") as stream:
+            report = import_tasks(stream, fmt, args.user_name, args.user_email, args.on_conflict,
+                                  args.chunk_size, rebuild_indexes=args.rebuild_indexes)
+        for error in report.errors:
+            logger.warning(f"rejected {error}")
+        print(f"{report.rows:,} rows in {report.elapsed_s:.2f}s: {report.inserted:,} inserted, "
+              f"{report.updated:,} updated, {report.unchanged:,} unchanged, {report.rejected:,} rejected",
+              file=sys.stderr)
+        return 1 if report.rejected and not (report.inserted or report.updated) else 0
+    with _open(args.path, "w") as stream:
+        report = export_tasks(stream, fmt, args.user_email, args.status, args.component)
+    print(f"{report.rows:,} tasks exported in {report.elapsed_s:.2f}s", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,251 @@
+"""
+Per-user in-memory task store.
+
+Every rerun that shows the task context or lists tasks used to go back to SQLite,
+including the `get_task_by_id` right after each INSERT, although an active user
+only has a handful of tasks. TaskStore keeps the complete task list of recently
+active users in memory:
+
+- A user's tasks are loaded with one query on first use, unless they own more than
+  `max_user_tasks` (such users are remembered as uncacheable and read from disk).
+- Writes made through database.execute_dml_query are applied write-through from
+  the statement's RETURNING rows; writes the store cannot follow invalidate the
+  user's entry (or every entry when the user is unknown).
+- Entries are evicted least recently used first once more than `max_rows` tasks
+  are held, and reloaded after `ttl_seconds` to pick up writes made by other
+  processes (e.g. task_io imports).
+
+Lookups by id and the common listings (status, due date range, overdue) are then
+answered from memory in the same order as database.DEFAULT_ORDER_BY.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+TASK_FIELDS = ("id", "task_name", "status", "category", "due_date", "due_time", "created_at")
+# Columns requested with RETURNING on writes: the owner, then TASK_FIELDS.
+RETURNING_FIELDS = ("user_email",) + TASK_FIELDS
+_ID, _STATUS, _DUE_DATE, _DUE_TIME, _CREATED_AT = (TASK_FIELDS.index(f) for f in
+                                                   ("id", "status", "due_date", "due_time", "created_at"))
+
+
+def _sort_value(value):
+    """Orders values like SQLite: NULL, then numbers, then text, then blobs."""
+    if value is None:
+        return (0, 0)
+    if isinstance(value, (int, float)):
+        return (1, value)
+    if isinstance(value, str):
+        return (2, value)
+    return (3, bytes(value))
+
+
+def default_order(rows) -> list:
+    """Sorts task tuples by database.DEFAULT_ORDER_BY, then id (the pagination tie-breaker)."""
+    ordered = sorted(rows, key=lambda r: r[_ID])
+    # created_at DESC: NULLs sort first ascending, so last descending.
+    ordered.sort(key=lambda r: _sort_value(r[_CREATED_AT]), reverse=True)
+    ordered.sort(key=lambda r: (r[_DUE_DATE] is None, _sort_value(r[_DUE_DATE]),
+                                r[_DUE_TIME] is None, _sort_value(r[_DUE_TIME])))
+    return ordered
+
+
+def matches(row, filters: dict) -> bool:
+    """
+    True if a task tuple passes a listing filter. Keys (all optional): status,
+    due_from / due_to (inclusive dates), due_before (exclusive date). Any date key
+    excludes tasks without a due date, as database.DATED_FILTER does.
+    """
+    status = filters.get("status")
+    if status is not None and row[_STATUS] != status:
+        return False
+    due_from, due_to, due_before = filters.get("due_from"), filters.get("due_to"), filters.get("due_before")
+    if due_from is None and due_to is None and due_before is None:
+        return True
+    due_date = row[_DUE_DATE]
+    if not isinstance(due_date, str):
+        return False
+    return ((due_from is None or due_date >= due_from)
+            and (due_to is None or due_date <= due_to)
+            and (due_before is None or due_date < due_before))
+
+
+class _UserTasks:
+    __slots__ = ("tasks", "loaded_at", "ordered")
+
+    def __init__(self, tasks):
+        self.tasks = tasks          # id -> TASK_FIELDS tuple, or None when the user owns too many
+        self.loaded_at = time.monotonic()
+        self.ordered = None         # DEFAULT_ORDER_BY order, rebuilt lazily after writes
+
+    @property
+    def size(self) -> int:
+        # An uncacheable marker counts as one row so markers are evicted like entries.
+        return len(self.tasks) if self.tasks is not None else 1
+
+
+class TaskStore:
+    """
+    LRU store of complete per-user task lists. `loader(db_path, user_email, limit)`
+    returns up to `limit` TASK_FIELDS tuples for the user; the store asks for one
+    more than `max_user_tasks` to tell whether the user fits.
+    """
+
+    def __init__(self, loader, max_rows: int = 20000, max_user_tasks: int = 1000, ttl_seconds: float = 300):
+        self.loader = loader
+        self.max_rows = max_rows
+        self.max_user_tasks = max_user_tasks
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()   # (db_path, user_email) -> _UserTasks
+        self._loads = {}                # key -> token of the load allowed to install its result
+        self._rows = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.uncacheable = 0
+        self.write_throughs = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    # --- Entries ---
+    def _entry(self, db_path: str, user_email: str):
+        """Returns the user's entry, loading it on a miss; None if the user cannot be cached."""
+        key = (db_path, user_email)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl_seconds and time.monotonic() - entry.loaded_at > self.ttl_seconds:
+                self._drop(key)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                if entry.tasks is None:
+                    self.uncacheable += 1
+                    return None
+                self.hits += 1
+                return entry
+            self.misses += 1
+            token = self._loads[key] = object()
+        rows = self.loader(db_path, user_email, self.max_user_tasks + 1)
+        entry = _UserTasks({row[_ID]: tuple(row) for row in rows} if len(rows) <= self.max_user_tasks else None)
+        with self._lock:
+            # A write or invalidation for this user while the query ran withdraws the
+            # token: the rows may predate it, so they are used once but not kept.
+            if self._loads.get(key) is token:
+                del self._loads[key]
+                self._install(key, entry)
+        return entry if entry.tasks is not None else None
+
+    def _install(self, key, entry: _UserTasks):
+        self._drop(key)
+        self._entries[key] = entry
+        self._rows += entry.size
+        while self._rows > self.max_rows and len(self._entries) > 1:
+            evicted_key = next(iter(self._entries))
+            self._drop(evicted_key)
+            self.evictions += 1
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._rows -= entry.size
+
+    # --- Reads ---
+    def get_task(self, user_email: str, task_id, db_path: str):
+        """Returns (answered, task dict or None). answered is False when the user is not cacheable."""
+        entry = self._entry(db_path, user_email)
+        if entry is None:
+            return False, None
+        row = entry.tasks.get(task_id)
+        return True, dict(zip(TASK_FIELDS, row)) if row is not None else None
+
+    def list_tasks(self, user_email: str, filters: dict, db_path: str):
+        """The user's tasks matching `filters` in DEFAULT_ORDER_BY order, or None if not cacheable."""
+        entry = self._entry(db_path, user_email)
+        if entry is None:
+            return None
+        with self._lock:
+            ordered = entry.ordered
+            if ordered is None:
+                ordered = entry.ordered = default_order(entry.tasks.values())
+        return [row for row in ordered if matches(row, filters)]
+
+    # --- Writes ---
+    def apply_returning(self, kind: str, rows, db_path: str):
+        """
+        Applies the RETURNING rows (RETURNING_FIELDS order) of a committed write.
+        kind is "insert" (including upserts, whose conflict key contains the user),
+        "update" or "delete".
+        """
+        with self._lock:
+            for row in rows:
+                user_email, task = row[0], tuple(row[1:])
+                key = (db_path, user_email)
+                self._loads.pop(key, None)
+                entry = self._entries.get(key)
+                cached = entry is not None and entry.tasks is not None
+                if kind == "update" and not (cached and task[_ID] in entry.tasks):
+                    # An UPDATE of user_email moves the task between users. The previous
+                    # owner is unknown, so a load of theirs in flight may hold the old row.
+                    self._forget_task(db_path, task[_ID])
+                    for load_key in [k for k in self._loads if k[0] == db_path]:
+                        del self._loads[load_key]
+                if kind == "delete":
+                    if cached and entry.tasks.pop(task[_ID], None) is not None:
+                        entry.ordered = None
+                        self._rows -= 1
+                    continue
+                if not cached:
+                    continue
+                if task[_ID] not in entry.tasks:
+                    if len(entry.tasks) >= self.max_user_tasks:
+                        self._drop(key)
+                        self.invalidations += 1
+                        continue
+                    self._rows += 1
+                entry.tasks[task[_ID]] = task
+                entry.ordered = None
+                self.write_throughs += 1
+            while self._rows > self.max_rows and len(self._entries) > 1:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _forget_task(self, db_path: str, task_id):
+        for (path, _user_email), entry in self._entries.items():
+            if path == db_path and entry.tasks is not None and entry.tasks.pop(task_id, None) is not None:
+                entry.ordered = None
+                self._rows -= 1
+
+    def invalidate(self, user_email: str = None, db_path: str = None):
+        """Drops one user's entry, or every entry when user_email is None."""
+        with self._lock:
+            self.invalidations += 1
+            if user_email is None:
+                self._clear_locked()
+                return
+            key = (db_path, user_email)
+            self._loads.pop(key, None)
+            self._drop(key)
+
+    def _clear_locked(self):
+        self._entries.clear()
+        self._loads.clear()
+        self._rows = 0
+
+    def clear(self):
+        with self._lock:
+            self._clear_locked()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses + self.uncacheable
+            return {
+                "users": len(self._entries),
+                "rows": self._rows,
+                "hits": self.hits,
+                "misses": self.misses,
+                "uncacheable": self.uncacheable,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "write_throughs": self.write_throughs,
+                "invalidations": self.invalidations,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,382 @@
+"""
+Lightweight tracing and metrics for the command pipeline.
+
+Each stage wraps its work in `telemetry.span(name, **attrs)`; nested spans share the
+trace of the outermost one (one trace per processed command). Finished spans feed
+an in-process metrics registry (duration histograms, token / row / cache-hit
+counters) which can be exported as:
+
+- Prometheus text on http://127.0.0.1:METRICS_PORT/metrics
+- one JSON object per span appended to METRICS_JSONL_PATH
+
+A sampling profiler can be switched on at runtime (`profiler.enable()`, the
+PROFILE_SLOW_MS environment variable, or POST /profiler?enabled=1&slow_ms=500 on
+the metrics port). It samples the stacks of threads that are inside a trace and,
+when the trace is slower than the threshold, writes collapsed stacks
+(flamegraph.pl / speedscope format) to PROFILE_DIR.
+"""
+import contextvars
+import itertools
+import json
+import logging
+import math
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+TELEMETRY_ENABLED = os.getenv("TELEMETRY_ENABLED", "true").lower() not in ("0", "false", "no")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))          # 0 disables the HTTP endpoint
+METRICS_JSONL_PATH = os.getenv("METRICS_JSONL_PATH", "")     # empty disables the JSONL export
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "0"))   # >0 enables the profiler at start-up
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+
+DURATION_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+# Numeric span attributes that are summed into counters.
+COUNTED_ATTRS = ("prompt_tokens", "prefix_tokens", "completion_tokens", "rows")
+
+_current_span = contextvars.ContextVar("telemetry_span", default=None)
+_ids = itertools.count(1)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token); the Gemini client does not return usage."""
+    return max(1, len(text or "") // 4)
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "attrs", "start", "start_wall", "duration_ms", "error")
+
+    def __init__(self, name: str, parent, attrs: dict):
+        self.name = name
+        self.span_id = next(_ids)
+        self.trace_id = parent.trace_id if parent else self.span_id
+        self.parent_id = parent.span_id if parent else None
+        self.attrs = attrs
+        self.start = time.perf_counter()
+        self.start_wall = time.time()
+        self.duration_ms = None
+        self.error = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def to_dict(self) -> dict:
+        return {
+            "ts": round(self.start_wall, 6),
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "duration_ms": round(self.duration_ms, 3),
+            "error": self.error,
+            "attrs": self.attrs,
+        }
+
+
+class _NoopSpan:
+    def set(self, **attrs):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+# --- Metrics ---
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}   # span name -> [bucket counts..., +Inf count, sum_ms]
+        self._errors = Counter()
+        self._counters = Counter()  # (attr, span name) -> total
+        self._cache = Counter()     # (span name, "hit"/"miss") -> count
+
+    def observe(self, span: Span):
+        with self._lock:
+            hist = self._histograms.get(span.name)
+            if hist is None:
+                hist = self._histograms[span.name] = [0] * (len(DURATION_BUCKETS_MS) + 1) + [0.0]
+            for i, bound in enumerate(DURATION_BUCKETS_MS):
+                if span.duration_ms <= bound:
+                    hist[i] += 1
+            hist[len(DURATION_BUCKETS_MS)] += 1
+            hist[-1] += span.duration_ms
+            if span.error:
+                self._errors[(span.name, span.error)] += 1
+            for attr in COUNTED_ATTRS:
+                value = span.attrs.get(attr)
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    self._counters[(attr, span.name)] += value
+            cache_hit = span.attrs.get("cache_hit")
+            if isinstance(cache_hit, bool):
+                self._cache[(span.name, "hit" if cache_hit else "miss")] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            stages = {}
+            for name, hist in self._histograms.items():
+                count = hist[len(DURATION_BUCKETS_MS)]
+                stages[name] = {"count": count, "mean_ms": hist[-1] / count if count else 0.0}
+            return {
+                "stages": stages,
+                "errors": {f"{n}:{e}": c for (n, e), c in self._errors.items()},
+                "counters": {f"{a}:{n}": v for (a, n), v in self._counters.items()},
+                "cache": {f"{n}:{r}": c for (n, r), c in self._cache.items()},
+            }
+
+    def render_prometheus(self) -> str:
+        lines = [
+            "# HELP task_manager_stage_duration_seconds Duration of pipeline stages.",
+            "# TYPE task_manager_stage_duration_seconds histogram",
+        ]
+        with self._lock:
+            for name, hist in sorted(self._histograms.items()):
+                for i, bound in enumerate(DURATION_BUCKETS_MS):
+                    lines.append(f'task_manager_stage_duration_seconds_bucket{{stage="{name}",le="{bound / 1000:g}"}} {hist[i]}')
+                count = hist[len(DURATION_BUCKETS_MS)]
+                lines.append(f'task_manager_stage_duration_seconds_bucket{{stage="{name}",le="+Inf"}} {count}')
+                lines.append(f'task_manager_stage_duration_seconds_sum{{stage="{name}"}} {hist[-1] / 1000:.6f}')
+                lines.append(f'task_manager_stage_duration_seconds_count{{stage="{name}"}} {count}')
+            lines.append("# HELP task_manager_stage_errors_total Stages that raised, by exception type.")
+            lines.append("# TYPE task_manager_stage_errors_total counter")
+            for (name, error), count in sorted(self._errors.items()):
+                lines.append(f'task_manager_stage_errors_total{{stage="{name}",error="{error}"}} {count}')
+            for attr in COUNTED_ATTRS:
+                metric = f"task_manager_{attr}_total"
+                lines.append(f"# TYPE {metric} counter")
+                for (a, name), value in sorted(self._counters.items()):
+                    if a == attr:
+                        # Exact: `:g` keeps 6 significant digits, which freezes counters past 1e6.
+                        sample = str(value) if isinstance(value, int) else repr(float(value))
+                        lines.append(f'{metric}{{stage="{name}"}} {sample}')
+            lines.append("# HELP task_manager_cache_lookups_total Cache lookups by stage and result.")
+            lines.append("# TYPE task_manager_cache_lookups_total counter")
+            for (name, result), count in sorted(self._cache.items()):
+                lines.append(f'task_manager_cache_lookups_total{{stage="{name}",result="{result}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._errors.clear()
+            self._counters.clear()
+            self._cache.clear()
+
+
+metrics = MetricsRegistry()
+
+
+# --- JSONL export ---
+class JsonlExporter:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a", buffering=1, encoding="utf-8")
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+
+
+_jsonl_exporter = None
+
+
+# --- Sampling profiler ---
+class SamplingProfiler:
+    """Samples the stacks of threads inside a trace; keeps the samples of slow traces only."""
+
+    def __init__(self, interval_ms: float = PROFILE_INTERVAL_MS, slow_ms: float = 1000.0, out_dir: str = PROFILE_DIR):
+        self.interval_ms = interval_ms
+        self.slow_ms = slow_ms
+        self.out_dir = out_dir
+        self.enabled = False
+        self.profiles_written = 0
+        self._active = {}  # thread id -> (root span, Counter of collapsed stacks)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def enable(self, slow_ms: float = None, interval_ms: float = None):
+        with self._lock:
+            if slow_ms is not None:
+                self.slow_ms = slow_ms
+            if interval_ms is not None:
+                self.interval_ms = interval_ms
+            self.enabled = True
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="telemetry-profiler", daemon=True)
+                self._thread.start()
+
+    def disable(self):
+        with self._lock:
+            self.enabled = False
+            self._active.clear()
+
+    def status(self) -> dict:
+        return {"enabled": self.enabled, "slow_ms": self.slow_ms, "interval_ms": self.interval_ms,
+                "out_dir": self.out_dir, "profiles_written": self.profiles_written}
+
+    def begin(self, root: Span):
+        if self.enabled:
+            with self._lock:
+                self._active[threading.get_ident()] = (root, Counter())
+
+    def end(self, root: Span):
+        if not self._active:
+            return
+        with self._lock:
+            entry = self._active.pop(threading.get_ident(), None)
+        if entry is None or root.duration_ms < self.slow_ms or not entry[1]:
+            return
+        os.makedirs(self.out_dir, exist_ok=True)
+        path = os.path.join(self.out_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{root.name}-{root.trace_id}.folded")
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in entry[1].most_common():
+                f.write(f"{stack} {count}\n")
+        self.profiles_written += 1
+        logger.warning("Slow trace %s (%s) took %.0f ms; profile written to %s",
+                       root.trace_id, root.name, root.duration_ms, path)
+
+    @staticmethod
+    def _collapse(frame) -> str:
+        parts = []
+        while frame is not None:
+            code = frame.f_code
+            parts.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+            frame = frame.f_back
+        return ";".join(reversed(parts))
+
+    def _run(self):
+        while self.enabled:
+            if self._active:
+                frames = sys._current_frames()
+                with self._lock:
+                    for thread_id, (_root, counter) in self._active.items():
+                        frame = frames.get(thread_id)
+                        if frame is not None:
+                            counter[self._collapse(frame)] += 1
+            time.sleep(self.interval_ms / 1000)
+
+
+profiler = SamplingProfiler()
+
+
+# --- Spans ---
+def _finish(span: Span):
+    metrics.observe(span)
+    if _jsonl_exporter is not None:
+        try:
+            _jsonl_exporter.export(span)
+        except OSError as e:
+            logger.error("Could not write span to %s: %s", METRICS_JSONL_PATH, e)
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Times the enclosed block as a span; use `.set(...)` on the yielded span to add attributes."""
+    if not TELEMETRY_ENABLED:
+        yield _NOOP_SPAN
+        return
+    parent = _current_span.get()
+    current = Span(name, parent, attrs)
+    token = _current_span.set(current)
+    if parent is None:
+        profiler.begin(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = type(e).__name__
+        raise
+    finally:
+        current.duration_ms = (time.perf_counter() - current.start) * 1000
+        _current_span.reset(token)
+        if parent is None:
+            profiler.end(current)
+        _finish(current)
+
+
+def record(name: str, duration_ms: float, error: str = None, **attrs):
+    """Records an already-timed span (e.g. one spanning a generator) under the current trace."""
+    if not TELEMETRY_ENABLED:
+        return
+    recorded = Span(name, _current_span.get(), attrs)
+    recorded.duration_ms = duration_ms
+    recorded.error = error
+    _finish(recorded)
+
+
+# --- HTTP endpoint ---
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def _reply(self, status: int, body: str, content_type: str = "text/plain; version=0.0.4"):
+        payload = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == "/metrics":
+            self._reply(200, metrics.render_prometheus())
+        elif path == "/profiler":
+            self._reply(200, json.dumps(profiler.status()), "application/json")
+        else:
+            self._reply(404, "not found\n")
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/profiler":
+            self._reply(404, "not found\n")
+            return
+        query = parse_qs(url.query)
+        enabled = query.get("enabled", ["1"])[0].lower() in ("1", "true", "yes", "on")
+        slow_ms = None
+        if "slow_ms" in query:
+            try:
+                slow_ms = float(query["slow_ms"][0])
+            except ValueError:
+                slow_ms = -1.0
+            if not math.isfinite(slow_ms) or slow_ms < 0:
+                self._reply(400, "slow_ms must be a non-negative number of milliseconds\n")
+                return
+        if enabled:
+            profiler.enable(slow_ms=slow_ms)
+        else:
+            profiler.disable()
+        self._reply(200, json.dumps(profiler.status()), "application/json")
+
+    def log_message(self, format, *args):
+        pass
+
+
+_exporters_lock = threading.Lock()
+_metrics_server = None
+
+
+def start_exporters(port: int = None, jsonl_path: str = None):
+    """Starts the configured exporters once per process; later calls are no-ops."""
+    global _jsonl_exporter, _metrics_server
+    port = METRICS_PORT if port is None else port
+    jsonl_path = METRICS_JSONL_PATH if jsonl_path is None else jsonl_path
+    with _exporters_lock:
+        if jsonl_path and _jsonl_exporter is None:
+            _jsonl_exporter = JsonlExporter(jsonl_path)
+        if port and _metrics_server is None:
+            try:
+                _metrics_server = ThreadingHTTPServer(("127.0.0.1", port), _MetricsHandler)
+            except OSError as e:
+                logger.error("Could not start metrics endpoint on port %s: %s", port, e)
+            else:
+                threading.Thread(target=_metrics_server.serve_forever, name="telemetry-http", daemon=True).start()
+        if PROFILE_SLOW_MS > 0 and not profiler.enabled:
+            profiler.enable(slow_ms=PROFILE_SLOW_MS)
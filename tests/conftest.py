@@ -0,0 +1,19 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database as db  # noqa: E402
+
+
+@pytest.fixture
+def tasks_db(tmp_path, monkeypatch):
+    """A fresh tasks database in a temporary directory, unsharded and without the task store."""
+    monkeypatch.setattr(db, "DB_FILENAME", str(tmp_path / "tasks.db"))
+    monkeypatch.setattr(db, "DB_SHARDS", "1")
+    monkeypatch.setattr(db, "task_store", None)
+    db.create_db_and_table()
+    yield db.DB_FILENAME
+    db.close_connections()
@@ -0,0 +1,110 @@
+import pytest
+
+import bulk_ops
+import database as db
+
+ME = "me@example.com"
+
+
+def _tasks():
+    rows, _columns = db.execute_select_query(
+        "SELECT task_name, status, due_date, due_time FROM tasks WHERE user_email = ? ORDER BY id", (ME,), ME)
+    return rows
+
+
+def _apply(raw_operations):
+    valid, rejected = bulk_ops.validate_operations(raw_operations)
+    return db.apply_task_operations("Me", ME, valid), rejected
+
+
+@pytest.mark.parametrize("text, segments", [
+    ("add dentist Monday 3pm, gym Tuesday 7am, and report due Friday",
+     ["add dentist Monday 3pm", "gym Tuesday 7am", "report due Friday"]),
+    ("add 'salt, pepper and oil' tomorrow; call mom and then email bob",
+     ["add 'salt, pepper and oil' tomorrow", "call mom", "email bob"]),
+    ("add a\n\n  add b  \nadd c and d", ["add a", "add b", "add c", "d"]),
+    ("", []),
+])
+def test_split_segments(text, segments):
+    assert bulk_ops.split_segments(text) == segments
+
+
+@pytest.mark.parametrize("text", [
+    "add dentist Monday 3pm, gym Tuesday 7am, and report due Friday",
+    "I have dentist monday at 3pm, gym tuesday at 7am",
+    "mark gym done tomorrow, delete dentist friday",
+    "add groceries\nadd laundry",
+    "bulk: anything at all",
+])
+def test_commands_for_several_tasks_are_bulk(text):
+    assert bulk_ops.looks_like_bulk(text)
+
+
+@pytest.mark.parametrize("text", [
+    "what do I have tomorrow, and what's due friday",
+    "show tasks for today and tomorrow",
+    "what is due today\nwhat is due tomorrow",
+    "add gym monday 7am, and show tasks friday",
+    "add gym monday 7am, anything friday?",
+    "add dentist monday at 3pm",
+])
+def test_questions_and_single_commands_are_not_bulk(text):
+    assert not bulk_ops.looks_like_bulk(text)
+
+
+@pytest.mark.parametrize("response, expected", [
+    ('[{"op": "add", "task_name": "gym"}]', [{"op": "add", "task_name": "gym"}]),
+    ('```json\n[{"op": "delete", "id": 3}]\n```', [{"op": "delete", "id": 3}]),
+    ('Here you go: [] Done.', []),
+])
+def test_parse_operations(response, expected):
+    assert bulk_ops.parse_operations(response) == expected
+
+
+@pytest.mark.parametrize("response", ["", "no list here", '{"op": "add"}', "[{'op': 'add'}]"])
+def test_parse_operations_rejects_non_lists(response):
+    with pytest.raises(ValueError):
+        bulk_ops.parse_operations(response)
+
+
+def test_invalid_items_are_reported_and_valid_ones_applied(tasks_db):
+    results, rejected = _apply([
+        {"op": "add", "task_name": "gym", "due_date": "2026-10-19", "due_time": "7am"},
+        {"op": "add", "task_name": ""},
+        {"op": "update", "match": "gym", "set": {"owner": "x"}},
+        {"op": "add", "task_name": "gym", "due_date": "2026-10-19", "due_time": "07:00"},
+    ])
+    assert [(r["index"], r["result"]) for r in results] == [(0, "added"), (3, "skipped")]
+    assert [r["index"] for r in rejected] == [1, 2]
+    assert _tasks() == [("gym", "pending", "2026-10-19", "07:00")]
+
+
+def test_match_is_literal(tasks_db):
+    _apply([{"op": "add", "task_name": "pay 100% of rent"}, {"op": "add", "task_name": "pay 1000 to bob"},
+            {"op": "add", "task_name": "read a_b"}])
+    results, _rejected = _apply([
+        {"op": "update", "match": "100%", "set": {"status": "completed"}},
+        {"op": "delete", "match": "a_b"},
+        {"op": "delete", "match": "x_y"},
+        {"op": "delete", "match": "%"},
+    ])
+    assert [r["result"] for r in results] == ["updated", "deleted", "not_found", "deleted"]
+    assert _tasks() == [("pay 1000 to bob", "pending", None, None)]
+
+
+def test_a_conflict_rolls_back_the_whole_batch(tasks_db):
+    _apply([{"op": "add", "task_name": "gym", "due_date": "2026-10-19"},
+            {"op": "add", "task_name": "swim", "due_date": "2026-10-19"}])
+    before = _tasks()
+    valid, _rejected = bulk_ops.validate_operations([
+        {"op": "add", "task_name": "run", "due_date": "2026-10-20"},
+        {"op": "delete", "match": "gym"},
+        {"op": "update", "match": "swim", "set": {"task_name": "gym"}},
+    ])
+    # The delete of "gym" runs after the update, so the rename collides.
+    with pytest.raises(ValueError, match="nothing was applied"):
+        db.apply_task_operations("Me", ME, valid)
+    assert _tasks() == before
+    # The write lock was released: the next batch goes through.
+    results, _rejected = _apply([{"op": "add", "task_name": "run", "due_date": "2026-10-20"}])
+    assert results[0]["result"] == "added"
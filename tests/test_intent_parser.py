@@ -0,0 +1,104 @@
+from datetime import date
+
+import pytest
+
+import database as db
+import intent_parser
+from intent_parser import MIN_CONFIDENCE, PERIOD_ONLY_CONFIDENCE, STATUS_ONLY_CONFIDENCE
+
+ME = "me@example.com"
+TODAY = date(2026, 10, 18)  # a Sunday
+CONTEXT = {"id": 7, "task_name": "gym"}
+
+
+def parse(text, last_task_details=CONTEXT, **kwargs):
+    return intent_parser.parse_command(text, "Me", ME, last_task_details, today=TODAY, record_stats=False, **kwargs)
+
+
+@pytest.mark.parametrize("text, rule, params", [
+    ("show pending tasks", "list", (ME, "pending")),
+    ("What's pending?", "list", (ME, "pending")),
+    ("what do I have tomorrow", "list", (ME, "2026-10-19")),
+    ("show my tasks for this week", "list", (ME, "2026-10-18")),  # the week ends today
+    ("list completed tasks next week", "list", (ME, "completed", "2026-10-19", "2026-10-25")),
+    ("show tasks", "list", (ME,)),
+    ("show overdue tasks", "list_overdue", (ME, "pending", "2026-10-18")),
+    ("mark it as done", "mark_status", ("completed", 7, ME)),
+    ("set 'gym' to cancelled", "mark_status", ("cancelled", ME, "%gym%", ME)),
+    ("I finished the task 'report'", "done_with", ("completed", ME, "%report%", ME)),
+    ("that task is now pending", "it_is_status", ("pending", 7, ME)),
+    ("delete it", "delete", (7, ME)),
+    ("please remove task 'call mom'", "delete", (ME, "%call mom%", ME)),
+    ("add task 'dentist' tomorrow at 3pm category health",
+     "add", ("Me", ME, "dentist", "pending", "Health", "2026-10-19", "15:00")),
+    ("remind me to 'water plants' at noon", "add", ("Me", ME, "water plants", "pending", "General", "2026-10-18", "12:00")),
+    ("schedule 'standup' next monday", "add", ("Me", ME, "standup", "pending", "Meeting", "2026-10-19", None)),
+])
+def test_fast_path_commands(text, rule, params):
+    intent = parse(text)
+    assert intent is not None and intent.rule == rule
+    assert intent.confidence >= MIN_CONFIDENCE
+    assert intent.params == params
+
+
+@pytest.mark.parametrize("text", [
+    "tomorrow",                                   # PERIOD_ONLY_CONFIDENCE
+    "friday",
+    "done",                                       # STATUS_ONLY_CONFIDENCE: probably "mark it done"
+    "pending",
+    "mark it as done",                            # with no task in context (see below)
+    "add task 'gym' sometime soon",               # leftover words
+    "add task 'gym' on 2026-02-30",               # invalid date
+    "add 'gym' at 25:00",
+    "Can you find anything about the dentist from last month?",
+    "what do I have tomorrow, and what's due friday",
+    "",
+])
+def test_unsure_commands_go_to_the_llm(text):
+    last_task_details = None if text == "mark it as done" else CONTEXT
+    assert parse(text, last_task_details) is None
+
+
+def test_thresholds_rank_bare_periods_above_bare_statuses():
+    assert STATUS_ONLY_CONFIDENCE < PERIOD_ONLY_CONFIDENCE < MIN_CONFIDENCE
+    period_only = parse("tomorrow", min_confidence=PERIOD_ONLY_CONFIDENCE)
+    assert period_only.confidence == PERIOD_ONLY_CONFIDENCE
+    assert period_only.filters == {"status": None, "due_from": "2026-10-19", "due_to": "2026-10-19"}
+    assert parse("done", min_confidence=PERIOD_ONLY_CONFIDENCE) is None
+    status_only = parse("done", min_confidence=STATUS_ONLY_CONFIDENCE)
+    assert status_only.confidence == STATUS_ONLY_CONFIDENCE
+    assert status_only.filters == {"status": "completed"}
+
+
+def test_fast_path_stats_count_hits_and_misses():
+    stats = intent_parser.FastPathStats()
+    stats.record(parse("show pending tasks"))
+    stats.record(parse("done"))
+    assert stats.snapshot() == {"hits": 1, "misses": 1, "hit_rate": 0.5, "rule_hits": {"list": 1}}
+
+
+def test_quoted_names_match_literally(tasks_db):
+    for name in ("pay 100% of rent", "pay 1000 to bob", "read a_b"):
+        intent = parse(f"add task '{name}'")
+        db.execute_dml_query(intent.sql, intent.params, ME)
+    for text, affected in (("delete task '100%'", 1), ("delete task 'a_'", 1), ("mark '_' as done", 0),
+                           ("mark '%' as done", 0)):
+        intent = parse(text)
+        assert db.execute_dml_query(intent.sql, intent.params, ME) == affected, text
+    rows, _columns = db.execute_select_query("SELECT task_name, status FROM tasks", ())
+    assert rows == [("pay 1000 to bob", "pending")]
+
+
+def test_listing_sql_matches_its_filters(tasks_db):
+    from task_store import matches
+    for n, (due_date, status) in enumerate([(None, "pending"), ("2026-10-17", "pending"), ("2026-10-19", "pending"),
+                                            ("2026-10-19", "completed"), ("2026-10-22", "pending")]):
+        db.execute_dml_query("INSERT INTO tasks (user_email, task_name, status, due_date) VALUES (?, ?, ?, ?)",
+                             (ME, f"t{n}", status, due_date), ME)
+    everything, _columns = db.execute_select_query(
+        f"SELECT {intent_parser.TASK_COLUMNS} FROM tasks WHERE user_email = ?", (ME,), ME)
+    for text in ("show pending tasks", "what do I have tomorrow", "show my tasks for this week",
+                 "show tasks next week", "show overdue tasks", "show completed tasks"):
+        intent = parse(text)
+        rows, _columns = db.execute_select_query(intent.sql, intent.params, ME)
+        assert sorted(rows) == sorted(row for row in everything if matches(row, intent.filters)), text
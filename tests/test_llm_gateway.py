@@ -0,0 +1,123 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from llm_gateway import FakeBackend, LLMBackend, LLMGateway, LLMTimeoutError
+
+
+class ScriptedBackend(FakeBackend):
+    """FakeBackend whose n-th call takes latencies[n] seconds (the last value repeats)."""
+
+    def __init__(self, latencies, **kwargs):
+        super().__init__(**kwargs)
+        self.latencies = latencies
+
+    async def generate(self, prompt: str) -> str:
+        with self._lock:
+            latency = self.latencies[min(self.calls, len(self.latencies) - 1)]
+            self.calls += 1
+        await asyncio.sleep(latency)
+        return f"answer {self.calls}"
+
+
+@pytest.fixture
+def make_gateway():
+    gateways = []
+
+    def make(backend, **kwargs):
+        kwargs = {"rate_per_second": 0, "backoff_s": 0.01, **kwargs}
+        gateways.append(LLMGateway(backend, **kwargs))
+        return gateways[-1]
+    yield make
+    for gateway in gateways:
+        gateway.close()
+
+
+def test_backend_generate_is_abstract():
+    with pytest.raises(TypeError):
+        LLMBackend()
+
+
+def test_identical_prompts_in_flight_are_coalesced(make_gateway):
+    backend = FakeBackend(responder=str.upper, latency_s=0.05)
+    gateway = make_gateway(backend)
+    assert gateway.invoke_many(["a", "a", "b", "a"]) == ["A", "A", "B", "A"]
+    assert backend.calls == 2
+    assert gateway.stats["coalesced"] == 2
+    # Once finished, a prompt is asked again.
+    assert gateway.invoke("a") == "A"
+    assert backend.calls == 3
+
+
+def test_slow_call_is_hedged(make_gateway):
+    backend = ScriptedBackend([1.0, 0.0])
+    gateway = make_gateway(backend, hedge_after_s=0.05, timeout_s=2)
+    started = time.monotonic()
+    assert gateway.invoke("q") == "answer 2"
+    assert time.monotonic() - started < 0.5
+    assert gateway.stats["hedges"] == 1
+    assert gateway.stats["attempts"] == 2
+
+
+def test_token_bucket_throttles_past_the_burst(make_gateway):
+    backend = FakeBackend(responder=str.upper)
+    gateway = make_gateway(backend, rate_per_second=20, burst=2)
+    started = time.monotonic()
+    gateway.invoke_many([f"p{n}" for n in range(6)])
+    # Two calls use the burst, the other four wait 1/20 s each.
+    assert time.monotonic() - started >= 0.18
+    assert gateway._bucket.waits > 0
+
+
+def test_timed_out_attempt_is_retried(make_gateway):
+    backend = ScriptedBackend([1.0, 0.0])
+    gateway = make_gateway(backend, timeout_s=0.1, max_retries=1)
+    assert gateway.invoke("q") == "answer 2"
+    assert gateway.stats["timeouts"] == 1
+    assert gateway.stats["retries"] == 1
+
+
+def test_timeouts_on_every_attempt_raise(make_gateway):
+    backend = ScriptedBackend([1.0])
+    gateway = make_gateway(backend, timeout_s=0.05, max_retries=2)
+    with pytest.raises(LLMTimeoutError):
+        gateway.invoke("q")
+    assert backend.calls == 3
+    assert gateway.stats["failures"] == 1
+
+
+def test_stream_failure_before_first_chunk_is_retried(make_gateway):
+    backend = FakeBackend(response="one two three", fail_times=1)
+    gateway = make_gateway(backend, max_retries=1)
+    assert "".join(gateway.stream("q")) == "one two three"
+    assert gateway.stats["retries"] == 1
+    assert gateway.stats["attempts"] == 2
+
+
+def test_stream_times_out(make_gateway):
+    backend = FakeBackend(response="late", latency_s=0.5)
+    gateway = make_gateway(backend, timeout_s=0.05, max_retries=0)
+    with pytest.raises(LLMTimeoutError):
+        list(gateway.stream("q"))
+    assert gateway.stats["timeouts"] == 1
+
+
+def test_stream_takes_a_rate_limit_token(make_gateway):
+    gateway = make_gateway(FakeBackend(response="x"), rate_per_second=20, burst=1)
+    started = time.monotonic()
+    for _ in range(3):
+        assert list(gateway.stream("q")) == ["x"]
+    assert time.monotonic() - started >= 0.09
+
+
+def test_stream_holds_a_worker_slot_until_it_ends(make_gateway):
+    gateway = make_gateway(FakeBackend(response="one two"), max_concurrency=1)
+    stream = gateway.stream("q")
+    assert next(stream) == "one "
+    answered = threading.Event()
+    threading.Thread(target=lambda: (gateway.invoke("other"), answered.set()), daemon=True).start()
+    assert not answered.wait(0.1)
+    assert list(stream) == ["two"]
+    assert answered.wait(1)
@@ -0,0 +1,90 @@
+import random
+
+import pytest
+
+import database as db
+import sql_guard
+
+ME = "me@example.com"
+COLUMNS = "id, task_name, status, category, due_date, due_time, created_at"
+
+
+@pytest.fixture
+def listing_db(tasks_db):
+    """90 tasks with NULL due dates and times and many ties on every sort column."""
+    rng = random.Random(11)
+    rows = []
+    for n in range(90):
+        due_date = rng.choice([None, "2026-10-18", "2026-10-19", "2026-10-19", "2026-10-25"])
+        due_time = rng.choice([None, "09:00", "09:00", "17:30"])
+        created_at = rng.choice(["2026-10-01 08:00:00", "2026-10-02 08:00:00"])
+        rows.append(("Me", ME, f"Task {n:02d}", rng.choice(["pending", "completed"]), rng.choice([None, "Work"]),
+                     due_date, due_time, created_at))
+    rows.append(("Other", "other@example.com", "Theirs", "pending", None, None, None, "2026-10-01 08:00:00"))
+    with db.connection() as conn:
+        conn.executemany(
+            "INSERT INTO tasks (user_name, user_email, task_name, status, category, due_date, due_time, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        conn.commit()
+    return tasks_db
+
+
+def _all_pages(query, params, page_size):
+    rows, cursor, modes = [], None, set()
+    while True:
+        page, _columns, cursor = db.fetch_select_page(query, params, page_size, cursor, ME)
+        assert len(page) <= page_size
+        rows.extend(page)
+        if cursor is None:
+            return rows, modes
+        modes.add(cursor[0])
+
+
+ORDERS = {
+    "default": (f"SELECT {COLUMNS} FROM tasks WHERE user_email = ? ORDER BY {db.DEFAULT_ORDER_BY}", (ME,)),
+    "dated": (f"SELECT {COLUMNS} FROM tasks WHERE user_email = ? AND {db.DATED_FILTER} ORDER BY {db.DATED_ORDER_BY}",
+              (ME,)),
+    "desc": (f"SELECT {COLUMNS} FROM tasks WHERE user_email = ? ORDER BY due_date DESC, due_time DESC, category",
+             (ME,)),
+    "status": (f"SELECT {COLUMNS} FROM tasks WHERE user_email = ? AND status = ? ORDER BY {db.DEFAULT_ORDER_BY}",
+               (ME, "pending")),
+}
+
+
+@pytest.mark.parametrize("order", sorted(ORDERS))
+@pytest.mark.parametrize("page_size", [1, 7, 50, 200])
+def test_keyset_pages_concatenate_to_the_full_ordered_result(listing_db, order, page_size):
+    query, params = ORDERS[order]
+    # Ties are broken by id, as the pager does.
+    expected, _columns = db.execute_select_query(f"{query}, id", params, ME)
+    assert any(row[4] is None for row in expected) or order == "dated"
+    rows, modes = _all_pages(query, params, page_size)
+    assert modes <= {"keyset"}
+    assert [row[0] for row in rows] == [row[0] for row in expected]
+    assert rows == expected
+
+
+def test_queries_that_cannot_be_keyset_paged_fall_back_to_offset(listing_db):
+    query = "SELECT task_name, due_date FROM tasks WHERE user_email = ? ORDER BY due_date NULLS LAST, task_name"
+    expected, _columns = db.execute_select_query(query, (ME,), ME)
+    rows, modes = _all_pages(query, (ME,), 8)
+    assert modes == {"offset"}
+    assert rows == expected
+
+    # No `id` column: the keyset SQL fails and the first page switches to offset.
+    query = "SELECT task_name, due_date FROM tasks WHERE user_email = ? ORDER BY task_name"
+    expected, _columns = db.execute_select_query(query, (ME,), ME)
+    rows, modes = _all_pages(query, (ME,), 8)
+    assert modes == {"offset"}
+    assert rows == expected
+
+
+def test_guard_limit_caps_the_paged_total(listing_db, monkeypatch):
+    monkeypatch.setattr(sql_guard, "SQL_GUARD_MAX_ROWS", 25)
+    guarded = sql_guard.guard(f"SELECT {COLUMNS} FROM tasks ORDER BY {db.DEFAULT_ORDER_BY}, id", (), ME, mode="enforce")
+    assert guarded.sql.endswith("LIMIT 25")
+    expected, _columns = db.execute_select_query(guarded.sql, guarded.params, ME)
+    rows, modes = _all_pages(guarded.sql, guarded.params, 7)
+    assert modes == {"keyset"}
+    assert len(rows) == 25
+    assert rows == expected
@@ -0,0 +1,34 @@
+import pytest
+
+import database as db
+import query_planner
+
+
+def test_multi_row_insert_is_not_a_full_scan(tasks_db):
+    sql = "INSERT INTO tasks (user_email, task_name) VALUES (?, ?), (?, ?)"
+    report = query_planner.explain_query_plan(sql, ("a@example.com", "One", "a@example.com", "Two"))
+    assert report.plan == ["SCAN 2 CONSTANT ROWS"]
+    assert report.full_scans == []
+    assert report.ok
+
+
+def test_reject_mode_allows_multi_row_insert(tasks_db, monkeypatch):
+    monkeypatch.setattr(query_planner, "QUERY_PLAN_CHECK", "reject")
+    sql = "INSERT INTO tasks (user_email, task_name) VALUES ('a@example.com', 'One'), ('a@example.com', 'Two')"
+    report = query_planner.check_query_plan(sql)
+    assert report is not None and report.ok
+    assert db.execute_dml_query(sql, user_email="a@example.com")
+
+
+def test_table_scan_is_flagged(tasks_db, monkeypatch):
+    report = query_planner.explain_query_plan("SELECT * FROM tasks WHERE task_name LIKE '%milk%'")
+    assert report.full_scans == ["tasks"]
+    monkeypatch.setattr(query_planner, "QUERY_PLAN_CHECK", "reject")
+    with pytest.raises(query_planner.QueryPlanError):
+        query_planner.check_query_plan("SELECT * FROM tasks WHERE task_name LIKE '%milk%'")
+
+
+def test_indexed_listing_and_rowid_range_are_not_flagged(tasks_db):
+    assert query_planner.explain_query_plan(
+        "SELECT id FROM tasks WHERE user_email = ? AND status = ?", ("a@example.com", "pending")).full_scans == []
+    assert query_planner.explain_query_plan("SELECT id FROM tasks WHERE id > ?", (5,)).full_scans == []
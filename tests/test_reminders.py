@@ -0,0 +1,191 @@
+from datetime import datetime
+
+import pytest
+
+import database as db
+import reminders
+
+ME = "me@example.com"
+
+
+class Clock:
+    def __init__(self, moment: str):
+        self.set(moment)
+
+    def set(self, moment: str):
+        self.now = datetime.fromisoformat(moment).timestamp()
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock("2026-10-18 12:00")
+
+
+@pytest.fixture
+def sink():
+    return reminders.MemorySink()
+
+
+@pytest.fixture
+def scheduler(tasks_db, clock, sink):
+    scheduler = reminders.ReminderScheduler(sink, lead_minutes=15, horizon_days=1, lookback_hours=24,
+                                            resync_seconds=0, clock=clock)
+    db.add_change_listener(scheduler.on_change)
+    yield scheduler
+    db.remove_change_listener(scheduler.on_change)
+
+
+def add(name, due_date, due_time=None, status="pending"):
+    return db.execute_dml_query(
+        "INSERT INTO tasks (user_name, user_email, task_name, status, due_date, due_time) VALUES (?, ?, ?, ?, ?, ?)",
+        ("Me", ME, name, status, due_date, due_time), ME)
+
+
+def behind_the_schedulers_back(sql, params=()):
+    with db.connection() as conn:
+        conn.execute(sql, params)
+        conn.commit()
+
+
+def tracked(scheduler):
+    return sorted(task_id for _path, task_id in scheduler._tasks)
+
+
+def events(sink):
+    return [(n["event"], n["task_name"], n["due_at"]) for n in sink.notifications]
+
+
+def test_sink_send_is_abstract():
+    with pytest.raises(TypeError):
+        reminders.ReminderSink()
+
+
+def test_window_is_loaded_extended_and_pruned(scheduler, clock):
+    soon = add("soon", "2026-10-18", "13:00")
+    tomorrow = add("tomorrow", "2026-10-19")
+    later = add("later", "2026-10-20", "08:00")
+    add("done", "2026-10-18", "13:00", status="completed")
+    add("long overdue", "2026-10-17", "10:00")
+    add("undated", None)
+    scheduler.run_pending()
+    assert scheduler.stats()["window"] == ("2026-10-17", "2026-10-19")
+    assert tracked(scheduler) == [soon, tomorrow]
+
+    # A day later the window moves: the new day is loaded and "soon" falls out of the back.
+    clock.set("2026-10-19 14:00")
+    scheduler.run_pending()
+    assert scheduler.stats()["window"] == ("2026-10-18", "2026-10-20")
+    assert tracked(scheduler) == [tomorrow, later]
+    assert scheduler.stats()["loads"] == 2
+
+
+def test_upcoming_then_overdue(scheduler, clock, sink):
+    add("dentist", "2026-10-18", "13:00")
+    add("undated time", "2026-10-18")          # due at REMINDER_DEFAULT_TIME, already past: overdue only
+    assert scheduler.run_pending() == 1
+    assert events(sink) == [("overdue", "undated time", "2026-10-18T09:00")]
+    clock.set("2026-10-18 12:44")
+    assert scheduler.run_pending() == 0
+    clock.set("2026-10-18 12:45")
+    assert scheduler.run_pending() == 1
+    clock.set("2026-10-18 13:00")
+    assert scheduler.run_pending() == 1
+    assert events(sink)[1:] == [("upcoming", "dentist", "2026-10-18T13:00"), ("overdue", "dentist", "2026-10-18T13:00")]
+    clock.set("2026-10-18 18:00")
+    assert scheduler.run_pending() == 0
+    assert scheduler.stats()["queued"] == 0
+
+
+def test_changes_are_queued_and_merged_on_the_next_step(scheduler, clock, sink):
+    scheduler.run_pending()
+    task_id = add("call", "2026-10-18", "12:30")
+    assert scheduler.stats()["queued_changes"] == 1
+    assert task_id not in tracked(scheduler)
+    # A queued change due before the next wake-up shortens the sleep.
+    assert scheduler._sleep_seconds(clock()) == 15 * 60
+    scheduler.run_pending()
+    assert scheduler.stats()["queued_changes"] == 0
+    assert tracked(scheduler) == [task_id]
+
+    db.execute_dml_query("UPDATE tasks SET status = 'completed' WHERE id = ?", (task_id,), ME)
+    scheduler.run_pending()
+    assert tracked(scheduler) == []
+    db.execute_dml_query("UPDATE tasks SET status = 'pending', due_time = '12:40' WHERE id = ?", (task_id,), ME)
+    db.execute_dml_query("DELETE FROM tasks WHERE id = ?", (task_id,), ME)
+    scheduler.run_pending()
+    assert tracked(scheduler) == []
+    clock.set("2026-10-18 18:00")
+    assert scheduler.run_pending() == 0 and sink.notifications == []
+
+
+def test_writes_without_rows_reload_the_users_window(scheduler):
+    scheduler.run_pending()
+    behind_the_schedulers_back(
+        "INSERT INTO tasks (user_email, task_name, status, due_date) VALUES (?, 'imported', 'pending', '2026-10-19')",
+        (ME,))
+    scheduler.on_change(db.DB_FILENAME, ME)
+    scheduler.run_pending()
+    assert len(tracked(scheduler)) == 1
+
+
+@pytest.mark.parametrize("change, sql", [
+    ("completed", "UPDATE tasks SET status = 'completed'"),
+    ("deleted", "DELETE FROM tasks"),
+])
+def test_delivery_rechecks_tasks_changed_unseen(scheduler, clock, sink, change, sql):
+    add("report", "2026-10-18", "13:00")
+    scheduler.run_pending()
+    behind_the_schedulers_back(sql)
+    clock.set("2026-10-18 12:50")
+    assert scheduler.run_pending() == 0
+    assert sink.notifications == []
+    assert scheduler.stats()["dropped"] == 1
+    assert tracked(scheduler) == []
+
+
+def test_delivery_requeues_tasks_rescheduled_unseen(scheduler, clock, sink):
+    add("report", "2026-10-18", "13:00")
+    scheduler.run_pending()
+    behind_the_schedulers_back("UPDATE tasks SET due_time = '15:00'")
+    clock.set("2026-10-18 12:50")
+    assert scheduler.run_pending() == 0
+    assert scheduler.stats()["dropped"] == 1
+    clock.set("2026-10-18 14:45")
+    assert scheduler.run_pending() == 1
+    assert events(sink) == [("upcoming", "report", "2026-10-18T15:00")]
+
+
+def test_failed_sends_are_counted_and_not_retried(tasks_db, clock):
+    class FailingSink(reminders.ReminderSink):
+        def send(self, notification):
+            raise OSError("webhook down")
+
+    scheduler = reminders.ReminderScheduler(FailingSink(), lead_minutes=0, resync_seconds=0, clock=clock)
+    add("report", "2026-10-18", "11:00")
+    assert scheduler.run_pending() == 0
+    assert scheduler.stats()["failed"] == 1
+    assert scheduler.run_pending() == 0
+    assert scheduler.stats()["failed"] == 1
+
+
+def test_running_thread_wakes_for_changes_due_before_its_sleep_ends(scheduler, sink):
+    import time
+    later = add("later", "2026-10-18", "20:00")
+    db.remove_change_listener(scheduler.on_change)  # start() registers it again
+    scheduler.start()
+    try:
+        deadline = time.monotonic() + 2
+        while not scheduler._wake_at and time.monotonic() < deadline:
+            time.sleep(0.01)
+        add("not yet", "2026-10-18", "19:00")       # queued only: the thread sleeps on
+        assert scheduler.stats()["queued_changes"] == 1
+        add("soon", "2026-10-18", "12:10")          # its upcoming reminder is due now
+        while not sink.notifications and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert events(sink) == [("upcoming", "soon", "2026-10-18T12:10")]
+        assert later in tracked(scheduler)
+    finally:
+        scheduler.stop()
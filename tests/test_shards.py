@@ -0,0 +1,121 @@
+import io
+import os
+
+import pytest
+
+import database as db
+import shard_migrate
+import task_io
+
+USERS = ["ann@example.com", "bob@example.com", "cy@other.org", "di@other.org", "eve@third.net", "Ann@Example.com "]
+
+
+@pytest.fixture
+def source_db(tasks_db):
+    """An unsharded database with tasks for several users (ids with gaps), closed afterwards."""
+    with db.connection() as conn:
+        for n in range(120):
+            conn.execute(
+                "INSERT INTO tasks (user_name, user_email, task_name, status, due_date) VALUES (?, ?, ?, ?, ?)",
+                ("User", USERS[n % len(USERS)], f"task {n}", "pending", f"2026-10-{10 + n % 20}"))
+        conn.execute("INSERT INTO tasks (user_name, user_email, task_name) VALUES ('Nobody', NULL, 'orphan')")
+        conn.execute("DELETE FROM tasks WHERE id % 7 = 0")
+        conn.commit()
+    db.close_connections()
+    return tasks_db
+
+
+@pytest.fixture
+def sharded(tmp_path, monkeypatch):
+    def configure(shards: str):
+        monkeypatch.setattr(db, "DB_SHARDS", shards)
+        monkeypatch.setattr(db, "DB_SHARD_DIR", str(tmp_path / f"shards-{shards}"))
+    yield configure
+    db.close_connections()
+
+
+def _all_rows(paths):
+    rows = []
+    for path in paths:
+        with db.connection(path) as conn:
+            rows.extend(conn.execute(f"SELECT {', '.join(shard_migrate.COLUMNS)} FROM tasks"))
+    return sorted(rows)
+
+
+def test_shard_path_is_stable_and_case_insensitive(sharded, tmp_path):
+    sharded("4")
+    paths = {user: db.shard_path(user) for user in USERS}
+    assert paths["ann@example.com"] == paths["Ann@Example.com "]
+    assert set(paths.values()) <= set(db.shard_paths())
+    assert len(db.shard_paths()) == 4
+    assert os.path.basename(paths["ann@example.com"]).endswith("-of-004.db")
+    sharded("tenant")
+    assert db.shard_path("a@Example.com") == db.shard_path("b@example.com") == \
+        os.path.join(db.DB_SHARD_DIR, "tenant-example.com.db")
+    assert db.shard_path("x@we ird/dom") == os.path.join(db.DB_SHARD_DIR, "tenant-we_ird_dom.db")
+
+
+def test_route_needs_a_user_when_sharded(sharded):
+    sharded("1")
+    assert db.route() == db.DB_FILENAME
+    sharded("4")
+    with pytest.raises(ValueError):
+        db.route(None)
+    path = db.route("ann@example.com")
+    assert path == db.shard_path("ann@example.com") and os.path.exists(path)
+
+
+def test_shards_hand_out_disjoint_ids(tasks_db, sharded):
+    sharded("4")
+    ids = {}
+    for user in USERS[:5]:
+        path = db.route(user)
+        ids.setdefault(path, []).append(db.execute_dml_query(
+            "INSERT INTO tasks (user_email, task_name) VALUES (?, 'x')", (user,), user))
+    assert len(ids) > 1
+    for path, path_ids in ids.items():
+        base = db.shard_id_base(path)
+        assert all(base < task_id < base + db.HASH_SHARD_ID_SPAN for task_id in path_ids)
+    sharded("tenant")
+    tenant_ids = [db.execute_dml_query("INSERT INTO tasks (user_email, task_name) VALUES (?, 'x')", (user,), user)
+                  for user in ("a@one.com", "a@two.com")]
+    assert len(set(tenant_ids)) == 2
+    assert db.shard_id_base(db.DB_FILENAME) == 0
+
+
+@pytest.mark.parametrize("shards", ["3", "tenant"])
+def test_migration_round_trip(source_db, sharded, shards):
+    source_rows = _all_rows([source_db])
+    source_max_id = max(row[0] for row in source_rows)
+    sharded(shards)
+    copied = shard_migrate.migrate(source_db, batch_size=7)
+    assert sum(copied.values()) == len(source_rows)
+    # Only the shard being written had connections open, and none are left.
+    assert not set(copied) & set(db._pools)
+    assert _all_rows(copied) == source_rows
+    for path in copied:
+        with db.connection(path) as conn:
+            users = {row[0] for row in conn.execute("SELECT DISTINCT user_email FROM tasks")}
+        assert all(db.shard_path(user) == path for user in users)
+
+    # New tasks continue past the source's ids and do not collide across shards, so a
+    # full ICS export has unique UIDs.
+    new_ids = [db.execute_dml_query("INSERT INTO tasks (user_email, task_name) VALUES (?, 'new')", (user,), user)
+               for user in USERS[:5]]
+    assert min(new_ids) > source_max_id and len(set(new_ids)) == len(new_ids)
+    stream = io.StringIO()
+    task_io.export_tasks(stream, "ics")
+    uids = [line for line in stream.getvalue().splitlines() if line.startswith("UID:")]
+    assert len(uids) == len(source_rows) + len(new_ids) == len(set(uids))
+
+
+def test_migration_refuses_unsharded_and_filled_targets(source_db, sharded):
+    sharded("1")
+    with pytest.raises(ValueError, match="shard count"):
+        shard_migrate.migrate(source_db)
+    sharded("2")
+    shard_migrate.migrate(source_db)
+    with pytest.raises(ValueError, match="already holds tasks"):
+        shard_migrate.migrate(source_db)
+    with pytest.raises(FileNotFoundError):
+        shard_migrate.migrate(source_db + ".missing")
@@ -0,0 +1,54 @@
+from datetime import date, timedelta
+
+import pytest
+
+from sql_cache import SQLQueryCache
+
+DAY1 = date(2026, 10, 18)
+DAY2 = DAY1 + timedelta(days=3)
+ME, OTHER = "me@example.com", "other@example.com"
+
+
+def _sql(email: str, due: date) -> str:
+    return f"SELECT id FROM tasks WHERE user_email = '{email}' AND due_date = '{due.isoformat()}'"
+
+
+@pytest.fixture
+def cache():
+    return SQLQueryCache(templating=True)
+
+
+@pytest.mark.parametrize("command, days", [("show tasks tomorrow", 1), ("what's due today", 0), ("tasks in 3 days", 3)])
+def test_day_relative_dates_move_with_today(cache, command, days):
+    cache.put(command, "Me", ME, DAY1, None, _sql(ME, DAY1 + timedelta(days=days)))
+    assert cache.get(command, "Other", OTHER, DAY2, None) == _sql(OTHER, DAY2 + timedelta(days=days))
+
+
+@pytest.mark.parametrize("command, due", [
+    ("add dentist on 2026-10-25", date(2026, 10, 25)),
+    ("show tasks next friday", date(2026, 10, 23)),
+    ("what's due this week", date(2026, 10, 20)),
+    ("add 'Dentist' on Oct 25", date(2026, 10, 25)),
+])
+def test_calendar_dates_are_not_replayed_on_a_later_day(cache, command, due):
+    cache.put(command, "Me", ME, DAY1, None, _sql(ME, due))
+    assert cache.get(command, "Me", ME, DAY2, None) is None
+    # Same day: still shared across users, with the date kept verbatim.
+    assert cache.get(command, "Other", OTHER, DAY1, None) == _sql(OTHER, due)
+
+
+def test_exact_mode_keys_on_user_and_date():
+    cache = SQLQueryCache()
+    cache.put("show tasks tomorrow", "Me", ME, DAY1, None, _sql(ME, DAY1 + timedelta(days=1)))
+    assert cache.get("show tasks tomorrow", "Me", ME, DAY1, None) == _sql(ME, DAY1 + timedelta(days=1))
+    assert cache.get("show tasks tomorrow", "Me", ME, DAY2, None) is None
+    assert cache.get("show tasks tomorrow", "Other", OTHER, DAY1, None) is None
+
+
+def test_verbs_are_kept_and_empty_keys_are_refused():
+    cache = SQLQueryCache()
+    cache.put("Get groceries tomorrow", "Me", ME, DAY1, None, "INSERT INTO tasks (task_name) VALUES ('Groceries')")
+    assert cache.get("Show groceries tomorrow", "Me", ME, DAY1, None) is None
+    assert cache.get("Please get groceries tomorrow!", "Me", ME, DAY1, None) is not None
+    cache.put("please?", "Me", ME, DAY1, None, "DELETE FROM tasks")
+    assert cache.stats()["entries"] == 1
@@ -0,0 +1,76 @@
+import pytest
+
+import database as db
+import sql_guard
+
+ME = "me@example.com"
+
+
+@pytest.fixture
+def seeded_db(tasks_db):
+    with db.connection() as conn:
+        conn.executemany(
+            "INSERT INTO tasks (user_name, user_email, task_name, status) VALUES (?, ?, ?, ?)",
+            [("Me", ME, f"Task {n}", "pending") for n in range(5)] + [("Other", "other@example.com", "Theirs", "pending")],
+        )
+        conn.commit()
+    return tasks_db
+
+
+@pytest.mark.parametrize("sql", [
+    f"DELETE FROM tasks WHERE user_email = '{ME}' AND 1=1",
+    f"UPDATE tasks SET status = 'Completed' WHERE user_email = '{ME}' AND task_name LIKE '%%'",
+    "DELETE FROM tasks WHERE task_name LIKE '%'",
+    "DELETE FROM tasks WHERE (1 = 1)",
+    "DELETE FROM tasks WHERE task_name = 'Task 1' OR 1 = 1",
+    "UPDATE tasks SET status = 'completed' WHERE task_name = task_name",
+])
+def test_always_true_writes_are_rejected(seeded_db, sql):
+    with pytest.raises(sql_guard.SQLGuardError, match="narrows it down"):
+        sql_guard.guard(sql, (), ME, mode="enforce")
+
+
+def test_match_all_pattern_in_a_parameter_is_rejected(seeded_db):
+    with pytest.raises(sql_guard.SQLGuardError):
+        sql_guard.guard("DELETE FROM tasks WHERE task_name LIKE ?", ("%",), ME, mode="enforce")
+
+
+def test_write_over_row_limit_is_rejected(seeded_db, monkeypatch):
+    monkeypatch.setattr(sql_guard, "SQL_GUARD_MAX_WRITE_ROWS", 3)
+    with pytest.raises(sql_guard.SQLGuardError, match="would change 5 tasks"):
+        sql_guard.guard("DELETE FROM tasks WHERE id > 0", (), ME, mode="enforce")
+
+
+def test_narrow_write_is_scoped_and_allowed(seeded_db):
+    guarded = sql_guard.guard("DELETE FROM tasks WHERE task_name = 'Task 1'", (), ME, mode="enforce")
+    assert guarded.sql == "DELETE FROM tasks WHERE user_email = ? AND (task_name = ?)"
+    assert guarded.params == (ME, "Task 1")
+    assert db.execute_dml_query(guarded.sql, guarded.params, ME) == 1
+
+
+@pytest.mark.parametrize("sql", [
+    f"INSERT INTO tasks (id, user_name, user_email, task_name) VALUES (1, 'a', '{ME}', 'pwn') "
+    "ON CONFLICT(id) DO UPDATE SET task_name = 'hacked'",
+    f"INSERT OR REPLACE INTO tasks (id, user_name, user_email, task_name) VALUES (1, 'a', '{ME}', 'pwn')",
+    f"UPDATE OR REPLACE tasks SET id = 1 WHERE id = 2 AND user_email = '{ME}'",
+    f"REPLACE INTO tasks (user_name, user_email, task_name) VALUES ('a', '{ME}', 'pwn')",
+    f"INSERT INTO tasks (user_name, user_email, task_name) VALUES ('a', '{ME}', 'x') ON CONFLICT DO NOTHING",
+    f"INSERT INTO tasks (id, user_name, user_email, task_name) VALUES (99, 'a', '{ME}', 'x')",
+    "UPDATE tasks SET id = 1 WHERE id = 2",
+    "UPDATE tasks SET (task_name, id) = ('x', 1) WHERE id = 2",
+])
+def test_writes_that_could_overwrite_other_users_rows_are_rejected(tasks_db, sql):
+    with db.connection() as conn:
+        conn.execute("INSERT INTO tasks (id, user_name, user_email, task_name) VALUES (1, 'Other', 'other@example.com', 'theirs')")
+        conn.execute(f"INSERT INTO tasks (id, user_name, user_email, task_name) VALUES (2, 'Me', '{ME}', 'mine')")
+        conn.commit()
+    with pytest.raises(sql_guard.SQLGuardError):
+        sql_guard.guard(sql, (), ME, mode="enforce")
+    rows, _columns = db.execute_select_query("SELECT id, user_email, task_name FROM tasks ORDER BY id")
+    assert rows == [(1, "other@example.com", "theirs"), (2, ME, "mine")]
+
+
+def test_update_or_ignore_without_ids_is_allowed(seeded_db):
+    guarded = sql_guard.guard("UPDATE OR IGNORE tasks SET status = 'completed' WHERE task_name = 'Task 1'", (), ME,
+                              mode="enforce")
+    assert guarded.kind == "update"
@@ -0,0 +1,106 @@
+import io
+
+import pytest
+
+import database as db
+import task_io
+
+ME = "me@example.com"
+ROWS = [
+    ("Me", ME, "dentist", "pending", "Health", "2026-10-19", "15:00", "2026-10-01 08:00:00"),
+    ("Me", ME, "buy milk, eggs; bread", "completed", "Home, Garden", "2026-10-20", None, "2026-10-02 09:30:00"),
+    ("Me", ME, "back\\slash \"quoted\" name", "cancelled", "Work\\Misc", None, None, "2026-10-03 10:00:00"),
+    ("Me", ME, "multi line category", "pending", "Personal\nErrands", "2026-10-21", "09:05", "2026-10-04 11:00:00"),
+    ("Me", ME, "a very long task name " * 6 + "ü✓", "pending", "Work", "2026-10-22", "23:59", "2026-10-05 12:00:00"),
+]
+COMPARED = "user_name, user_email, task_name, status, category, due_date, due_time, created_at"
+
+
+def _seed(rows=ROWS):
+    db.upsert_task_rows(list(rows), "update", db.DB_FILENAME)
+
+
+def _tasks():
+    rows, _columns = db.execute_select_query(f"SELECT {COMPARED} FROM tasks ORDER BY task_name", ())
+    return rows
+
+
+def _clear():
+    with db.connection() as conn:
+        conn.execute("DELETE FROM tasks")
+        conn.commit()
+
+
+def _round_trip(fmt, **export_options):
+    out = io.StringIO()
+    report = task_io.export_tasks(out, fmt, **export_options)
+    assert report.rows == len(ROWS)
+    text = out.getvalue()
+    _clear()
+    report = task_io.import_tasks(io.StringIO(text), fmt, user_name="Me", user_email=ME)
+    assert (report.inserted, report.rejected, report.errors) == (len(ROWS), 0, [])
+    return text
+
+
+@pytest.mark.parametrize("fmt, options", [("csv", {}), ("ics", {"component": "VTODO"}),
+                                          ("ics", {"component": "VEVENT"})])
+def test_export_import_round_trip(tasks_db, fmt, options):
+    _seed()
+    before = _tasks()
+    text = _round_trip(fmt, **options)
+    assert _tasks() == before
+    if fmt == "ics":
+        assert all(len(line.encode("utf-8")) <= 75 for line in text.split("\r\n"))
+        # Importing the same file again changes nothing.
+        report = task_io.import_tasks(io.StringIO(text), fmt, user_name="Me", user_email=ME)
+        assert (report.inserted, report.updated, report.unchanged) == (0, 0, len(ROWS))
+
+
+def test_ics_categories_split_on_unescaped_commas_only(tasks_db):
+    calendar = (
+        "BEGIN:VCALENDAR\r\n"
+        "BEGIN:VTODO\r\nSUMMARY:one\r\nCATEGORIES:Home\\, Garden,Errands\r\nEND:VTODO\r\n"
+        "BEGIN:VTODO\r\nSUMMARY:two\r\nCATEGORIES:C:\\\\dir\\\\,Other\r\nEND:VTODO\r\n"
+        "BEGIN:VTODO\r\nSUMMARY:three\r\nCATEGORIES:Plain\r\nCATEGORIES:Ignored\r\nEND:VTODO\r\n"
+        "END:VCALENDAR\r\n"
+    )
+    records = [record for _where, record in task_io.read_ics(io.StringIO(calendar))]
+    assert [r["category"] for r in records] == ["Home, Garden", "C:\\dir\\", "Plain"]
+
+
+def test_csv_rejects_bad_rows_and_keeps_the_rest(tasks_db):
+    text = ("task_name,due_date,due_time,status\n"
+            "ok,2026-10-19,3pm,pending\n"
+            ",2026-10-19,,pending\n"
+            "bad date,2026-13-01,,pending\n"
+            "bad status,,,someday\n")
+    report = task_io.import_tasks(io.StringIO(text), "csv", user_name="Me", user_email=ME)
+    assert (report.rows, report.inserted, report.rejected) == (4, 1, 3)
+    assert [error.split(":")[0] for error in report.errors] == ["line 3", "line 4", "line 5"]
+    assert _tasks() == [("Me", ME, "ok", "pending", "General", "2026-10-19", "15:00", _tasks()[0][-1])]
+
+
+def test_import_into_an_empty_table_rebuilds_indexes_once(tasks_db, monkeypatch):
+    present_during_writes = []
+    write_batch = task_io._write_batch
+
+    def spying_write_batch(batch, on_conflict, db_path, report):
+        with db.connection() as conn:
+            present_during_writes.append({name for (name,) in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'tasks'")})
+        write_batch(batch, on_conflict, db_path, report)
+
+    monkeypatch.setattr(task_io, "_write_batch", spying_write_batch)
+    text = "task_name,due_date\n" + "".join(f"task {n},2026-10-{10 + n}\n" for n in range(10))
+    task_io.import_tasks(io.StringIO(text), "csv", user_name="Me", user_email=ME, chunk_size=3)
+    assert len(present_during_writes) == 4
+    assert all(not set(db.MANAGED_INDEXES) & names and "idx_unq_user_task" in names
+               for names in present_during_writes)
+    with db.connection() as conn:
+        names = {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert set(db.MANAGED_INDEXES) <= names
+
+    # A table that already holds tasks keeps its indexes while importing.
+    present_during_writes.clear()
+    task_io.import_tasks(io.StringIO("task_name\nmore\n"), "csv", user_name="Me", user_email=ME)
+    assert set(db.MANAGED_INDEXES) <= present_during_writes[0]
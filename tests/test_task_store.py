@@ -0,0 +1,125 @@
+import pytest
+
+import database as db
+from task_store import TASK_FIELDS, TaskStore, default_order
+
+ME = "me@example.com"
+OTHER = "other@example.com"
+SELECT_TASKS = f"SELECT {', '.join(TASK_FIELDS)} FROM tasks WHERE user_email = ?"
+INSERT_TASK = ("INSERT INTO tasks (user_name, user_email, task_name, status, category, due_date, due_time, created_at) "
+               "VALUES (?, ?, ?, ?, ?, ?, ?, ?)")
+
+
+@pytest.fixture
+def store(tasks_db, monkeypatch):
+    store = TaskStore(db._load_user_tasks, ttl_seconds=0)
+    monkeypatch.setattr(db, "task_store", store)
+    for user in (ME, OTHER):
+        for n, (due_date, due_time) in enumerate([(None, None), ("2026-10-19", None), ("2026-10-19", "09:00"),
+                                                  ("2026-10-18", "17:30"), (None, "08:00"), ("2026-10-19", "09:00")]):
+            db.execute_dml_query(INSERT_TASK, ("User", user, f"Task {n}", "pending", None, due_date, due_time,
+                                               f"2026-10-0{1 + n % 2} 08:00:00"), user)
+    return store
+
+
+def _listing(user_email, filters=None):
+    """Every page of the user's listing: from the store when cached, and straight from SQL."""
+    query, params = f"{SELECT_TASKS} ORDER BY {db.DEFAULT_ORDER_BY}", (user_email,)
+    if filters and filters.get("status"):
+        query, params = f"{SELECT_TASKS} AND status = ? ORDER BY {db.DEFAULT_ORDER_BY}", (user_email, filters["status"])
+    rows, cursor = [], None
+    while True:
+        page, _columns, cursor = db.fetch_listing_page(query, params, 4, cursor, user_email, filters or {})
+        rows.extend(page)
+        if cursor is None:
+            break
+    expected, _columns = db.execute_select_query(f"{query}, id", params, user_email)
+    return rows, expected
+
+
+def _assert_store_matches_sql(store, *users):
+    for user in users:
+        assert store.list_tasks(user, {}, db.DB_FILENAME) is not None, "listing should come from the store"
+        rows, expected = _listing(user)
+        assert rows == expected
+        rows, expected = _listing(user, {"status": "completed"})
+        assert rows == expected
+
+
+def test_default_order_matches_default_order_by(store):
+    rows, _columns = db.execute_select_query(SELECT_TASKS.replace("user_email = ?", "1"), ())
+    expected, _columns = db.execute_select_query(f"{SELECT_TASKS.replace('user_email = ?', '1')} "
+                                                 f"ORDER BY {db.DEFAULT_ORDER_BY}, id", ())
+    assert default_order(reversed(rows)) == expected
+
+
+def test_insert_update_delete_are_written_through(store):
+    _assert_store_matches_sql(store, ME, OTHER)
+    db.execute_dml_query(INSERT_TASK, ("User", ME, "New", "pending", "Work", "2026-10-18", None,
+                                       "2026-10-03 08:00:00"), ME)
+    db.execute_dml_query("UPDATE tasks SET status = 'completed', due_time = NULL WHERE user_email = ? AND "
+                         "due_date = '2026-10-19'", (ME,), ME)
+    db.execute_dml_query("DELETE FROM tasks WHERE user_email = ? AND due_date IS NULL", (ME,), ME)
+    assert store.stats()["invalidations"] == 0
+    assert store.stats()["write_throughs"] > 0
+    _assert_store_matches_sql(store, ME, OTHER)
+
+
+def test_update_moving_tasks_between_users(store):
+    _assert_store_matches_sql(store, ME, OTHER)
+    db.execute_dml_query("UPDATE tasks SET user_email = ?, task_name = task_name || ' (moved)' "
+                         "WHERE user_email = ? AND due_date = '2026-10-19'", (OTHER, ME), ME)
+    _assert_store_matches_sql(store, ME, OTHER)
+    # Moving to a user who is not cached still removes the tasks from the old owner.
+    store.invalidate(OTHER, db.DB_FILENAME)
+    db.execute_dml_query("UPDATE tasks SET user_email = ? WHERE user_email = ? AND due_date IS NULL",
+                         ("third@example.com", ME), ME)
+    _assert_store_matches_sql(store, ME, OTHER, "third@example.com")
+
+
+@pytest.mark.parametrize("query", [
+    "INSERT OR REPLACE INTO tasks (user_name, user_email, task_name, status, due_date, due_time) "
+    "VALUES ('User', ?, 'Task 1', 'completed', '2026-10-19', NULL)",
+    "REPLACE INTO tasks (user_name, user_email, task_name, status, due_date, due_time) "
+    "VALUES ('User', ?, 'Task 1', 'completed', '2026-10-19', NULL)",
+])
+def test_replace_invalidates(store, query):
+    _assert_store_matches_sql(store, ME, OTHER)
+    db.execute_dml_query(query, (ME,), ME)
+    assert store.stats()["invalidations"] == 1
+    _assert_store_matches_sql(store, ME, OTHER)
+
+
+def test_replace_of_another_users_row_invalidates_them(store):
+    _assert_store_matches_sql(store, ME, OTHER)
+    other_id = db.execute_select_query("SELECT MIN(id) FROM tasks WHERE user_email = ?", (OTHER,))[0][0][0]
+    db.execute_dml_query("INSERT OR REPLACE INTO tasks (id, user_name, user_email, task_name, status) "
+                         "VALUES (?, 'User', ?, 'Taken', 'pending')", (other_id, ME), ME)
+    _assert_store_matches_sql(store, ME, OTHER)
+
+
+def _racing_loader(write):
+    """A loader whose query runs before `write` commits and returns after it."""
+    state = {"pending": True}
+
+    def loader(db_path, user_email, limit):
+        rows = db._load_user_tasks(db_path, user_email, limit)
+        if state.pop("pending", False):
+            write()
+        return rows
+    return loader
+
+
+def test_write_during_load_is_not_lost(store):
+    store.loader = _racing_loader(lambda: db.execute_dml_query(
+        "UPDATE tasks SET status = 'completed' WHERE user_email = ? AND due_date IS NULL", (ME,), ME))
+    stale = store.list_tasks(ME, {}, db.DB_FILENAME)
+    assert all(row[2] == "pending" for row in stale)  # used once ...
+    _assert_store_matches_sql(store, ME)              # ... but not kept
+
+
+def test_move_during_previous_owners_load_is_not_lost(store):
+    store.loader = _racing_loader(lambda: db.execute_dml_query(
+        "UPDATE tasks SET user_email = ? WHERE user_email = ? AND due_date IS NULL", (OTHER, ME), ME))
+    store.list_tasks(ME, {}, db.DB_FILENAME)
+    _assert_store_matches_sql(store, ME, OTHER)
@@ -0,0 +1,12 @@
+import telemetry
+
+
+def test_prometheus_counters_are_exact_past_a_million():
+    registry = telemetry.MetricsRegistry()
+    for rows in (1_234_567, 1):
+        span = telemetry.Span("db.select", None, {"rows": rows, "prompt_tokens": 0.5})
+        span.duration_ms = 1.0
+        registry.observe(span)
+    text = registry.render_prometheus()
+    assert 'task_manager_rows_total{stage="db.select"} 1234568\n' in text
+    assert 'task_manager_prompt_tokens_total{stage="db.select"} 1.0\n' in text